@@ -12,6 +12,7 @@ from airtest.cli.parser import cli_setup
 from airtest.report.report import simple_report, LogToHtml
 from datetime import datetime
 from utils.logger import setup_logger
+from utils.report_service import generate_report
 from core.base import BaseTest
 from core.andriod import get_device_info, get_installed_apps, get_current_activity
 
@@ -160,6 +161,9 @@ class TestAndroidBasic:
             logger.info("测试清理完成")
         except Exception as e:
             logger.error(f"测试清理失败: {str(e)}")
+        finally:
+            # 设备与Poco由同一设备的实例共用，这里只释放引用
+            self.android_test.teardown()
 
 
 @allure.feature("Android手势操作测试")
@@ -221,14 +225,13 @@ def generate_test_report(test_file):
         export_dir = os.path.join("./export_dir", f"{script_name}.py", now)
         
         # 生成报告
-        tmp = LogToHtml(
+        generate_report(
             script_root=test_file,
             log_root=log_root,
             export_dir=export_dir,
             lang='zh',
             plugins=None
         )
-        tmp.report()
         logger.info(f"测试报告生成完成: {script_name}")
         
     except Exception as e:
@@ -10,6 +10,7 @@ from airtest.cli.parser import cli_setup
 from airtest.report.report import simple_report,LogToHtml
 from datetime import datetime
 from utils.logger import setup_logger
+from utils.report_service import generate_report
 
 # 设置日志
 logger = setup_logger(__name__)
@@ -37,14 +38,13 @@ def test_home(setup_test):
         log_root = os.path.join(os.path.dirname(__file__), 'log', script_name)
         export_dir = os.path.join("./export_dir", f"{script_name}.py", now)        
         # 生成报告
-        tmp = LogToHtml(
+        generate_report(
             script_root=__file__,
             log_root=log_root,
             export_dir=export_dir,
             lang='en',
             plugins=None
         )
-        tmp.report()
         logger.info(f"用例执行完成: {script_name}")
 
 #NOTE:如果想以纯python的方式调试该单个脚本，请添加下面的内容
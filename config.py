@@ -16,6 +16,66 @@ ALLURE_CONFIG = {
 # Airtest 相关配置
 AIRTEST_CONFIG = {
     'EXPORT_DIR': os.path.join(BASE_DIR, "export_dir"),
+    # 会话内复用设备连接，各模块只切换日志目录，见 utils.device_manager.DevicePool
+    'REUSE_DEVICE': True,
+    # Airtest HTML报告生成方式，见 utils.report_service：
+    # concurrent(模块结束后在进程池中渲染) / deferred(会话结束后统一渲染) / sync(用例中同步渲染)
+    'REPORT_MODE': 'concurrent',
+    'REPORT_WORKERS': None,  # 渲染进程数，默认 min(4, CPU核数)
+    # 渲染报告前对Airtest日志截图去重，见 utils.log_compactor
+    'LOG_COMPACT': {
+        'enabled': True,
+        # 默认只合并像素完全相同的截图；开启perceptual后，dHash汉明距离不超过hash_distance的截图也会合并，
+        # 输入内容不同、勾选状态不同、出现小的错误提示的截图可能被误合并，报告中会显示错误的截图
+        'perceptual': False,
+        'hash_distance': 2,
+        'max_width': None,  # 截图最大宽度（像素），None表示保持原尺寸
+        'jpeg_quality': 80,  # 缩小后重新编码的JPEG质量
+    },
+    # 截图帧缓存有效期（秒），有效期内的 exists/wait/find_all/touch 复用同一帧，0表示不缓存
+    'FRAME_CACHE_TTL': 0.3,
+    # 模板图片缓存（原图/缩放图/灰度图）的内存上限（MB），见 core.template_registry
+    'TEMPLATE_CACHE_MB': 256,
+    # 是否按record_pos先在预测位置附近匹配，见 core.roi_match
+    'ROI_MATCH': True,
+    # 区域层级：(名称, 模板四周的边距占屏幕宽度的比例)，都未命中时再搜索整帧
+    'ROI_TIERS': [('tight', 0.05), ('wide', 0.2)],
+    # 图像等待的自适应轮询，见 core.frame_diff.AdaptivePoller
+    'ADAPTIVE_WAIT': {
+        'min_interval': 0.1,  # 画面变化时的轮询间隔（秒）
+        'max_interval': 1.5,  # 画面静止时的最长轮询间隔（秒）
+        'backoff': 1.5,  # 画面静止时间隔的放大倍数
+        'diff_threshold': 2.0,  # 缩略图平均像素差低于该值视为画面未变化（只用于调整轮询间隔）
+        # 缩略图任一像素的差都低于该值（几乎完全相同）时才跳过模板匹配，
+        # 小图标、toast出现时整帧平均差很小，但所在位置的像素差明显
+        'skip_threshold': 3.0,
+        'force_every': 5,  # 最多连续跳过的次数，之后强制匹配一次
+        'force_after': 2.0,  # 距上一次匹配超过该时间（秒）时强制匹配
+    },
+    # 等待画面稳定，见 core.frame_diff.wait_until_stable
+    'STABLE_WAIT': {
+        'interval': 0.1,  # 两次截图之间的间隔（秒）
+        'stable_frames': 2,  # 连续多少次未变化视为稳定
+        'diff_threshold': 2.0,
+        # 画面一直没有开始变化时，至少等待这么久（秒）才判定稳定，
+        # 点击后界面通常要过一会儿才开始响应，不能把"尚未变化"当成"已经稳定"
+        'min_wait': 1.0,
+    },
+    # Poco控件树快照，见 core.poco_snapshot
+    'POCO_SNAPSHOT': {
+        'max_age': 2.0,  # 快照有效期（秒），有输入操作时立即失效
+        'diff': False,  # 输入操作后窗口/Activity未变化时继续使用旧快照
+    },
+}
+
+# 用例调度相关配置
+SCHEDULER_CONFIG = {
+    # 用例历史耗时数据库（按 nodeid + 平台 记录）
+    'DURATION_DB': os.path.join(BASE_DIR, ".test_durations.sqlite3"),
+    # 预估耗时取最近几次运行的中位数
+    'HISTORY_WINDOW': 5,
+    # 没有任何历史数据时的模块预估耗时（秒）
+    'DEFAULT_DURATION': 60,
 }
 
 # 其他配置可以按需添加
@@ -28,7 +88,11 @@ LOG_CONFIG = {
 DEVICE_CONFIG = {
     'IOS': {
         'uri': "iOS:///http://127.0.0.1:8100",
-        'options': {}
+        'options': {},
+        # 可以指定特定设备，多设备时由iproxy守护为每台设备分配本地端口
+        'udid': None,
+        'device_port': 8100,  # 设备上WDA监听的端口
+        'local_port_base': 8100,  # 本地转发端口从该值开始分配
     },
     'ANDROID': {
         'uri': "Android:///",  # 默认连接第一个设备
@@ -40,6 +104,13 @@ DEVICE_CONFIG = {
         },
         # 可以指定特定设备
         'specific_device': None,  # 例如: "emulator-5554" 或设备序列号
+        # 设备属性快照缓存有效期（秒），见 core.andriod.get_device_snapshot
+        'snapshot_ttl': 30,
+        # 是否通过常驻adb shell会话执行命令，见 core.adb_shell
+        'persistent_shell': True,
+        # 图像查询使用的截图后端，见 core.capture：
+        # raw(adb exec-out screencap原始帧缓冲，无编解码) / png / airtest(按cap_method截图)
+        'capture_backend': 'raw',
     },
     'WINDOWS': {
         'uri': "Windows:///",
@@ -4,21 +4,57 @@
 import pytest
 import allure
 import os
+import sys
 import logging
-import zipfile
-import shutil
-from datetime import datetime
-from config import AIRTEST_CONFIG, ALLURE_CONFIG
+from config import AIRTEST_CONFIG, ALLURE_CONFIG, BASE_DIR
 from utils.logger import setup_logger
-from utils.device_manager import DeviceManager
+from utils.duration_store import DurationStore
+from utils.shard_runner import DEVICE_SERIAL_ENV, platform_of_module
+from utils.report_packager import REPORT_KEY_LABEL, get_report_packager, shutdown_report_packager
+from utils.report_service import get_report_service, shutdown_report_service
+from utils.platform_collect import PlatformCollector, platform_name
 
 # 设置日志
 logger = setup_logger(__name__)
 
+# 用例耗时记录: nodeid -> 累计耗时与结果
+_test_durations = {}
+_duration_store = None
+# 收集阶段的平台过滤
+_platform_collector = None
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--platform", action="append", default=[],
+        help="只收集指定平台的用例（android/ios/windows/macos，可多次指定或用逗号分隔），默认为已连接设备的平台"
+    )
+    parser.addoption("--all-platforms", action="store_true", default=False, help="收集全部平台的用例，不按设备过滤")
+
+
+def pytest_configure(config):
+    global _platform_collector
+    _platform_collector = PlatformCollector(config)
+
+
+def pytest_ignore_collect(collection_path, config):
+    """没有连接对应平台设备的用例模块不收集（也就不会导入）"""
+    if _platform_collector is not None and _platform_collector.should_ignore(str(collection_path)):
+        return True
+    return None
+
+
+def pytest_collection_finish(session):
+    if _platform_collector is None:
+        return
+    _platform_collector.save()
+    if _platform_collector.enabled:
+        logger.info(_platform_collector.summary())
+
 
 @pytest.fixture(scope="module")
 def setup_test(request):
-    """测试环境初始化，在测试开始时连接设备，在测试结束后断开设备"""
+    """测试环境初始化，在测试开始时连接设备（会话内复用已有连接）并切换日志目录"""
     # 获取当前测试文件路径
     test_file = request.module.__file__
     test_dir = os.path.dirname(test_file)
@@ -27,33 +63,150 @@ def setup_test(request):
     # 确保日志目录存在
     os.makedirs(log_dir, exist_ok=True)
     
-    # 根据测试文件路径自动识别平台
-    platform = "iOS"  # 默认平台
-    if "android" in test_file.lower() or "andriod" in test_file.lower():
-        platform = "Android"
-    elif "windows" in test_file.lower() or "win" in test_file.lower():
-        platform = "Windows"
-    elif "macos" in test_file.lower() or "mac" in test_file.lower():
-        platform = "macOS"
+    # 优先使用模块声明的 pytest.mark.platform，其次按用例目录判断，都没有时默认为iOS
+    marker = request.node.get_closest_marker("platform")
+    if marker is not None and marker.args:
+        platform = platform_name(marker.args[0])
+    else:
+        platform = platform_name(platform_of_module(test_file))
     
     logger.info(f"自动识别平台: {platform}")
     
-    # 初始化设备
+    # 初始化设备（device_manager会导入airtest，用到时才导入，按平台忽略全部用例时收集阶段不需要）
+    from utils.device_manager import DeviceManager
     DeviceManager.init_device(test_file, log_dir, platform)
+
+    # 在第一个步骤执行前启用区域优先匹配，并预加载本模块引用的模板图片
+    _prepare_matching(test_file)
     
     yield
+
+    try:
+        from core.roi_match import get_roi_matcher
+        logger.info(f"区域匹配命中统计: {get_roi_matcher().stats()}")
+    except Exception as e:
+        logger.error(f"获取区域匹配统计失败: {str(e)}")
+
+    try:
+        from core.frame_diff import stability_report
+        if stability_report.calls:
+            logger.info(f"画面稳定等待统计（相对固定sleep）: {stability_report.summary()}")
+        stability_report.reset()
+    except Exception as e:
+        logger.error(f"获取画面稳定等待统计失败: {str(e)}")
     
-    # 测试结束后断开设备
-    DeviceManager.disconnect()
+    # 本模块的日志不再写入，开始后台去重截图并渲染报告
+    try:
+        script_name = os.path.splitext(os.path.basename(test_file))[0]
+        get_report_service().release(os.path.join(log_dir, script_name))
+    except Exception as e:
+        logger.error(f"提交 Airtest 报告渲染失败: {str(e)}")
+
+    # 模块结束后释放设备（会话内复用连接时保持连接，会话结束时统一断开）
+    DeviceManager.release_device()
+
+
+
+def _prepare_matching(test_file):
+    """启用模板注册表和区域优先匹配，并预加载测试模块中的模板，失败时不影响用例执行"""
+    try:
+        from airtest.core.helper import G
+        from core import roi_match, template_registry
+
+        template_registry.install()
+        roi_match.install()
+        screen_resolution = None
+        try:
+            screen_resolution = tuple(G.DEVICE.get_current_resolution())
+        except Exception as e:
+            logger.warning(f"获取屏幕分辨率失败，只预加载模板原图: {str(e)}")
+        template_registry.warm_up(test_file, screen_resolution)
+    except Exception as e:
+        logger.error(f"预加载模板失败: {str(e)}")
 
 
+@pytest.fixture
+def perf_sampler(request):
+    """
+    在测试执行期间后台采集Android性能数据，结束后把统计结果附加到Allure
+
+    用法: @pytest.mark.perf(package="com.example.app", interval=1.0)
+    """
+    from core.perf_sampler import PerfSampler
+
+    marker = request.node.get_closest_marker("perf")
+    if marker is None or not marker.kwargs.get("package"):
+        pytest.fail("使用 perf_sampler 需要通过 @pytest.mark.perf(package=...) 指定应用包名")
+
+    sampler = PerfSampler(
+        marker.kwargs["package"],
+        interval=marker.kwargs.get("interval", 1.0)
+    )
+    sampler.start()
+
+    yield sampler
+
+    sampler.stop()
+    try:
+        summary = sampler.summary_json()
+        logger.info(f"性能采样统计: {summary}")
+        allure.attach(
+            summary,
+            name="性能采样统计(p50/p95/p99)",
+            attachment_type=allure.attachment_type.JSON
+        )
+        series_path = sampler.series.save(
+            os.path.join(AIRTEST_CONFIG['EXPORT_DIR'], "perf", f"{request.node.name}.npz")
+        )
+        allure.attach.file(
+            series_path,
+            name="性能采样时间序列.npz",
+            extension="npz"
+        )
+    except Exception as e:
+        logger.error(f"附加性能采样结果时出错: {str(e)}")
+
+
+def pytest_runtest_logreport(report):
+    """累计每个用例setup/call/teardown的耗时，teardown结束后写入历史耗时库"""
+    durations = _test_durations.setdefault(report.nodeid, {'duration': 0.0, 'outcome': None})
+    durations['duration'] += report.duration
+    # 任一阶段失败即记为failed，否则以call阶段的结果为准
+    if report.failed or (report.when == "call" and durations['outcome'] != "failed"):
+        durations['outcome'] = report.outcome
+    if report.when != "teardown":
+        return
+
+    _test_durations.pop(report.nodeid, None)
+    # nodeid 以项目根目录为基准，如 cases/ios/feature1/test_home.py::test_home
+    platform = platform_of_module(os.path.join(BASE_DIR, report.nodeid.split('::', 1)[0]))
+    if not platform:
+        return
+    try:
+        global _duration_store
+        if _duration_store is None:
+            _duration_store = DurationStore()
+        run_id = os.environ.get('TEST_TIMESTAMP') or f"local-{os.getpid()}"
+        _duration_store.record(run_id, report.nodeid, platform, durations['duration'], durations['outcome'])
+    except Exception as e:
+        logger.error(f"记录用例耗时失败: {str(e)}")
+
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_makereport(item, call):
     outcome = yield
     report = outcome.get_result()
-    
+
     if report.when == "call":
+        alluredir = getattr(item.config.option, 'allure_report_dir', None)
+        # 报告由服务延后生成或后台打包时，给用例打上标签，会话结束后再附加到该用例的Allure结果
+        jobs = get_report_service().claim(item.nodeid)
+        if jobs:
+            allure.dynamic.label(REPORT_KEY_LABEL, item.nodeid)
+            return
+        if not alluredir:
+            return
+
         try:
             # 获取当前测试文件名
             current_file_name = os.path.basename(item.fspath)
@@ -74,57 +227,60 @@ def pytest_runtest_makereport(item, call):
             logger.info(f"查找 Airtest 报告路径: {airtest_report}")
             
             if os.path.exists(airtest_report):
-                logger.info(f"找到 Airtest 报告文件: {airtest_report}")
-                
-                # 获取报告所在目录（而不是具体的html文件）
+                # 后台把整个报告目录打包到Allure结果目录，用例不等待，会话结束后再登记到该用例的结果
                 report_dir = os.path.dirname(airtest_report)
-                logger.info(f"Airtest 报告目录: {report_dir}")
-                
-                # 创建临时zip文件
-                timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-                zip_filename = f"airtest_report_{timestamp_str}.zip"
-                zip_filepath = os.path.join(os.getcwd(), zip_filename)
-                
-                try:
-                    with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                        # 遍历报告目录下的所有文件
-                        for root, dirs, files in os.walk(report_dir):
-                            # 从遍历列表中移除 __pycache__ 目录
-                            if '__pycache__' in dirs:
-                                dirs.remove('__pycache__')
-                            
-                            for file in files:
-                                file_path = os.path.join(root, file)
-                                # 获取相对路径，这样在zip文件中保持目录结构
-                                arcname = os.path.relpath(file_path, report_dir)
-                                try:
-                                    zipf.write(file_path, arcname)
-                                    logger.info(f"添加文件到压缩包: {arcname}")
-                                except Exception as e:
-                                    logger.error(f"压缩文件 {file_path} 时出错: {str(e)}")
-                    
-                    # 将zip文件添加到Allure报告
-                    with open(zip_filepath, 'rb') as f:
-                        allure.attach(
-                            f.read(),
-                            name=f"{current_file_name} - (下载到本地即可查看)Airtest Report.zip",
-                            attachment_type="application/zip",
-                            extension='.zip'
-                        )
-                    logger.info("成功将完整的 Airtest 报告添加到 Allure")
-                    
-                except Exception as e:
-                    logger.error(f"压缩报告文件时出错: {str(e)}", exc_info=True)
-                finally:
-                    # 清理临时zip文件
-                    if os.path.exists(zip_filepath):
-                        try:
-                            os.remove(zip_filepath)
-                            logger.info(f"清理临时zip文件: {zip_filepath}")
-                        except Exception as e:
-                            logger.error(f"清理临时zip文件时出错: {str(e)}")
+                logger.info(f"提交 Airtest 报告打包: {report_dir}")
+                get_report_packager(alluredir).submit(
+                    item.nodeid,
+                    report_dir,
+                    name=f"{current_file_name} - (下载到本地即可查看)Airtest Report.zip"
+                )
+                allure.dynamic.label(REPORT_KEY_LABEL, item.nodeid)
             else:
                 logger.warning(f"Airtest 报告文件不存在: {airtest_report}")
                 
         except Exception as e:
-            logger.error(f"添加 Airtest 报告到 Allure 时出错: {str(e)}")
\ No newline at end of file
+            logger.error(f"添加 Airtest 报告到 Allure 时出错: {str(e)}")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """生成延后的Airtest报告并附加到Allure，然后清理后台任务"""
+    try:
+        service = get_report_service()
+        jobs = [job for job in service.flush() if job.keys]
+        alluredir = getattr(session.config.option, 'allure_report_dir', None)
+        if alluredir:
+            packager = get_report_packager(alluredir)
+            if service.mode != 'sync':
+                for job in jobs:
+                    if job.ok:
+                        packager.submit(
+                            job.report_dir,
+                            job.report_dir,
+                            name=f"{os.path.basename(job.script_root)} - (下载到本地即可查看)Airtest Report.zip",
+                            labels=job.keys
+                        )
+            # 包括用例执行期间提交的打包任务，此时用例结果都已写出
+            attached = packager.attach_all(alluredir)
+            if attached:
+                logger.info(f"已将 {attached} 个用例的 Airtest 报告附加到 Allure")
+    except Exception as e:
+        logger.error(f"生成或附加 Airtest 报告时出错: {str(e)}", exc_info=True)
+    finally:
+        shutdown_report_service()
+        shutdown_report_packager()
+        # 用例用到BaseTest时才会导入core.base，停止共用的Poco并输出初始化统计
+        base = sys.modules.get('core.base')
+        if base is not None:
+            logger.info(f"设备/Poco初始化统计: {base.init_stats()}")
+            base.teardown_shared()
+        # 多设备分片时工作进程会多次执行pytest，连接由工作进程在退出前统一断开；
+        # 没有用例连接过设备时不导入device_manager（会导入airtest）
+        if not os.environ.get(DEVICE_SERIAL_ENV):
+            device_manager = sys.modules.get('utils.device_manager')
+            if device_manager is not None:
+                device_manager.DeviceManager.close_pool()
+            # 停止本次会话启动的iproxy，避免其占用端口使下一次运行改用其他端口
+            iproxy = sys.modules.get('core.iproxy_supervisor')
+            if iproxy is not None:
+                iproxy.get_iproxy_supervisor().stop()
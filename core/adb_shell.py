@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+常驻adb shell会话池
+每台设备维护若干个长连接的 `adb shell` 进程，命令通过标准输入写入，
+以哨兵标记分隔每条命令的输出，避免每次调用都重新fork adb进程和握手
+"""
+
+import atexit
+import queue
+import subprocess
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ShellSessionError(Exception):
+    """
+    shell会话本身不可用（进程退出、读写失败、超时）
+
+    command_sent为True表示命令已经写入会话（可能已在设备上执行），调用方不能再重试该命令
+    """
+
+    def __init__(self, message: str, command_sent: bool = False):
+        super().__init__(message)
+        self.command_sent = command_sent
+
+
+class ShellCommandError(Exception):
+    """命令在会话中执行完成但返回了非0退出码"""
+
+    def __init__(self, cmd: str, returncode: int, output: str):
+        super().__init__(f"命令执行失败(exit {returncode}): {cmd}\n{output}")
+        self.cmd = cmd
+        self.returncode = returncode
+        self.output = output
+
+
+class AdbShellSession:
+    """
+    单个常驻shell会话
+
+    argv 默认为 `adb -s <serial> shell`，测试时可以传入 `["sh"]` 用本地shell模拟设备端
+    """
+
+    def __init__(self, argv: List[str], timeout: Optional[float] = 60):
+        """
+        Args:
+            argv: 启动shell进程的命令行
+            timeout: 单条命令的默认超时时间（秒），None表示不超时
+        """
+        self.argv = list(argv)
+        self.timeout = timeout
+        self._proc = None
+        self._chunks = None
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        """启动shell进程以及后台读取线程"""
+        try:
+            self._proc = subprocess.Popen(
+                self.argv,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0
+            )
+        except OSError as e:
+            raise ShellSessionError(f"启动shell会话失败: {str(e)}")
+        self._chunks = queue.Queue()
+        reader = threading.Thread(
+            target=self._read_loop,
+            args=(self._proc.stdout, self._chunks),
+            name=f"adb-shell-reader-{self._proc.pid}",
+            daemon=True
+        )
+        reader.start()
+        logger.debug(f"shell会话已启动: {' '.join(self.argv)} (pid={self._proc.pid})")
+
+    @staticmethod
+    def _read_loop(stream, chunks: queue.Queue) -> None:
+        # Windows下管道不支持select，由独立线程阻塞读取后转交给调用方；
+        # 管道只由读取线程在读到EOF后关闭：其他线程关闭后文件描述符会被新会话的管道复用，
+        # 本线程接下来的read会读走新会话的输出
+        try:
+            while True:
+                data = stream.read1(65536) if hasattr(stream, 'read1') else stream.read(65536)
+                if not data:
+                    return
+                chunks.put(data)
+        finally:
+            chunks.put(None)
+            stream.close()
+
+    def execute(self, cmd: str, timeout: Optional[float] = ...) -> Tuple[int, str]:
+        """
+        在会话中执行一条命令
+
+        Args:
+            cmd: shell命令
+            timeout: 超时时间（秒），不传时使用会话默认值
+
+        Returns:
+            Tuple[int, str]: (退出码, 命令输出)
+        """
+        if timeout is ...:
+            timeout = self.timeout
+
+        with self._lock:
+            if not self.alive:
+                self.start()
+
+            marker = f"__JY_SHELL_END_{uuid.uuid4().hex}__"
+            # 命令包在代码块中并重定向stdin，避免命令读取到后续写入的命令；
+            # 额外的echo保证哨兵独占一行，即使命令输出末尾没有换行
+            payload = f"{{ {cmd}\n}} </dev/null\n__jy_rc=$?; echo; echo {marker}:$__jy_rc\n"
+            try:
+                self._proc.stdin.write(payload.encode('utf-8'))
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self._kill()
+                raise ShellSessionError(f"写入shell会话失败: {str(e)}")
+
+            returncode, output = self._read_until(marker.encode('utf-8'), timeout)
+            return returncode, output
+
+    def _read_until(self, marker: bytes, timeout: Optional[float]) -> Tuple[int, str]:
+        buffer = bytearray()
+        search_from = 0
+        while True:
+            try:
+                chunk = self._chunks.get(timeout=timeout)
+            except queue.Empty:
+                # 输出未读完，会话内容已经错位，只能丢弃整个会话
+                self._kill()
+                raise ShellSessionError(f"等待命令输出超时({timeout}秒)", command_sent=True)
+            if chunk is None:
+                self._kill()
+                raise ShellSessionError("shell会话意外退出", command_sent=True)
+
+            buffer.extend(chunk)
+            index = buffer.find(marker, search_from)
+            if index == -1:
+                search_from = max(0, len(buffer) - len(marker))
+                continue
+
+            line_end = buffer.find(b'\n', index)
+            if line_end == -1:
+                search_from = index
+                continue
+
+            status = buffer[index + len(marker) + 1:line_end].strip()
+            output = bytes(buffer[:index])
+            # 去掉为保证哨兵独占一行而额外输出的换行
+            if output.endswith(b'\n'):
+                output = output[:-1]
+            return int(status or -1), output.decode('utf-8', errors='replace')
+
+    def shell(self, cmd: str, timeout: Optional[float] = ...) -> str:
+        """
+        执行命令并返回输出，非0退出码时抛出ShellCommandError（与Airtest的device.shell行为一致）
+        """
+        returncode, output = self.execute(cmd, timeout)
+        if returncode != 0:
+            raise ShellCommandError(cmd, returncode, output)
+        return output
+
+    def _kill(self) -> None:
+        if self._proc is None:
+            return
+        try:
+            self._proc.kill()
+            self._proc.wait(timeout=5)
+        except Exception:
+            pass
+        # stdout由读取线程在进程退出后关闭
+        try:
+            self._proc.stdin.close()
+        except Exception:
+            pass
+        self._proc = None
+
+    def close(self) -> None:
+        """关闭会话"""
+        with self._lock:
+            if self.alive:
+                try:
+                    self._proc.stdin.write(b"exit\n")
+                    self._proc.stdin.flush()
+                    self._proc.wait(timeout=2)
+                except Exception:
+                    pass
+            self._kill()
+
+
+class ShellSessionPool:
+    """
+    按设备序列号管理的shell会话池
+
+    每台设备最多保持 max_sessions 个会话，空闲会话复用，
+    这样测试线程和后台采样线程可以并发执行命令而互不阻塞
+    """
+
+    def __init__(self, max_sessions: int = 2, timeout: Optional[float] = 60, acquire_timeout: float = 60):
+        """
+        Args:
+            max_sessions: 每台设备的最大会话数
+            timeout: 单条命令的默认超时时间（秒）
+            acquire_timeout: 会话全部被占用时等待空闲会话的最长时间（秒）
+        """
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle: Dict[str, queue.LifoQueue] = {}
+        self._sessions: Dict[str, List[AdbShellSession]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_argv(serialno: str, adb_path: str = "adb") -> List[str]:
+        return [adb_path, '-s', serialno, 'shell']
+
+    def acquire(self, key: str, argv: List[str]) -> AdbShellSession:
+        """
+        获取一个会话，必要时新建，达到上限后等待其他调用释放
+
+        Args:
+            key: 会话池键，通常为设备序列号
+            argv: 新建会话时使用的命令行
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, queue.LifoQueue())
+            sessions = self._sessions.setdefault(key, [])
+            try:
+                return idle.get_nowait()
+            except queue.Empty:
+                pass
+            if len(sessions) < self.max_sessions:
+                session = AdbShellSession(argv, timeout=self.timeout)
+                sessions.append(session)
+                return session
+        try:
+            return idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise ShellSessionError(f"等待空闲shell会话超时({self.acquire_timeout}秒)")
+
+    def release(self, key: str, session: AdbShellSession) -> None:
+        """归还会话，会话池已被关闭时直接关闭该会话"""
+        idle = self._idle.get(key)
+        if idle is None:
+            session.close()
+            return
+        idle.put(session)
+
+    def shell(self, key: str, argv: List[str], cmd: str, timeout: Optional[float] = ...) -> str:
+        """从池中取出会话执行命令后归还"""
+        session = self.acquire(key, argv)
+        try:
+            return session.shell(cmd, timeout)
+        finally:
+            self.release(key, session)
+
+    def close(self, key: Optional[str] = None) -> None:
+        """
+        关闭会话
+
+        Args:
+            key: 会话池键，为None时关闭全部会话
+        """
+        with self._lock:
+            keys = list(self._sessions) if key is None else [key]
+            for k in keys:
+                for session in self._sessions.pop(k, []):
+                    session.close()
+                self._idle.pop(k, None)
+
+
+_pool = ShellSessionPool()
+atexit.register(_pool.close)
+
+
+def get_session_pool() -> ShellSessionPool:
+    """获取全局会话池"""
+    return _pool
+
+
+def device_shell(device, cmd: str, timeout: Optional[float] = ...) -> str:
+    """
+    通过常驻会话在Airtest Android设备上执行命令
+
+    Args:
+        device: airtest Android设备对象
+        cmd: shell命令
+        timeout: 超时时间（秒）
+
+    Returns:
+        str: 命令输出
+    """
+    adb_path = getattr(getattr(device, 'adb', None), 'adb_path', None) or "adb"
+    argv = ShellSessionPool.build_argv(device.serialno, adb_path)
+    return _pool.shell(device.serialno, argv, cmd, timeout)
+
+
+if __name__ == "__main__":
+    # 使用本地sh模拟设备端shell，演示同一会话内连续执行多条命令
+    session = AdbShellSession(["sh"])
+    print(repr(session.shell("echo hello")))
+    print(session.execute("printf 'no newline'; exit_code_test() { return 3; }; exit_code_test"))
+    # 两次输出的pid相同，说明复用的是同一个shell进程
+    print(session.shell("echo pid=$$").strip())
+    print(session.shell("echo pid=$$").strip())
+    session.close()
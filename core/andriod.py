@@ -6,12 +6,193 @@
 """
 
 import subprocess
+import threading
 import time
 import re
 import json
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Union
 from airtest.core.android.android import Android
 from airtest.core.helper import G
+from config import DEVICE_CONFIG
+from core import dumpsys
+from core.adb_shell import ShellSessionError, device_shell
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _shell(cmd: str, timeout: Optional[float] = ...) -> str:
+    """
+    在当前设备上执行shell命令
+
+    优先使用常驻shell会话，会话无法启动或取不到时回退到Airtest的device.shell；
+    命令已写入会话后出错（如超时）不再回退，避免 pm clear、svc wifi 等命令被执行两次
+
+    Args:
+        cmd: shell命令
+        timeout: 超时时间（秒），不传时使用会话池默认值
+    """
+    device = G.DEVICE
+    if DEVICE_CONFIG['ANDROID'].get('persistent_shell', True):
+        try:
+            return device_shell(device, cmd, timeout)
+        except ShellSessionError as e:
+            if e.command_sent:
+                raise
+            logger.warning(f"常驻shell会话不可用，回退到device.shell: {str(e)}")
+    return device.shell(cmd)
+
+
+# getprop 输出格式: [ro.build.version.release]: [13]
+_GETPROP_PATTERN = re.compile(r'^\[([^\]]+)\]: \[(.*)\]\s*$', re.MULTILINE)
+_RESOLUTION_PATTERN = re.compile(r'(\d+)x(\d+)')
+_BATTERY_LEVEL_PATTERN = re.compile(r'^\s*level: (\d+)', re.MULTILINE)
+
+# 合并shell调用中各段输出之间的分隔符
+_SECTION_SEPARATOR = '__JY_SNAPSHOT_SECTION__'
+_SNAPSHOT_SECTIONS = [
+    'wm size',
+    'dumpsys battery',
+    'dumpsys wifi | grep "Wi-Fi is" || true',
+]
+
+_snapshot_cache: Dict[str, 'DeviceSnapshot'] = {}
+_snapshot_lock = threading.Lock()
+
+
+@dataclass
+class DeviceSnapshot:
+    """
+    一次批量采集得到的设备属性快照
+
+    getprop全量输出 + 一次合并的shell调用（wm size / dumpsys battery / dumpsys wifi），
+    所有属性查询都从同一份快照中读取，避免逐项adb往返
+    """
+    serialno: str
+    props: Dict[str, str] = field(default_factory=dict)
+    resolution: str = "unknown"
+    battery_level: int = -1
+    wifi_enabled: bool = False
+    captured_at: float = field(default_factory=time.time)
+
+    @property
+    def android_version(self) -> str:
+        return self.props.get('ro.build.version.release', '')
+
+    @property
+    def api_level(self) -> str:
+        return self.props.get('ro.build.version.sdk', '')
+
+    @property
+    def brand(self) -> str:
+        return self.props.get('ro.product.brand', '')
+
+    @property
+    def model(self) -> str:
+        return self.props.get('ro.product.model', '')
+
+    @property
+    def manufacturer(self) -> str:
+        return self.props.get('ro.product.manufacturer', '')
+
+    def is_expired(self, ttl: float) -> bool:
+        """快照是否已超过有效期"""
+        return time.time() - self.captured_at > ttl
+
+    def to_dict(self) -> Dict[str, Union[str, int, bool]]:
+        """转换为get_device_info返回的字典格式"""
+        return {
+            'device_id': self.serialno,
+            'android_version': self.android_version,
+            'api_level': self.api_level,
+            'brand': self.brand,
+            'model': self.model,
+            'manufacturer': self.manufacturer,
+            'resolution': self.resolution,
+            'battery_level': self.battery_level,
+            'wifi_status': self.wifi_enabled
+        }
+
+
+def parse_getprop(output: str) -> Dict[str, str]:
+    """
+    解析getprop全量输出
+
+    Args:
+        output: getprop命令输出
+
+    Returns:
+        Dict: 属性名到属性值的映射
+    """
+    return {key: value for key, value in _GETPROP_PATTERN.findall(output)}
+
+
+def _parse_snapshot_sections(serialno: str, props: Dict[str, str], output: str) -> DeviceSnapshot:
+    """将合并shell调用的输出按分隔符拆分并解析为快照"""
+    sections = output.split(_SECTION_SEPARATOR)
+    sections += [''] * (len(_SNAPSHOT_SECTIONS) - len(sections))
+    wm_output, battery_output, wifi_output = sections[:len(_SNAPSHOT_SECTIONS)]
+
+    snapshot = DeviceSnapshot(serialno=serialno, props=props)
+
+    # 解析输出: Physical size: 1080x1920（存在Override size时以最后一行为准）
+    resolutions = _RESOLUTION_PATTERN.findall(wm_output)
+    if resolutions:
+        width, height = resolutions[-1]
+        snapshot.resolution = f"{width}x{height}"
+
+    # 解析输出: level: 85
+    level_match = _BATTERY_LEVEL_PATTERN.search(battery_output)
+    if level_match:
+        snapshot.battery_level = int(level_match.group(1))
+
+    snapshot.wifi_enabled = "enabled" in wifi_output.lower()
+    return snapshot
+
+
+def get_device_snapshot(refresh: bool = False) -> DeviceSnapshot:
+    """
+    获取当前设备的属性快照，按序列号缓存，超过TTL后自动重新采集
+
+    Args:
+        refresh: 是否忽略缓存强制重新采集
+
+    Returns:
+        DeviceSnapshot: 设备属性快照
+    """
+    device = G.DEVICE
+    if not isinstance(device, Android):
+        raise ValueError("当前设备不是Android设备")
+
+    ttl = DEVICE_CONFIG['ANDROID'].get('snapshot_ttl', 30)
+    serialno = device.serialno
+    with _snapshot_lock:
+        snapshot = _snapshot_cache.get(serialno)
+        if snapshot and not refresh and not snapshot.is_expired(ttl):
+            return snapshot
+
+    props = parse_getprop(_shell('getprop'))
+    combined_cmd = f'; echo {_SECTION_SEPARATOR}; '.join(_SNAPSHOT_SECTIONS)
+    snapshot = _parse_snapshot_sections(serialno, props, _shell(combined_cmd))
+
+    with _snapshot_lock:
+        _snapshot_cache[serialno] = snapshot
+    return snapshot
+
+
+def invalidate_device_snapshot(serialno: Optional[str] = None) -> None:
+    """
+    清除设备属性快照缓存
+
+    Args:
+        serialno: 设备序列号，为None时清除全部缓存
+    """
+    with _snapshot_lock:
+        if serialno is None:
+            _snapshot_cache.clear()
+        else:
+            _snapshot_cache.pop(serialno, None)
 
 
 def get_device_info() -> Dict[str, str]:
@@ -22,24 +203,7 @@ def get_device_info() -> Dict[str, str]:
         Dict: 设备信息字典
     """
     try:
-        device = G.DEVICE
-        if not isinstance(device, Android):
-            raise ValueError("当前设备不是Android设备")
-        
-        # 获取设备基本信息
-        info = {
-            'device_id': device.serialno,
-            'android_version': device.shell('getprop ro.build.version.release').strip(),
-            'api_level': device.shell('getprop ro.build.version.sdk').strip(),
-            'brand': device.shell('getprop ro.product.brand').strip(),
-            'model': device.shell('getprop ro.product.model').strip(),
-            'manufacturer': device.shell('getprop ro.product.manufacturer').strip(),
-            'resolution': get_screen_resolution(),
-            'battery_level': get_battery_level(),
-            'wifi_status': get_wifi_status()
-        }
-        
-        return info
+        return get_device_snapshot().to_dict()
     except Exception as e:
         print(f"获取设备信息失败: {str(e)}")
         return {}
@@ -53,13 +217,7 @@ def get_screen_resolution() -> str:
         str: 分辨率字符串，如 "1080x1920"
     """
     try:
-        device = G.DEVICE
-        output = device.shell('wm size')
-        # 解析输出: Physical size: 1080x1920
-        match = re.search(r'(\d+)x(\d+)', output)
-        if match:
-            return f"{match.group(1)}x{match.group(2)}"
-        return "unknown"
+        return get_device_snapshot().resolution
     except Exception as e:
         print(f"获取屏幕分辨率失败: {str(e)}")
         return "unknown"
@@ -73,13 +231,7 @@ def get_battery_level() -> int:
         int: 电量百分比
     """
     try:
-        device = G.DEVICE
-        output = device.shell('dumpsys battery | grep level')
-        # 解析输出: level: 85
-        match = re.search(r'level: (\d+)', output)
-        if match:
-            return int(match.group(1))
-        return -1
+        return get_device_snapshot().battery_level
     except Exception as e:
         print(f"获取电池电量失败: {str(e)}")
         return -1
@@ -93,9 +245,7 @@ def get_wifi_status() -> bool:
         bool: True表示已连接WiFi
     """
     try:
-        device = G.DEVICE
-        output = device.shell('dumpsys wifi | grep "Wi-Fi is"')
-        return "enabled" in output.lower()
+        return get_device_snapshot().wifi_enabled
     except Exception as e:
         print(f"获取WiFi状态失败: {str(e)}")
         return False
@@ -109,8 +259,7 @@ def get_installed_apps() -> List[str]:
         List[str]: 应用包名列表
     """
     try:
-        device = G.DEVICE
-        output = device.shell('pm list packages -3')  # -3表示第三方应用
+        output = _shell('pm list packages -3')  # -3表示第三方应用
         packages = []
         for line in output.strip().split('\n'):
             if line.startswith('package:'):
@@ -133,27 +282,9 @@ def get_app_info(package_name: str) -> Dict[str, str]:
         Dict: 应用信息字典
     """
     try:
-        device = G.DEVICE
-        output = device.shell(f'dumpsys package {package_name}')
-        
-        info = {'package_name': package_name}
-        
-        # 解析版本号
-        version_match = re.search(r'versionName=([^\s]+)', output)
-        if version_match:
-            info['version'] = version_match.group(1)
-            
-        # 解析版本码
-        code_match = re.search(r'versionCode=(\d+)', output)
-        if code_match:
-            info['version_code'] = code_match.group(1)
-            
-        # 解析安装路径
-        path_match = re.search(r'codePath=([^\s]+)', output)
-        if path_match:
-            info['install_path'] = path_match.group(1)
-            
-        return info
+        output = _shell(f'dumpsys package {package_name}')
+        # 解析版本号、版本码、安装路径，三项都找到后即停止扫描
+        return dumpsys.parse_package(output, package_name).to_dict()
     except Exception as e:
         print(f"获取应用信息失败: {str(e)}")
         return {'package_name': package_name}
@@ -170,8 +301,7 @@ def force_stop_app(package_name: str) -> bool:
         bool: 操作是否成功
     """
     try:
-        device = G.DEVICE
-        device.shell(f'am force-stop {package_name}')
+        _shell(f'am force-stop {package_name}')
         return True
     except Exception as e:
         print(f"强制停止应用失败: {str(e)}")
@@ -189,8 +319,7 @@ def clear_app_cache(package_name: str) -> bool:
         bool: 操作是否成功
     """
     try:
-        device = G.DEVICE
-        result = device.shell(f'pm clear {package_name}')
+        result = _shell(f'pm clear {package_name}')
         return "Success" in result
     except Exception as e:
         print(f"清除应用缓存失败: {str(e)}")
@@ -209,8 +338,7 @@ def grant_permission(package_name: str, permission: str) -> bool:
         bool: 操作是否成功
     """
     try:
-        device = G.DEVICE
-        device.shell(f'pm grant {package_name} {permission}')
+        _shell(f'pm grant {package_name} {permission}')
         return True
     except Exception as e:
         print(f"授予权限失败: {str(e)}")
@@ -229,8 +357,7 @@ def revoke_permission(package_name: str, permission: str) -> bool:
         bool: 操作是否成功
     """
     try:
-        device = G.DEVICE
-        device.shell(f'pm revoke {package_name} {permission}')
+        _shell(f'pm revoke {package_name} {permission}')
         return True
     except Exception as e:
         print(f"撤销权限失败: {str(e)}")
@@ -245,13 +372,9 @@ def get_current_activity() -> str:
         str: 当前Activity名称
     """
     try:
-        device = G.DEVICE
-        output = device.shell('dumpsys window windows | grep -E "mCurrentFocus|mFocusedApp"')
+        output = _shell('dumpsys window windows | grep -E "mCurrentFocus|mFocusedApp"')
         # 解析当前焦点窗口
-        match = re.search(r'([\w\.]+/[\w\.]+)', output)
-        if match:
-            return match.group(1)
-        return "unknown"
+        return dumpsys.parse_current_activity(output) or "unknown"
     except Exception as e:
         print(f"获取当前Activity失败: {str(e)}")
         return "unknown"
@@ -265,21 +388,11 @@ def get_memory_info(package_name: str) -> Dict[str, Union[int, str]]:
         package_name: 应用包名
         
     Returns:
-        Dict: 内存信息字典
+        Dict: 内存信息字典，除总量外还包含私有脏页以及Native/Dalvik堆的大小、已分配、空闲（单位：KB）
     """
     try:
-        device = G.DEVICE
-        output = device.shell(f'dumpsys meminfo {package_name}')
-        
-        info = {'package_name': package_name}
-        
-        # 解析内存使用量（单位：KB）
-        total_match = re.search(r'TOTAL\s+(\d+)', output)
-        if total_match:
-            info['total_memory_kb'] = int(total_match.group(1))
-            info['total_memory_mb'] = round(int(total_match.group(1)) / 1024, 2)
-            
-        return info
+        output = _shell(f'dumpsys meminfo {package_name}')
+        return dumpsys.parse_meminfo(output, package_name).to_dict()
     except Exception as e:
         print(f"获取内存信息失败: {str(e)}")
         return {'package_name': package_name}
@@ -294,7 +407,8 @@ def enable_wifi() -> bool:
     """
     try:
         device = G.DEVICE
-        device.shell('svc wifi enable')
+        _shell('svc wifi enable')
+        invalidate_device_snapshot(device.serialno)
         return True
     except Exception as e:
         print(f"启用WiFi失败: {str(e)}")
@@ -310,7 +424,8 @@ def disable_wifi() -> bool:
     """
     try:
         device = G.DEVICE
-        device.shell('svc wifi disable')
+        _shell('svc wifi disable')
+        invalidate_device_snapshot(device.serialno)
         return True
     except Exception as e:
         print(f"禁用WiFi失败: {str(e)}")
@@ -328,10 +443,9 @@ def set_airplane_mode(enable: bool) -> bool:
         bool: 操作是否成功
     """
     try:
-        device = G.DEVICE
         value = 1 if enable else 0
-        device.shell(f'settings put global airplane_mode_on {value}')
-        device.shell('am broadcast -a android.intent.action.AIRPLANE_MODE --ez state true' if enable else 'am broadcast -a android.intent.action.AIRPLANE_MODE --ez state false')
+        _shell(f'settings put global airplane_mode_on {value}')
+        _shell('am broadcast -a android.intent.action.AIRPLANE_MODE --ez state true' if enable else 'am broadcast -a android.intent.action.AIRPLANE_MODE --ez state false')
         return True
     except Exception as e:
         print(f"设置飞行模式失败: {str(e)}")
@@ -349,8 +463,8 @@ def take_bug_report(output_path: str = "/sdcard/bugreport.zip") -> bool:
         bool: 操作是否成功
     """
     try:
-        device = G.DEVICE
-        device.shell(f'bugreport {output_path}')
+        # bugreport耗时较长，不受会话默认超时限制
+        _shell(f'bugreport {output_path}', timeout=None)
         return True
     except Exception as e:
         print(f"生成bug报告失败: {str(e)}")
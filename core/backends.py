@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+平台后端注册表
+每个平台一条记录：设备类与Poco类，值为 "模块:类名"，第一次使用时才导入。
+只跑Android用例时不会导入 wda/pywinauto（Linux上Windows后端本身就无法导入）
+"""
+
+import importlib
+import sys
+import threading
+from typing import Optional
+
+# 平台 -> {'device': 设备类, 'poco': Poco类}，平台不支持Poco时为None
+PLATFORM_BACKENDS = {
+    'ios': {'device': 'airtest.core.ios.ios:IOS', 'poco': 'poco.drivers.ios:iosPoco'},
+    'android': {
+        'device': 'airtest.core.android.android:Android',
+        'poco': 'poco.drivers.android.uiautomation:AndroidUiautomationPoco',
+    },
+    'windows': {'device': 'airtest.core.win.win:Windows', 'poco': None},
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def _split(spec: str):
+    module_name, _, class_name = spec.partition(':')
+    return module_name, class_name
+
+
+def register_backend(platform: str, device: str, poco: Optional[str] = None) -> None:
+    """
+    注册平台后端
+
+    Args:
+        platform: 平台名
+        device: 设备类，"模块:类名"
+        poco: Poco类，"模块:类名"，不支持Poco时为None
+    """
+    platform = platform.lower()
+    with _lock:
+        PLATFORM_BACKENDS[platform] = {'device': device, 'poco': poco}
+        for key in [k for k in _loaded if k[0] == platform]:
+            del _loaded[key]
+
+
+def load_backend(platform: str, kind: str = 'device'):
+    """
+    导入并返回平台后端类（结果会缓存）
+
+    Args:
+        platform: 平台名
+        kind: 'device' 或 'poco'
+
+    Returns:
+        后端类，该平台没有对应后端时返回None
+    """
+    platform = platform.lower()
+    key = (platform, kind)
+    if key not in _loaded:
+        if platform not in PLATFORM_BACKENDS:
+            raise ValueError(f"Unsupported platform: {platform}")
+        spec = PLATFORM_BACKENDS[platform][kind]
+        backend = None
+        if spec:
+            module_name, class_name = _split(spec)
+            backend = getattr(importlib.import_module(module_name), class_name)
+        with _lock:
+            _loaded[key] = backend
+    return _loaded[key]
+
+
+def is_platform(device, platform: str) -> bool:
+    """
+    设备是否属于指定平台，不会为了判断而导入后端
+
+    后端模块尚未导入时，设备不可能是该平台的实例，直接返回False
+    """
+    spec = PLATFORM_BACKENDS.get(platform.lower(), {}).get('device')
+    if not spec or device is None:
+        return False
+    module_name, class_name = _split(spec)
+    module = sys.modules.get(module_name)
+    return module is not None and isinstance(device, getattr(module, class_name))
@@ -8,51 +8,293 @@ Airtest UI自动化测试基类
 
 import os
 import time
+import functools
+import threading
 from typing import Union, List, Optional
-from airtest.core.api import *
+from airtest.core.cv import Template
+from airtest.core.error import TargetNotFoundError
 from airtest.core.helper import G
-from airtest.core.ios.ios import IOS
-from airtest.core.android.android import Android
-from airtest.core.win.win import Windows
-from poco.drivers.ios import iosPoco
-from poco.drivers.android.uiautomation import AndroidUiautomationPoco
-from ios import start_ios_app_by_wda
+from airtest.core.settings import Settings as ST
+from core.backends import PLATFORM_BACKENDS, is_platform, load_backend
+from core.iproxy_supervisor import get_iproxy_supervisor
+from core.popup_handler import input_lock, input_epoch, mark_input
+from core.batch_match import BatchMatcher, BatchResult, MatchHit
+from core.capture import capture_frame
+from core.frame_diff import AdaptivePoller, wait_for_stable_frames
+from core.poco_snapshot import PocoSnapshotCache, SnapshotNode, default_window_probe
+from config import AIRTEST_CONFIG
+
+
+def _input_action(func):
+    """输入类操作：与后台弹窗监视器的关闭操作互斥，执行后截图缓存失效"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with input_lock:
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                mark_input()
+    return wrapper
+
+
+class FrameCache:
+    """
+    截图帧缓存
+
+    有效期内的多次图像查询复用同一帧截图；任何输入操作（包括后台弹窗监视器的点击）之后缓存立即失效
+    """
+
+    def __init__(self, device, max_age: Optional[float] = None):
+        """
+        Args:
+            device: 设备对象
+            max_age: 缓存有效期（秒），默认取 AIRTEST_CONFIG['FRAME_CACHE_TTL']
+        """
+        self.device = device
+        self.max_age = AIRTEST_CONFIG.get('FRAME_CACHE_TTL', 0.3) if max_age is None else max_age
+        self.hits = 0
+        self.misses = 0
+        self._frame = None
+        self._captured_at = 0.0
+        self._epoch = None
+        self._lock = threading.Lock()
+
+    def get(self, fresh: bool = False):
+        """
+        获取截图帧
+
+        Args:
+            fresh: 为True时忽略缓存，重新截图
+
+        Returns:
+            截图(numpy数组)，截图失败时为None
+        """
+        with self._lock:
+            if (not fresh and self._frame is not None and self._epoch == input_epoch()
+                    and time.monotonic() - self._captured_at <= self.max_age):
+                self.hits += 1
+                return self._frame
+            self.misses += 1
+            # 先记录输入计数再截图，截图期间发生的输入会让这一帧在下次查询时失效
+            epoch = input_epoch()
+            frame = capture_frame(self.device)
+            self._frame, self._captured_at, self._epoch = frame, time.monotonic(), epoch
+            return frame
+
+    def invalidate(self) -> None:
+        """丢弃缓存的帧"""
+        with self._lock:
+            self._frame = None
+
+    def stats(self) -> dict:
+        """命中统计，hits即节省的截图次数"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+
+class _SharedDevice:
+    """同一台设备上所有BaseTest实例共用的设备与Poco对象"""
+
+    def __init__(self):
+        self.device = None
+        self.poco = None
+        self.device_init_seconds = 0.0
+        self.poco_init_seconds = 0.0
+        self.lock = threading.RLock()
+
+    def reset(self) -> None:
+        """设备连接失效时丢弃设备及绑定在其上的Poco"""
+        if self.poco is not None:
+            try:
+                self.poco.stop_running()
+            except Exception as e:
+                print(f"停止Poco失败: {str(e)}")
+        self.device = None
+        self.poco = None
+
+
+def _is_connected(device) -> bool:
+    """设备是否仍在Airtest的设备列表中（设备连接池会移除失效的连接）"""
+    return any(d is device for d in G.DEVICE_LIST)
+
+
+_shared_devices = {}
+_shared_lock = threading.Lock()
+# 初始化统计：created为实际创建次数，reused为复用次数，poco_skipped为从未使用Poco的实例数，
+# saved_seconds为按实际创建耗时估算的节省时间
+_init_stats = {
+    'device_created': 0, 'device_reused': 0,
+    'poco_created': 0, 'poco_reused': 0, 'poco_skipped': 0,
+    'saved_seconds': 0.0,
+}
+
+
+def _shared_entry(platform: str, udid: Optional[str]) -> _SharedDevice:
+    with _shared_lock:
+        entry = _shared_devices.get((platform, udid))
+        if entry is None:
+            entry = _SharedDevice()
+            _shared_devices[(platform, udid)] = entry
+        return entry
+
+
+def init_stats() -> dict:
+    """设备/Poco初始化统计"""
+    with _shared_lock:
+        stats = dict(_init_stats)
+    stats['saved_seconds'] = round(stats['saved_seconds'], 2)
+    return stats
+
+
+def teardown_shared() -> None:
+    """停止共用的Poco并清空共享的设备对象（会话结束时调用）"""
+    with _shared_lock:
+        entries = list(_shared_devices.values())
+        _shared_devices.clear()
+    for entry in entries:
+        if entry.poco is not None:
+            try:
+                entry.poco.stop_running()
+            except Exception as e:
+                print(f"停止Poco失败: {str(e)}")
 
 
 class BaseTest:
-    def __init__(self, platform: str = "iOS"):
+    def __init__(self, platform: str = "iOS", udid: Optional[str] = None):
         """
         初始化测试基类
 
+        设备与Poco在第一次使用时才创建，并在同一台设备的所有BaseTest实例之间共用
+
         Args:
             platform: 测试平台，支持 "iOS"(默认)、"Android"、"Windows"
+            udid: iOS设备UDID，多台iPhone并行时用于选择设备及其iproxy端口
         """
         self.platform = platform.lower()
-        self.device = None
-        self.poco = None
-        self._init_device()
-        self._init_poco()
-
-    def _init_device(self):
-        """初始化设备"""
-        if self.platform == "ios":
-            self.device = IOS()
-        elif self.platform == "android":
-            self.device = Android()
-        elif self.platform == "windows":
-            self.device = Windows()
-        else:
+        if self.platform not in PLATFORM_BACKENDS:
             raise ValueError(f"Unsupported platform: {self.platform}")
+        self.udid = udid
+        self._device = None
+        self._poco = None
+        self._frame_cache = None
+        self._poco_snapshot = None
+        self.batch_matcher = BatchMatcher()
+        self._wait_stats = {'probes': 0, 'matched': 0, 'skipped': 0}
+        self._shared = _shared_entry(self.platform, udid)
+
+    @property
+    def device(self):
+        """
+        设备对象，第一次访问时创建（已连接的当前设备平台一致时直接使用）
 
-        if self.device:
-            G.add_device(self.device)
+        每次访问都确认设备仍在 G.DEVICE_LIST 中：设备连接池在健康检查失败后会重连并移除失效的设备，
+        此时丢弃共享的旧设备和绑定在其上的Poco，改用新的连接
+        """
+        if self._device is not None and not _is_connected(self._device):
+            self._device = None
+            self._poco = None
+            self._frame_cache = None
+            self._poco_snapshot = None
+        if self._device is None:
+            with self._shared.lock:
+                if self._shared.device is not None and not _is_connected(self._shared.device):
+                    print("共享的设备连接已失效，改用当前连接")
+                    self._shared.reset()
+                if self._shared.device is None:
+                    started = time.time()
+                    self._shared.device = self._create_device()
+                    self._shared.device_init_seconds = time.time() - started
+                    with _shared_lock:
+                        _init_stats['device_created'] += 1
+                    # 自行创建的设备需要登记；沿用的当前设备已在列表中，不改变设备连接池设置的当前设备
+                    if not _is_connected(self._shared.device):
+                        G.add_device(self._shared.device)
+                else:
+                    with _shared_lock:
+                        _init_stats['device_reused'] += 1
+                        _init_stats['saved_seconds'] += self._shared.device_init_seconds
+                self._device = self._shared.device
+        return self._device
+
+    @property
+    def poco(self):
+        """Poco对象，第一次访问时创建（Android会安装并启动pocoservice）"""
+        device = self.device
+        if self._poco is None:
+            with self._shared.lock:
+                if self._shared.poco is None:
+                    started = time.time()
+                    self._shared.poco = self._create_poco(device)
+                    self._shared.poco_init_seconds = time.time() - started
+                    with _shared_lock:
+                        _init_stats['poco_created'] += 1
+                else:
+                    with _shared_lock:
+                        _init_stats['poco_reused'] += 1
+                        _init_stats['saved_seconds'] += self._shared.poco_init_seconds
+                self._poco = self._shared.poco
+        return self._poco
+
+    @property
+    def frame_cache(self) -> FrameCache:
+        device = self.device
+        if self._frame_cache is None:
+            self._frame_cache = FrameCache(device)
+        return self._frame_cache
+
+    @property
+    def poco_snapshot(self) -> PocoSnapshotCache:
+        """Poco控件树快照缓存，多个查询共用一次dump"""
+        if self._poco_snapshot is None:
+            self._poco_snapshot = PocoSnapshotCache(self.poco, window_probe=default_window_probe(self.device))
+        return self._poco_snapshot
+
+    def _current_device(self):
+        """当前已连接的设备与本实例平台一致时返回它（如conftest已通过设备连接池连接）"""
+        current = G.DEVICE
+        if not is_platform(current, self.platform):
+            return None
+        if self.platform == "ios" and self.udid:
+            addr = getattr(current, 'addr', '') or ''
+            if addr.rstrip('/') != get_iproxy_supervisor().url_for(self.udid).rstrip('/'):
+                return None
+        return current
+
+    def _create_device(self):
+        """创建设备"""
+        current = self._current_device()
+        if current is not None:
+            return current
+        device_class = load_backend(self.platform)
+        if self.platform == "ios" and self.udid:
+            return device_class(get_iproxy_supervisor().url_for(self.udid))
+        return device_class()
+
+    def _create_poco(self, device):
+        """创建Poco对象，平台不支持Poco时返回None"""
+        poco_class = load_backend(self.platform, 'poco')
+        if poco_class is None:
+            return None
+        if self.platform == "android":
+            return poco_class(device=device, use_airtest_input=True)
+        return poco_class(device=device)
+
+    def teardown(self) -> None:
+        """
+        释放本实例对设备和Poco的引用
 
-    def _init_poco(self):
-        """初始化Poco对象"""
-        if self.platform == "ios":
-            self.poco = iosPoco()
-        elif self.platform == "android":
-            self.poco = AndroidUiautomationPoco(use_airtest_input=True)
+        共用的设备与Poco保持运行，供后续实例复用，会话结束时由 teardown_shared() 统一停止
+        """
+        if self._poco is None and self.platform in ("ios", "android"):
+            with _shared_lock:
+                _init_stats['poco_skipped'] += 1
+                _init_stats['saved_seconds'] += self._shared.poco_init_seconds
+        self._device = None
+        self._poco = None
+        self._frame_cache = None
 
     def start_app(self, package: str) -> bool:
         """
@@ -64,7 +306,8 @@ class BaseTest:
         try:
             if self.platform == "ios":
                 # iOS 17及以上使用WDA启动
-                return start_ios_app_by_wda(package)
+                from core.ios import start_ios_app_by_wda
+                return start_ios_app_by_wda(package, udid=self.udid)
             else:
                 self.device.start_app(package)
                 return True
@@ -116,6 +359,7 @@ class BaseTest:
             print(f"截图失败: {str(e)}")
             return ""
 
+    @_input_action
     def wake(self) -> bool:
         """唤醒设备"""
         try:
@@ -125,6 +369,7 @@ class BaseTest:
             print(f"唤醒设备失败: {str(e)}")
             return False
 
+    @_input_action
     def home(self) -> bool:
         """回到主页"""
         try:
@@ -134,19 +379,30 @@ class BaseTest:
             print(f"回到主页失败: {str(e)}")
             return False
 
-    def touch(self, v: Union[tuple, list, str], **kwargs) -> bool:
-        """点击操作"""
+    def touch(self, v: Union[tuple, list, str, Template], **kwargs) -> bool:
+        """点击操作，传入Template时先在（缓存的）截图中定位"""
         try:
-            self.device.touch(v, **kwargs)
+            if isinstance(v, Template):
+                # 定位不持有输入锁，等待目标期间后台弹窗监视器仍可关闭遮挡的弹窗
+                pos = self._loop_find(v, ST.FIND_TIMEOUT)
+                if pos is None:
+                    raise TargetNotFoundError(f"Picture {v} not found in screen")
+                v = pos
+            self._tap(v, **kwargs)
             return True
         except Exception as e:
             print(f"点击失败: {str(e)}")
             return False
 
-    def click(self, v: Union[tuple, list, str], **kwargs) -> bool:
+    @_input_action
+    def _tap(self, pos, **kwargs) -> None:
+        self.device.touch(pos, **kwargs)
+
+    def click(self, v: Union[tuple, list, str, Template], **kwargs) -> bool:
         """点击操作（同touch）"""
         return self.touch(v, **kwargs)
 
+    @_input_action
     def double_click(self, v: Union[tuple, list, str], **kwargs) -> bool:
         """双击操作"""
         try:
@@ -156,6 +412,7 @@ class BaseTest:
             print(f"双击失败: {str(e)}")
             return False
 
+    @_input_action
     def swipe(self, v1: Union[tuple, list, str], v2: Union[tuple, list, str], **kwargs) -> bool:
         """滑动操作"""
         try:
@@ -165,6 +422,7 @@ class BaseTest:
             print(f"滑动失败: {str(e)}")
             return False
 
+    @_input_action
     def pinch(self, in_or_out: str = 'in', center: Optional[tuple] = None, percent: float = 0.5) -> bool:
         """缩放操作"""
         try:
@@ -174,6 +432,7 @@ class BaseTest:
             print(f"缩放失败: {str(e)}")
             return False
 
+    @_input_action
     def keyevent(self, keyname: str, **kwargs) -> bool:
         """按键事件"""
         try:
@@ -183,6 +442,7 @@ class BaseTest:
             print(f"按键事件失败: {str(e)}")
             return False
 
+    @_input_action
     def text(self, text: str, enter: bool = True) -> bool:
         """输入文本"""
         try:
@@ -196,30 +456,181 @@ class BaseTest:
         """等待指定时间"""
         time.sleep(secs)
 
-    def wait(self, v: Union[tuple, list, str], timeout: float = 20, interval: float = 0.5, **kwargs) -> bool:
+    def wait_until_stable(self, max_wait: float = 5.0, threshold: Optional[float] = None) -> bool:
+        """
+        等待画面稳定（连续几帧不再变化），代替操作后的固定等待
+
+        Args:
+            max_wait: 最长等待时间（秒）
+            threshold: 相邻两帧缩略图的平均像素差低于该值视为未变化
+
+        Returns:
+            bool: 是否在 max_wait 内稳定
+        """
+        try:
+            return wait_for_stable_frames(lambda: self.frame_cache.get(fresh=True), max_wait, threshold).stable
+        except Exception as e:
+            print(f"等待画面稳定失败: {str(e)}")
+            time.sleep(max_wait)
+            return False
+
+    def _match_in_frame(self, v: Template, fresh: bool = False):
+        """在截图帧中匹配模板，返回坐标或None"""
+        screen = self.frame_cache.get(fresh=fresh)
+        if screen is None:
+            return None
+        return v.match_in(screen)
+
+    def _loop_find(self, v: Template, timeout: float, interval: float = 0.5):
+        """
+        在截图中查找模板直到超时
+
+        第一次查询复用缓存帧，之后每轮重新截图；画面与上次匹配过的帧相比没有变化时跳过匹配，
+        画面变化时缩短轮询间隔，静止时逐步放慢
+
+        Returns:
+            坐标，超时未找到时为None
+        """
+        start = time.time()
+        poller = AdaptivePoller(interval)
+        fresh = False
+        try:
+            while True:
+                screen = self.frame_cache.get(fresh=fresh)
+                if screen is not None and poller.should_match(screen):
+                    pos = v.match_in(screen)
+                    if pos is not None:
+                        return pos
+                if time.time() - start > timeout:
+                    return None
+                time.sleep(poller.interval)
+                fresh = True
+        finally:
+            for key, value in poller.stats().items():
+                self._wait_stats[key] += value
+
+    def wait(self, v: Union[tuple, list, str, Template], timeout: float = 20, interval: float = 0.5, **kwargs) -> bool:
         """等待元素出现"""
         try:
+            if isinstance(v, Template):
+                return self._loop_find(v, timeout, interval) or False
             return self.device.wait(v, timeout, interval, **kwargs)
         except Exception as e:
             print(f"等待元素失败: {str(e)}")
             return False
 
-    def exists(self, v: Union[tuple, list, str]) -> bool:
+    def exists(self, v: Union[tuple, list, str, Template]) -> bool:
         """判断元素是否存在"""
         try:
+            if isinstance(v, Template):
+                return self._loop_find(v, ST.FIND_TIMEOUT_TMP) or False
             return self.device.exists(v)
         except Exception as e:
             print(f"检查元素存在失败: {str(e)}")
             return False
 
-    def find_all(self, v: Union[tuple, list, str]) -> List:
+    def find_all(self, v: Union[tuple, list, str, Template]) -> List:
         """查找所有匹配的元素"""
         try:
+            if isinstance(v, Template):
+                screen = self.frame_cache.get()
+                return (v.match_all_in(screen) if screen is not None else None) or []
             return self.device.find_all(v)
         except Exception as e:
             print(f"查找元素失败: {str(e)}")
             return []
 
+    def match_any(self, templates: List[Template], fresh: bool = False) -> BatchResult:
+        """
+        在同一帧截图上匹配多个模板
+
+        Args:
+            templates: 候选模板列表
+            fresh: 为True时忽略截图缓存
+
+        Returns:
+            BatchResult: best为得分最高的命中，scores为每个模板的得分
+        """
+        try:
+            screen = self.frame_cache.get(fresh=fresh)
+            if screen is None:
+                return BatchResult(scores=[None] * len(templates))
+            return self.batch_matcher.match(screen, templates)
+        except Exception as e:
+            print(f"批量匹配失败: {str(e)}")
+            return BatchResult(scores=[None] * len(templates))
+
+    def wait_any(self, templates: List[Template], timeout: float = 20, interval: float = 0.5) -> Optional[MatchHit]:
+        """
+        等待任意一个模板出现
+
+        Returns:
+            MatchHit: 得分最高的命中（hit.index 为模板在列表中的位置），超时返回None
+        """
+        start = time.time()
+        fresh = False
+        while True:
+            result = self.match_any(templates, fresh=fresh)
+            if result.best is not None:
+                return result.best
+            if time.time() - start > timeout:
+                print(f"等待元素超时，各模板得分: {result.scores}")
+                return None
+            time.sleep(interval)
+            fresh = True
+
+    def wait_stats(self) -> dict:
+        """图像等待的探测统计，skipped为画面未变化而跳过匹配的次数"""
+        return dict(self._wait_stats)
+
+    def poco_query(self, name: Optional[str] = None, fresh: bool = False, **attrs) -> List[SnapshotNode]:
+        """
+        在控件树快照中查找控件，写法与 poco(name, **attrs) 一致
+
+        通过Poco对象直接操作控件不会使快照失效，需要时调用 self.poco_snapshot.invalidate()
+
+        Args:
+            name: 控件name
+            fresh: 为True时重新dump控件树
+            **attrs: 其他属性，如 text="设置"、type="android.widget.Button"
+
+        Returns:
+            List[SnapshotNode]: 匹配的控件
+        """
+        return self.poco_snapshot.query(name, fresh=fresh, **attrs)
+
+    def poco_exists(self, name: Optional[str] = None, **attrs) -> bool:
+        """控件是否存在（使用控件树快照）"""
+        return bool(self.poco_query(name, **attrs))
+
+    def poco_click(self, name: Optional[str] = None, **attrs) -> bool:
+        """
+        点击快照中匹配的第一个控件
+
+        点击经过 _tap，与其他输入操作一样使截图缓存和控件树快照失效
+        """
+        try:
+            nodes = self.poco_query(name, **attrs)
+            if not nodes:
+                raise TargetNotFoundError(f"Poco node {name or ''} {attrs} not found")
+            width, height = self.device.get_current_resolution()
+            x, y = nodes[0].pos
+            self._tap((x * width, y * height))
+            return True
+        except Exception as e:
+            print(f"点击控件失败: {str(e)}")
+            return False
+
+    def poco_snapshot_stats(self) -> dict:
+        """控件树快照命中统计"""
+        if self._poco_snapshot is None:
+            return {'hits': 0, 'diff_hits': 0, 'misses': 0, 'dump_seconds': 0.0, 'saved_seconds': 0.0}
+        return self._poco_snapshot.stats()
+
+    def frame_cache_stats(self) -> dict:
+        """截图缓存命中统计，hits即本实例节省的截图次数"""
+        return self._frame_cache.stats() if self._frame_cache else {'hits': 0, 'misses': 0}
+
     def get_clipboard(self) -> str:
         """获取剪贴板内容"""
         try:
@@ -245,6 +656,7 @@ class BaseTest:
             print(f"执行shell命令失败: {str(e)}")
             return ""
 
+    @_input_action
     def paste(self, text: str, enter: bool = True) -> bool:
         """
         粘贴文本（通常用于处理包含特殊字符的文本）
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多模板批量匹配
+一帧截图只转换灰度、缩小一次，构建共享的图像金字塔，所有模板先在缩小层粗定位，
+再在原图的局部窗口内精确定位，返回得分最高的命中以及每个模板的得分。
+OpenCV的matchTemplate会释放GIL，模板较多时可以分散到线程池并行计算。
+灰度匹配分不清只有颜色不同的控件，rgb=True 的模板改用Airtest自身的匹配（按 ST.CVSTRATEGY 并校验颜色）
+
+离线基准（不需要设备）:
+    python -m core.batch_match --frames ./frames --templates ./images --resolution 1242 2688
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+from airtest import aircv
+from airtest.core.cv import Template
+from airtest.core.settings import Settings as ST
+from airtest.utils.transform import TargetPos
+
+from core.template_registry import get_template_registry
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 缩小后模板的最小边长，小于该值时粗定位不可靠，直接在原图上匹配
+MIN_COARSE_SIZE = 8
+
+
+@dataclass
+class MatchHit:
+    """单个模板的匹配结果"""
+    index: int
+    template: Template
+    score: float
+    pos: Tuple[int, int]
+    rectangle: Tuple[Tuple[int, int], ...]
+
+
+@dataclass
+class BatchResult:
+    """一帧截图上的批量匹配结果"""
+    best: Optional[MatchHit] = None
+    scores: List[Optional[float]] = field(default_factory=list)
+    hits: List[MatchHit] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def __bool__(self) -> bool:
+        return self.best is not None
+
+
+class ScreenPyramid:
+    """截图的灰度金字塔，所有模板共用"""
+
+    def __init__(self, screen, scale: float):
+        self.resolution = aircv.get_resolution(screen)
+        self.full = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY) if screen.ndim == 3 else screen
+        self.scale = scale
+        if scale < 1.0:
+            self.coarse = cv2.resize(self.full, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            self.coarse = self.full
+
+
+def _best_location(source, search) -> Tuple[float, Tuple[int, int]]:
+    res = cv2.matchTemplate(source, search, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(res)
+    return float(max_val), max_loc
+
+
+class BatchMatcher:
+    """对同一帧截图评估多个模板"""
+
+    def __init__(self, scale: float = 0.5, workers: int = 0):
+        """
+        Args:
+            scale: 粗定位层相对原图的缩放比例，1.0表示不缩小
+            workers: 线程池大小，0表示在调用线程中依次计算
+        """
+        self.scale = scale
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-match") if workers else None
+
+    def _template_gray(self, template: Template, resolution: Tuple[int, int]):
+        return get_template_registry().gray(template.filepath, template.resolution or None, resolution)
+
+    @staticmethod
+    def _match_rgb(index: int, template: Template, screen) -> Tuple[Optional[float], Optional[MatchHit]]:
+        """rgb=True 的模板使用Airtest的匹配流程，与 Template.match_in 的结果一致"""
+        try:
+            result = template._cv_match(screen)
+        except Exception as e:
+            logger.debug(f"匹配模板失败 {template}: {str(e)}")
+            return None, None
+        if not result:
+            return None, None
+        pos = TargetPos().getXY(result, template.target_pos)
+        rectangle = tuple(tuple(point) for point in result['rectangle'])
+        return result['confidence'], MatchHit(index, template, result['confidence'], pos, rectangle)
+
+    def _match_one(self, index: int, template: Template, pyramid: ScreenPyramid,
+                   screen=None) -> Tuple[Optional[float], Optional[MatchHit]]:
+        if getattr(template, 'rgb', False) and screen is not None:
+            return self._match_rgb(index, template, screen)
+        try:
+            search = self._template_gray(template, pyramid.resolution)
+        except Exception as e:
+            logger.debug(f"读取模板失败 {template}: {str(e)}")
+            return None, None
+        th, tw = search.shape[:2]
+        fh, fw = pyramid.full.shape[:2]
+        if th > fh or tw > fw:
+            return 0.0, None
+
+        ctw, cth = int(tw * pyramid.scale), int(th * pyramid.scale)
+        if pyramid.scale < 1.0 and min(ctw, cth) >= MIN_COARSE_SIZE:
+            # 缩小层粗定位，再在原图上以粗定位结果为中心的局部窗口内精确定位
+            coarse_search = cv2.resize(search, (ctw, cth), interpolation=cv2.INTER_AREA)
+            _, (cx, cy) = _best_location(pyramid.coarse, coarse_search)
+            pad = int(round(2 / pyramid.scale)) + 2
+            x0 = max(0, int(cx / pyramid.scale) - pad)
+            y0 = max(0, int(cy / pyramid.scale) - pad)
+            x1 = min(fw, int(cx / pyramid.scale) + tw + pad)
+            y1 = min(fh, int(cy / pyramid.scale) + th + pad)
+            score, (rx, ry) = _best_location(pyramid.full[y0:y1, x0:x1], search)
+            left, top = rx + x0, ry + y0
+        else:
+            score, (left, top) = _best_location(pyramid.full, search)
+
+        threshold = template.threshold or ST.THRESHOLD
+        if score < threshold:
+            return score, None
+        rectangle = ((left, top), (left, top + th), (left + tw, top + th), (left + tw, top))
+        result = {'result': (left + tw // 2, top + th // 2), 'rectangle': rectangle, 'confidence': score}
+        pos = TargetPos().getXY(result, template.target_pos)
+        return score, MatchHit(index, template, score, pos, rectangle)
+
+    def match(self, screen, templates: Sequence[Template]) -> BatchResult:
+        """
+        在一帧截图上评估全部模板
+
+        Args:
+            screen: 截图(numpy数组)
+            templates: 模板列表
+
+        Returns:
+            BatchResult: best为得分最高的命中（都未达到阈值时为None），scores与templates一一对应
+        """
+        started = time.perf_counter()
+        pyramid = ScreenPyramid(screen, self.scale)
+        if self._executor and len(templates) > 1:
+            futures = [self._executor.submit(self._match_one, i, t, pyramid, screen) for i, t in enumerate(templates)]
+            outcomes = [f.result() for f in futures]
+        else:
+            outcomes = [self._match_one(i, t, pyramid, screen) for i, t in enumerate(templates)]
+
+        hits = [hit for _, hit in outcomes if hit is not None]
+        return BatchResult(
+            best=max(hits, key=lambda h: h.score) if hits else None,
+            scores=[score for score, _ in outcomes],
+            hits=hits,
+            elapsed=time.perf_counter() - started
+        )
+
+    def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+def benchmark(frames: List[str], template_paths: List[str], resolution: Tuple[int, int] = (),
+              scale: float = 0.5, workers: int = 4, repeat: int = 3) -> Dict[str, float]:
+    """
+    在保存的截图上对比逐个模板调用match_in与批量匹配
+
+    Args:
+        frames: 截图路径列表
+        template_paths: 模板图片路径列表
+        resolution: 模板录制时的屏幕分辨率
+        scale: 粗定位层缩放比例
+        workers: 并行版本的线程数
+        repeat: 每帧重复次数
+
+    Returns:
+        Dict: 每种方式的平均每帧耗时(ms)，以及批量匹配与逐个匹配最佳结果一致的比例
+    """
+    templates = [Template(path, resolution=tuple(resolution)) for path in template_paths]
+    serial = BatchMatcher(scale=scale)
+    threaded = BatchMatcher(scale=scale, workers=workers)
+    timings = {'per_template': [], 'batch': [], 'batch_threaded': []}
+    agree = 0
+    total = 0
+    try:
+        for frame_path in frames:
+            screen = aircv.imread(frame_path)
+            for _ in range(repeat):
+                started = time.perf_counter()
+                singles = [t.match_in(screen) for t in templates]
+                timings['per_template'].append(time.perf_counter() - started)
+
+                result = serial.match(screen, templates)
+                timings['batch'].append(result.elapsed)
+                timings['batch_threaded'].append(threaded.match(screen, templates).elapsed)
+
+            total += 1
+            found = [i for i, pos in enumerate(singles) if pos]
+            if (result.best is None and not found) or (result.best is not None and result.best.index in found):
+                agree += 1
+    finally:
+        serial.close()
+        threaded.close()
+
+    report = {name: round(sum(values) / len(values) * 1000, 2) if values else 0.0 for name, values in timings.items()}
+    report['agreement'] = round(agree / total, 3) if total else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+    import os
+
+    parser = argparse.ArgumentParser(description="多模板批量匹配离线基准")
+    parser.add_argument('--frames', required=True, help='保存的截图目录')
+    parser.add_argument('--templates', required=True, nargs='+', help='模板图片目录或文件')
+    parser.add_argument('--resolution', type=int, nargs=2, default=(), help='模板录制分辨率，如 1242 2688')
+    parser.add_argument('--scale', type=float, default=0.5, help='粗定位层缩放比例')
+    parser.add_argument('--workers', type=int, default=4, help='并行版本的线程数')
+    parser.add_argument('--repeat', type=int, default=3, help='每帧重复次数')
+    args = parser.parse_args()
+
+    frame_files = sorted(glob.glob(os.path.join(args.frames, '*.png')) + glob.glob(os.path.join(args.frames, '*.jpg')))
+    template_files = []
+    for item in args.templates:
+        template_files.extend(sorted(glob.glob(os.path.join(item, '*.png'))) if os.path.isdir(item) else [item])
+
+    print(f"截图 {len(frame_files)} 帧，模板 {len(template_files)} 个")
+    for name, value in benchmark(frame_files, template_files, tuple(args.resolution), args.scale,
+                                 args.workers, args.repeat).items():
+        print(f"{name:<16}{value}")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+截图后端
+图像查询（FrameCache、弹窗监视、画面稳定检测）只需要内存中的numpy数组，
+Android设备可以用 `adb exec-out screencap` 直接读取原始RGBA帧缓冲，省去设备端PNG/JPEG编码和本地解码；
+其他平台以及不支持的设备回退到Airtest的 device.snapshot()（由URI中的cap_method决定）
+
+基准:
+    python -m core.capture --uri "Android:///" --count 20
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from config import DEVICE_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# screencap原始输出的像素格式（android.graphics.PixelFormat）
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+
+
+class CaptureError(Exception):
+    """截图失败"""
+
+
+def parse_raw_screencap(data: bytes) -> np.ndarray:
+    """
+    解析 `screencap`（不带-p）的原始输出
+
+    头部为 宽、高、像素格式 三个小端uint32，Android 9起还有一个colorSpace字段，
+    之后是宽*高*4字节的RGBA像素
+
+    Args:
+        data: screencap输出
+
+    Returns:
+        np.ndarray: BGR图像，与Airtest截图格式一致
+    """
+    if len(data) < 12:
+        raise CaptureError(f"screencap输出过短: {len(data)} 字节")
+    width, height, pixel_format = np.frombuffer(data, dtype='<u4', count=3)
+    if pixel_format not in (PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888):
+        raise CaptureError(f"不支持的像素格式: {pixel_format}")
+    size = int(width) * int(height) * 4
+    header = len(data) - size
+    if header not in (12, 16):
+        raise CaptureError(f"screencap输出长度不符: {len(data)} 字节，{width}x{height}")
+    rgba = np.frombuffer(data, dtype=np.uint8, count=size, offset=header).reshape(int(height), int(width), 4)
+    return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+
+class CaptureBackend:
+    """截图后端基类"""
+
+    name = 'base'
+
+    def __init__(self, device):
+        self.device = device
+
+    def capture(self) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+
+class AirtestCapture(CaptureBackend):
+    """Airtest默认截图（cap_method决定的 JAVACAP/MINICAP/ADBCAP，或iOS/Windows的截图）"""
+
+    name = 'airtest'
+
+    def capture(self) -> Optional[np.ndarray]:
+        return self.device.snapshot()
+
+
+class AdbPngCapture(CaptureBackend):
+    """adb exec-out screencap -p，设备端编码PNG、本地解码，用于基准对比"""
+
+    name = 'png'
+
+    def capture(self) -> Optional[np.ndarray]:
+        data = self.device.adb.cmd(['exec-out', 'screencap', '-p'], ensure_unicode=False)
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise CaptureError("PNG解码失败")
+        return frame
+
+
+class AdbRawCapture(CaptureBackend):
+    """adb exec-out screencap 原始帧缓冲，直接转换为numpy数组"""
+
+    name = 'raw'
+
+    def capture(self) -> Optional[np.ndarray]:
+        data = self.device.adb.cmd(['exec-out', 'screencap'], ensure_unicode=False)
+        return parse_raw_screencap(data)
+
+
+BACKENDS = {cls.name: cls for cls in (AirtestCapture, AdbPngCapture, AdbRawCapture)}
+
+
+class FallbackCapture(CaptureBackend):
+    """优先使用指定后端，出错时切换到Airtest截图并不再重试"""
+
+    def __init__(self, device, primary: CaptureBackend):
+        super().__init__(device)
+        self.primary = primary
+        self.fallback = AirtestCapture(device)
+        self.name = primary.name
+        self._failed = False
+
+    def capture(self) -> Optional[np.ndarray]:
+        if not self._failed:
+            try:
+                return self.primary.capture()
+            except Exception as e:
+                self._failed = True
+                self.name = self.fallback.name
+                logger.warning(f"{self.primary.name} 截图失败，改用Airtest截图: {str(e)}")
+        return self.fallback.capture()
+
+
+def _is_android(device) -> bool:
+    return hasattr(device, 'adb') and hasattr(device, 'serialno')
+
+
+_backends: Dict[tuple, CaptureBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_capture(device, backend: Optional[str] = None) -> CaptureBackend:
+    """
+    获取设备的截图后端（按设备和后端缓存）
+
+    Args:
+        device: Airtest设备对象
+        backend: 后端名称，默认取 DEVICE_CONFIG['ANDROID']['capture_backend']，非Android设备固定为airtest
+    """
+    if backend is None:
+        backend = DEVICE_CONFIG['ANDROID'].get('capture_backend', 'airtest') if _is_android(device) else 'airtest'
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的截图后端: {backend}")
+    if backend != 'airtest' and not _is_android(device):
+        logger.warning(f"{backend} 截图只支持Android设备，改用Airtest截图")
+        backend = 'airtest'
+
+    key = (id(device), backend)
+    with _backends_lock:
+        instance = _backends.get(key)
+        if instance is None or instance.device is not device:
+            instance = BACKENDS[backend](device)
+            if backend != 'airtest':
+                instance = FallbackCapture(device, instance)
+            _backends[key] = instance
+        return instance
+
+
+def capture_frame(device) -> Optional[np.ndarray]:
+    """用设备配置的后端截取一帧（numpy数组）"""
+    return get_capture(device).capture()
+
+
+def benchmark(device, backends: Optional[List[str]] = None, count: int = 20) -> Dict[str, dict]:
+    """
+    对比各截图后端的耗时与吞吐
+
+    Args:
+        device: Airtest设备对象
+        backends: 要对比的后端，默认为全部（非Android设备只有airtest）
+        count: 每个后端连续截图的次数
+
+    Returns:
+        Dict: {后端: {p50_ms, p95_ms, mean_ms, fps, resolution}}
+    """
+    if backends is None:
+        backends = list(BACKENDS) if _is_android(device) else ['airtest']
+    report = {}
+    for name in backends:
+        backend = BACKENDS[name](device)
+        frame = backend.capture()  # 预热，排除首次连接的开销
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(count):
+            t0 = time.perf_counter()
+            frame = backend.capture()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        total = time.perf_counter() - started
+        latencies.sort()
+        report[name] = {
+            'p50_ms': round(latencies[len(latencies) // 2], 1),
+            'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+            'mean_ms': round(sum(latencies) / len(latencies), 1),
+            'fps': round(count / total, 2) if total else 0.0,
+            'resolution': f"{frame.shape[1]}x{frame.shape[0]}" if frame is not None else "-",
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    from airtest.core.api import connect_device
+    from utils.device_manager import DeviceManager
+
+    parser = argparse.ArgumentParser(description="截图后端基准")
+    parser.add_argument('--uri', default=None, help='设备URI，默认按 DEVICE_CONFIG 生成（含cap_method等参数）')
+    parser.add_argument('--count', type=int, default=20, help='每个后端连续截图的次数')
+    parser.add_argument('--backends', nargs='*', choices=list(BACKENDS), help='要对比的后端')
+    args = parser.parse_args()
+
+    results = benchmark(connect_device(args.uri or DeviceManager.get_device_uri('Android')), args.backends, args.count)
+    print(f"{'backend':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'mean(ms)':>10}{'fps':>8}  resolution")
+    for name, r in results.items():
+        print(f"{name:<10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['mean_ms']:>10}{r['fps']:>8}  {r['resolution']}")
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+dumpsys输出的增量解析
+按行扫描输出，使用按服务预编译的正则表，所需字段全部找到后立即停止，
+不再对整段（常达数百KB的）输出做多次re.search
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """
+    惰性地逐行遍历文本，不预先拆分整个字符串
+
+    提前停止扫描时，剩余部分不会产生任何拷贝
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find('\n', start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+# 各dumpsys服务的字段正则表: 字段名 -> 预编译正则（第1个分组为字段值）
+PATTERN_TABLES: Dict[str, Dict[str, 're.Pattern']] = {
+    'package': {
+        'version': re.compile(r'versionName=(\S+)'),
+        'version_code': re.compile(r'versionCode=(\d+)'),
+        'install_path': re.compile(r'codePath=(\S+)'),
+        'first_install_time': re.compile(r'firstInstallTime=(.+?)\s*$'),
+        'last_update_time': re.compile(r'lastUpdateTime=(.+?)\s*$'),
+    },
+    'window': {
+        'activity': re.compile(r'(?:mCurrentFocus|mFocusedApp)=.*?([\w.]+/[\w.$]+)'),
+    },
+}
+
+
+def scan_fields(lines: Iterable[str], service: str, fields: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """
+    按行扫描dumpsys输出，提取指定字段的第一次出现
+
+    Args:
+        lines: 输出行的可迭代对象
+        service: PATTERN_TABLES中的服务名
+        fields: 需要的字段，为None时提取该服务表中的全部字段
+
+    Returns:
+        Dict: 找到的字段及其值
+    """
+    table = PATTERN_TABLES[service]
+    pending = {name: table[name] for name in (fields or table)}
+    result = {}
+    for line in lines:
+        for name, pattern in list(pending.items()):
+            match = pattern.search(line)
+            if match:
+                result[name] = match.group(1)
+                del pending[name]
+        if not pending:
+            break
+    return result
+
+
+@dataclass
+class PackageRecord:
+    """dumpsys package 解析结果"""
+    package_name: str
+    version: Optional[str] = None
+    version_code: Optional[int] = None
+    install_path: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, str]:
+        """转换为get_app_info返回的字典格式（只包含找到的字段）"""
+        info = {'package_name': self.package_name}
+        if self.version is not None:
+            info['version'] = self.version
+        if self.version_code is not None:
+            info['version_code'] = str(self.version_code)
+        if self.install_path is not None:
+            info['install_path'] = self.install_path
+        return info
+
+
+def parse_package(text: str, package_name: str) -> PackageRecord:
+    """解析 dumpsys package <包名> 的输出"""
+    found = scan_fields(iter_lines(text), 'package', ('version', 'version_code', 'install_path'))
+    return PackageRecord(
+        package_name=package_name,
+        version=found.get('version'),
+        version_code=int(found['version_code']) if 'version_code' in found else None,
+        install_path=found.get('install_path')
+    )
+
+
+def parse_current_activity(text: str) -> Optional[str]:
+    """解析 dumpsys window 输出中的当前焦点Activity，未找到时返回None"""
+    return scan_fields(iter_lines(text), 'window').get('activity')
+
+
+# meminfo表头列名 -> 记录中的字段名
+_MEMINFO_COLUMN_KEYS = {
+    'Pss Total': 'pss_total',
+    'Pss Clean': 'pss_clean',
+    'Shared Dirty': 'shared_dirty',
+    'Private Dirty': 'private_dirty',
+    'Shared Clean': 'shared_clean',
+    'Private Clean': 'private_clean',
+    'SwapPss Dirty': 'swap_pss_dirty',
+    'Swapped Dirty': 'swapped_dirty',
+    'Rss Total': 'rss_total',
+    'Heap Size': 'heap_size',
+    'Heap Alloc': 'heap_alloc',
+    'Heap Free': 'heap_free',
+}
+_MEMINFO_ROW_PATTERN = re.compile(r'^\s*([A-Za-z.][^\d]*?)\s+((?:\d+\s*)+)$')
+
+
+@dataclass
+class MeminfoRecord:
+    """
+    dumpsys meminfo <包名> 的明细表
+
+    rows 以行名（如 "Native Heap"、"Dalvik Heap"、"TOTAL"）为键，
+    值为该行各列（pss_total、private_dirty、heap_size等，单位KB）
+    """
+    package_name: str
+    rows: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def _value(self, row: str, column: str) -> Optional[int]:
+        return self.rows.get(row, {}).get(column)
+
+    @property
+    def total_pss(self) -> Optional[int]:
+        return self._value('TOTAL', 'pss_total')
+
+    @property
+    def total_private_dirty(self) -> Optional[int]:
+        return self._value('TOTAL', 'private_dirty')
+
+    @property
+    def native_heap(self) -> Dict[str, int]:
+        return self.rows.get('Native Heap', {})
+
+    @property
+    def dalvik_heap(self) -> Dict[str, int]:
+        return self.rows.get('Dalvik Heap', {})
+
+    def to_dict(self) -> Dict[str, object]:
+        """转换为get_memory_info返回的字典格式"""
+        info = {'package_name': self.package_name}
+        if self.total_pss is not None:
+            info['total_memory_kb'] = self.total_pss
+            info['total_memory_mb'] = round(self.total_pss / 1024, 2)
+        if self.total_private_dirty is not None:
+            info['private_dirty_kb'] = self.total_private_dirty
+        for prefix, heap in (('native', self.native_heap), ('dalvik', self.dalvik_heap)):
+            for key in ('heap_size', 'heap_alloc', 'heap_free'):
+                if key in heap:
+                    info[f'{prefix}_{key}_kb'] = heap[key]
+        return info
+
+
+def _meminfo_columns(first: str, second: str) -> List[str]:
+    """把两行表头按位置合并为列名，如 "Pss" + "Total" -> "pss_total" """
+    names = []
+    for top, bottom in zip(first.split(), second.split()):
+        key = f'{top} {bottom}'
+        names.append(_MEMINFO_COLUMN_KEYS.get(key, key.lower().replace(' ', '_')))
+    return names
+
+
+def parse_meminfo(text: str, package_name: str = '') -> MeminfoRecord:
+    """
+    解析 dumpsys meminfo <包名> 的明细表，读到表格的TOTAL行后立即停止
+
+    之后的App Summary、Objects、SQL等段落不会被扫描
+    """
+    record = MeminfoRecord(package_name=package_name)
+    columns = None
+    previous = ''
+    for line in iter_lines(text):
+        if columns is None:
+            # 表头为两行，第二行之后紧跟一行 "------"
+            if line.strip().startswith('------'):
+                continue
+            if 'Pss' in previous and 'Total' in line:
+                columns = _meminfo_columns(previous, line)
+            previous = line
+            continue
+
+        match = _MEMINFO_ROW_PATTERN.match(line)
+        if not match:
+            continue
+        name = match.group(1).strip()
+        values = [int(v) for v in match.group(2).split()]
+        # 部分行缺少后面几列（如没有Heap列），按从左到右对齐
+        record.rows[name] = dict(zip(columns, values))
+        if name == 'TOTAL':
+            break
+
+    if 'TOTAL' not in record.rows:
+        # 旧版本或精简输出没有完整表格时，退化为只取TOTAL值
+        match = re.search(r'TOTAL(?: PSS:)?\s+(\d+)', text)
+        if match:
+            record.rows['TOTAL'] = {'pss_total': int(match.group(1))}
+    return record
+
+
+# ---------------------------------------------------------------------------
+# 基准测试：与逐字段 re.search 全文扫描的旧实现对比
+# ---------------------------------------------------------------------------
+
+def _legacy_package(text: str) -> Dict[str, str]:
+    info = {}
+    version_match = re.search(r'versionName=([^\s]+)', text)
+    if version_match:
+        info['version'] = version_match.group(1)
+    code_match = re.search(r'versionCode=(\d+)', text)
+    if code_match:
+        info['version_code'] = code_match.group(1)
+    path_match = re.search(r'codePath=([^\s]+)', text)
+    if path_match:
+        info['install_path'] = path_match.group(1)
+    return info
+
+
+def _legacy_meminfo(text: str) -> Optional[int]:
+    total_match = re.search(r'TOTAL\s+(\d+)', text)
+    return int(total_match.group(1)) if total_match else None
+
+
+def _legacy_window(text: str) -> Optional[str]:
+    match = re.search(r'([\w\.]+/[\w\.]+)', text)
+    return match.group(1) if match else None
+
+
+BENCHMARK_CASES = {
+    'package': (_legacy_package, lambda text: parse_package(text, '')),
+    'meminfo': (_legacy_meminfo, lambda text: parse_meminfo(text)),
+    'window': (_legacy_window, parse_current_activity),
+}
+
+
+def benchmark(recordings: Dict[str, str], repeat: int = 200) -> List[Tuple[str, int, float, float]]:
+    """
+    在录制的dumpsys输出上对比旧实现与增量解析的耗时
+
+    Args:
+        recordings: {服务名: 录制文件路径}，服务名为BENCHMARK_CASES中的键
+        repeat: 每种实现的重复次数
+
+    Returns:
+        List: (服务名, 输出字节数, 旧实现平均耗时ms, 增量解析平均耗时ms)
+    """
+    results = []
+    for service, path in recordings.items():
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        legacy, incremental = BENCHMARK_CASES[service]
+        timings = []
+        for func in (legacy, incremental):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                func(text)
+            timings.append((time.perf_counter() - started) * 1000 / repeat)
+        results.append((service, len(text.encode('utf-8')), timings[0], timings[1]))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='dumpsys解析基准测试（使用真机录制的输出）')
+    for service in BENCHMARK_CASES:
+        parser.add_argument(f'--{service}', help=f'dumpsys {service} 录制输出文件')
+    parser.add_argument('--repeat', type=int, default=200, help='重复次数')
+    args = parser.parse_args()
+
+    recordings = {s: getattr(args, s) for s in BENCHMARK_CASES if getattr(args, s)}
+    if not recordings:
+        parser.error('至少需要指定一个录制文件')
+
+    print(f"{'服务':<10}{'大小(KB)':>10}{'re.search(ms)':>16}{'增量解析(ms)':>16}{'加速比':>10}")
+    for service, size, legacy_ms, incremental_ms in benchmark(recordings, args.repeat):
+        speedup = legacy_ms / incremental_ms if incremental_ms else float('inf')
+        print(f"{service:<10}{size / 1024:>10.1f}{legacy_ms:>16.3f}{incremental_ms:>16.3f}{speedup:>10.1f}x")
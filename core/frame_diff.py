@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+截图变化检测与自适应轮询
+把截图缩成小尺寸灰度缩略图作为指纹，指纹几乎不变时可以跳过模板匹配；
+画面变化时缩短轮询间隔，画面静止时逐步放慢；
+连续几帧指纹不变即视为画面稳定，可代替操作后的固定 sleep(N)
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from config import AIRTEST_CONFIG
+
+# 缩略图尺寸，足以反映页面切换、弹窗、加载动画，计算开销可以忽略
+THUMBNAIL_SIZE = (32, 32)
+
+
+def thumbnail(frame, size=THUMBNAIL_SIZE):
+    """
+    生成截图指纹（灰度缩略图）
+
+    Args:
+        frame: 截图(numpy数组，BGR或灰度)
+        size: 缩略图尺寸 (宽, 高)
+
+    Returns:
+        numpy数组(int16)，便于直接相减
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def frame_distance(a, b) -> float:
+    """两个指纹的平均像素差（0~255）"""
+    if a is None or b is None or a.shape != b.shape:
+        return float('inf')
+    return float(np.abs(a - b).mean())
+
+
+def frame_max_distance(a, b) -> float:
+    """两个指纹中差别最大的像素差（0~255），局部的小变化也能反映出来"""
+    if a is None or b is None or a.shape != b.shape:
+        return float('inf')
+    return float(np.abs(a - b).max())
+
+
+class AdaptivePoller:
+    """
+    自适应轮询节奏
+
+    画面变化时回到最短间隔，连续静止时按倍数放慢到最长间隔；
+    与上一次真正做过匹配的画面几乎完全相同时，本次探测可以跳过匹配，
+    但连续跳过 force_every 次或距上次匹配超过 force_after 秒后一定会再匹配一次
+    """
+
+    def __init__(self, interval: float = 0.5, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, threshold: Optional[float] = None,
+                 backoff: Optional[float] = None, skip_threshold: Optional[float] = None,
+                 force_every: Optional[int] = None, force_after: Optional[float] = None):
+        """
+        Args:
+            interval: 初始轮询间隔
+            min_interval: 画面变化时的轮询间隔
+            max_interval: 画面静止时的最长轮询间隔
+            threshold: 指纹平均像素差低于该值视为画面未变化（用于调整轮询间隔）
+            backoff: 画面静止时间隔的放大倍数
+            skip_threshold: 指纹任一像素差都低于该值时才跳过匹配
+            force_every: 最多连续跳过的次数
+            force_after: 距上一次匹配超过该时间（秒）时强制匹配
+        """
+        conf = AIRTEST_CONFIG.get('ADAPTIVE_WAIT', {})
+        self.min_interval = min_interval if min_interval is not None else conf.get('min_interval', 0.1)
+        self.max_interval = max_interval if max_interval is not None else conf.get('max_interval', 1.5)
+        self.threshold = threshold if threshold is not None else conf.get('diff_threshold', 2.0)
+        self.backoff = backoff if backoff is not None else conf.get('backoff', 1.5)
+        self.skip_threshold = skip_threshold if skip_threshold is not None else conf.get('skip_threshold', 3.0)
+        self.force_every = force_every if force_every is not None else conf.get('force_every', 5)
+        self.force_after = force_after if force_after is not None else conf.get('force_after', 2.0)
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.probes = 0
+        self.matched = 0
+        self.skipped = 0
+        self._previous = None
+        self._reference = None
+        self._reference_at = 0.0
+        self._consecutive_skips = 0
+
+    def should_match(self, frame) -> bool:
+        """
+        记录一次探测，判断这一帧是否需要做模板匹配，并据此调整下一次的间隔
+
+        Returns:
+            bool: 画面相对上一次匹配过的帧有变化、是第一帧或到了强制匹配的时机时为True
+        """
+        signature = thumbnail(frame)
+        self.probes += 1
+
+        animating = frame_distance(self._previous, signature) >= self.threshold if self._previous is not None else False
+        self._previous = signature
+        if animating:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+
+        # 与上一次匹配过的帧比较，避免缓慢变化在相邻帧之间累积而被漏掉；
+        # 用最大像素差而不是平均差，小目标出现时平均差几乎不变
+        now = time.monotonic()
+        if (self._reference is not None
+                and frame_max_distance(self._reference, signature) < self.skip_threshold
+                and self._consecutive_skips < self.force_every
+                and now - self._reference_at < self.force_after):
+            self._consecutive_skips += 1
+            self.skipped += 1
+            return False
+        self._reference = signature
+        self._reference_at = now
+        self._consecutive_skips = 0
+        self.matched += 1
+        return True
+
+    def stats(self) -> dict:
+        return {'probes': self.probes, 'matched': self.matched, 'skipped': self.skipped}
+
+
+@dataclass
+class StableResult:
+    """一次等待画面稳定的结果"""
+    stable: bool
+    elapsed: float
+    frames: int
+    max_wait: float
+
+    @property
+    def saved(self) -> float:
+        """与固定等待 max_wait 秒相比节省的时间"""
+        return max(0.0, self.max_wait - self.elapsed)
+
+
+class StabilityReport:
+    """累计画面稳定等待相对固定sleep节省的时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.unstable = 0
+        self.budget = 0.0
+        self.waited = 0.0
+
+    def record(self, result: StableResult) -> None:
+        with self._lock:
+            self.calls += 1
+            self.unstable += 0 if result.stable else 1
+            self.budget += result.max_wait
+            self.waited += result.elapsed
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'unstable': self.unstable,
+                'fixed_sleep_seconds': round(self.budget, 2),
+                'waited_seconds': round(self.waited, 2),
+                'saved_seconds': round(max(0.0, self.budget - self.waited), 2),
+            }
+
+
+stability_report = StabilityReport()
+
+
+def wait_for_stable_frames(snapshot: Callable, max_wait: float, threshold: Optional[float] = None,
+                           stable_frames: Optional[int] = None, interval: Optional[float] = None,
+                           min_wait: Optional[float] = None) -> StableResult:
+    """
+    连续截图直到画面不再变化
+
+    画面先发生过变化、再连续 stable_frames 次不变才算稳定；一直没有变化时至少等待 min_wait 秒，
+    避免操作后界面还没开始响应就被当成已经稳定
+
+    Args:
+        snapshot: 截图函数，返回numpy数组
+        max_wait: 最长等待时间（即原来固定sleep的秒数）
+        threshold: 相邻两帧指纹的平均像素差低于该值视为未变化
+        stable_frames: 连续多少次未变化视为稳定
+        interval: 两次截图之间的间隔
+        min_wait: 没有观察到变化时判定稳定前的最短等待时间，不超过max_wait
+
+    Returns:
+        StableResult
+    """
+    conf = AIRTEST_CONFIG.get('STABLE_WAIT', {})
+    threshold = threshold if threshold is not None else conf.get('diff_threshold', 2.0)
+    stable_frames = stable_frames or conf.get('stable_frames', 2)
+    interval = interval if interval is not None else conf.get('interval', 0.1)
+    min_wait = min(max_wait, min_wait if min_wait is not None else conf.get('min_wait', 1.0))
+
+    start = time.time()
+    previous = None
+    unchanged = 0
+    frames = 0
+    changed = False
+    while True:
+        frame = snapshot()
+        if frame is not None:
+            frames += 1
+            signature = thumbnail(frame)
+            if previous is not None and frame_distance(previous, signature) < threshold:
+                unchanged += 1
+            else:
+                changed = changed or previous is not None
+                unchanged = 0
+            previous = signature
+            if unchanged >= stable_frames and (changed or time.time() - start >= min_wait):
+                result = StableResult(True, time.time() - start, frames, max_wait)
+                break
+        remaining = max_wait - (time.time() - start)
+        if remaining <= 0:
+            result = StableResult(False, time.time() - start, frames, max_wait)
+            break
+        time.sleep(min(interval, remaining))
+
+    stability_report.record(result)
+    return result
+
+
+def wait_until_stable(max_wait: float = 5.0, threshold: Optional[float] = None, device=None) -> bool:
+    """
+    等待当前设备画面稳定，用于替换用例中点击后的固定 sleep(N)
+
+    Args:
+        max_wait: 最长等待时间（秒）
+        threshold: 相邻两帧指纹的平均像素差低于该值视为未变化
+        device: 设备对象，默认使用当前设备G.DEVICE
+
+    Returns:
+        bool: 是否在 max_wait 内稳定
+    """
+    from airtest.core.helper import G
+    from core.capture import capture_frame
+
+    device = device or G.DEVICE
+    return wait_for_stable_frames(lambda: capture_frame(device), max_wait, threshold).stable
@@ -6,13 +6,22 @@
 
 # TODO: ios17以上、及以下需要分开实现，ios17以下使用aritest原生api
 
+import asyncio
+import random
+import re
 import wda
 import time
 import subprocess
+import threading
 import os
 import requests
+import requests.adapters
 import traceback
+from collections import deque
 from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.iproxy_supervisor import get_iproxy_supervisor, list_ios_devices
 
 
 def get_wda_project_path():
@@ -34,210 +43,490 @@ def get_wda_project_path():
     raise FileNotFoundError("未找到WebDriverAgent项目，请确保已安装Airtest IDE")
 
 
-def start_wda_server():
-    """启动WDA服务器"""
-    try:
-        # 获取设备UDID
-        cmd_devices = "idevice_id -l"
-        udid = subprocess.check_output(cmd_devices, shell=True).decode('utf-8').strip()
+# xcodebuild 输出中WDA监听地址所在行: ServerURLHere->http://192.168.1.2:8100<-ServerURLHere
+_SERVER_URL_PATTERN = re.compile(r'ServerURLHere->(\S+?)<-ServerURLHere')
 
-        if not udid:
-            print("未找到已连接的iOS设备")
-            return False
+# 应用状态值说明：
+# 0: 未运行
+# 1: 后台运行（挂起）
+# 2: 后台运行
+# 3: 前台运行（挂起）
+# 4: 前台运行
+APP_STATE_NOT_RUNNING = 0
+APP_STATE_RUNNING_FOREGROUND = 4
 
-        print(f"设备UDID: {udid}")
 
-        # 先终止现有的WDA进程
-        kill_cmd = "pkill -f WebDriverAgent"
-        subprocess.run(kill_cmd, shell=True)
-        time.sleep(2)
+class WDACommandError(wda.WDAError):
+    """WDA命令返回错误"""
 
-        # 使用Airtest IDE中的WebDriverAgent
-        wda_project = get_wda_project_path()
+    def __init__(self, status: int, value):
+        self.status = status
+        self.value = value
+        super().__init__(f"WDA返回错误(HTTP {status}): {value}")
 
-        # 直接运行test命令，让Xcode自动处理签名
-        test_cmd = (
-            f"xcodebuild -project {wda_project}/WebDriverAgent.xcodeproj "
-            "-scheme WebDriverAgentRunner "
-            f"-destination 'id={udid}' "
-            "-allowProvisioningUpdates "  # 允许自动更新配置文件
-            "test"
-        )
 
-        print("启动WDA...")
-        print(f"执行命令: {test_cmd}")
+class WDAConnection:
+    """
+    单台设备的WDA连接
 
-        process = subprocess.Popen(
-            test_cmd,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
+    - 持有一个带连接池的 requests.Session，/status 健康检查和WDA命令（启动/终止应用、查询应用状态）
+      都经由它发出，复用keep-alive连接
+    - 缓存WDA会话ID，多次启动应用之间共用同一个会话，只有WDA报告会话失效时才重新创建
+    """
 
-        # 先确保 iproxy 在运行
-        check_proxy = "ps aux | grep 'iproxy 8100' | grep -v grep"
-        proxy_running = subprocess.run(check_proxy, shell=True, capture_output=True, text=True)
-
-        if not proxy_running.stdout.strip():
-            print("iproxy 未运行，正在启动...")
-            # 后台运行 iproxy
-            subprocess.Popen(
-                "iproxy 8100 8100",
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            time.sleep(1)  # 给 iproxy 一点启动时间
-
-        # 等待WDA启动
-        start_time = time.time()
-        while time.time() - start_time < 60:
-            try:
-                response = requests.get('http://localhost:8100/status', timeout=1)
-                if response.status_code == 200:
-                    print("WDA服务器启动成功")
-                    return True
-            except requests.exceptions.RequestException:
-                if process.poll() is not None:
-                    stdout, stderr = process.communicate()
-                    print("WDA进程退出")
-                    print(f"输出: {stdout}")
-                    print(f"错误: {stderr}")
-                    return False
-                time.sleep(2)
-                print("等待WDA服务启动...")
+    def __init__(self, base_url: str, command_timeout: float = 60.0):
+        """
+        Args:
+            base_url: WDA在本机的访问地址
+            command_timeout: WDA命令的超时时间（秒），等待应用静止的启动命令可能较慢
+        """
+        self.base_url = base_url.rstrip('/')
+        self.command_timeout = command_timeout
+        self.http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.http.mount('http://', adapter)
+        self._session_id = None
+        self._lock = threading.Lock()
+
+    def status(self, timeout: float = 1.0) -> Optional[dict]:
+        """获取WDA状态，不可用时返回None"""
+        try:
+            response = self.http.get(f"{self.base_url}/status", timeout=timeout)
+            if response.status_code == 200:
+                return response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        return None
+
+    def request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        """
+        经连接池发送WDA请求
+
+        Returns:
+            dict: WDA返回的JSON
+
+        Raises:
+            WDACommandError: HTTP状态码表示失败，或返回的value中带有error
+        """
+        response = self.http.request(method, f"{self.base_url}{path}", json=payload, timeout=self.command_timeout)
+        try:
+            data = response.json()
+        except ValueError:
+            raise WDACommandError(response.status_code, response.text)
+        value = data.get('value')
+        if response.status_code >= 400 or (isinstance(value, dict) and value.get('error')) \
+                or data.get('status') not in (None, 0):
+            raise WDACommandError(response.status_code, value)
+        return data
+
+    def session_id(self) -> str:
+        """获取缓存的WDA会话ID，首次调用或已失效时创建"""
+        with self._lock:
+            if self._session_id is None:
+                data = self.request('POST', '/session', {'capabilities': {}})
+                value = data.get('value') if isinstance(data.get('value'), dict) else {}
+                self._session_id = data.get('sessionId') or value.get('sessionId')
+                if not self._session_id:
+                    raise WDACommandError(200, f"创建会话未返回sessionId: {data}")
+                print(f"创建WDA会话: {self._session_id}")
+            return self._session_id
+
+    def invalidate_session(self) -> None:
+        with self._lock:
+            self._session_id = None
+
+    @staticmethod
+    def is_stale_session_error(error: Exception) -> bool:
+        """WDA是否报告会话已失效"""
+        message = str(error).lower()
+        return 'invalid session' in message or 'session does not exist' in message
+
+    def session_request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        """
+        在缓存的会话下发送WDA命令，遇到会话失效时重建会话并重试一次
+
+        Args:
+            method: HTTP方法
+            path: 会话下的路径，如 /wda/apps/state
+            payload: 请求体
+        """
+        try:
+            return self.request(method, f"/session/{self.session_id()}{path}", payload)
+        except WDACommandError as e:
+            if not self.is_stale_session_error(e):
+                raise
+            print("WDA会话已失效，重新创建会话")
+            self.invalidate_session()
+            return self.request(method, f"/session/{self.session_id()}{path}", payload)
+
+    def app_state(self, bundle_id: str) -> dict:
+        """查询应用状态，返回值的value为状态值（见 APP_STATE_*）"""
+        return self.session_request('POST', '/wda/apps/state', {'bundleId': bundle_id})
+
+    def app_terminate(self, bundle_id: str) -> dict:
+        return self.session_request('POST', '/wda/apps/terminate', {'bundleId': bundle_id})
+
+    def app_launch(self, bundle_id: str, wait_for_quiescence: bool = True) -> dict:
+        return self.session_request('POST', '/wda/apps/launch', {
+            'bundleId': bundle_id,
+            'arguments': [],
+            'environment': {},
+            'shouldWaitForQuiescence': wait_for_quiescence,
+        })
+
+    def close(self) -> None:
+        self.invalidate_session()
+        self.http.close()
+
+
+_connections: Dict[str, WDAConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def get_wda_connection(base_url: str = "http://127.0.0.1:8100") -> WDAConnection:
+    """
+    获取设备对应的WDA连接，同一地址在进程内只创建一次
 
-        print("WDA服务器启动超时")
-        process.terminate()
-        return False
+    Args:
+        base_url: WDA在本机的访问地址（每台设备一个端口）
+    """
+    base_url = base_url.rstrip('/')
+    with _connections_lock:
+        connection = _connections.get(base_url)
+        if connection is None:
+            connection = WDAConnection(base_url)
+            _connections[base_url] = connection
+        return connection
 
-    except Exception as e:
-        print(f"启动WDA服务器失败: {str(e)}")
-        print(f"异常详情: {traceback.format_exc()}")
-        return False
 
+def backoff_delays(initial: float = 0.1, maximum: float = 2.0, factor: float = 2.0):
+    """
+    指数退避等待时间序列（带随机抖动），无限生成
 
-def start_ios_app_by_wda(bundle_id, wait_timeout=30, retry_times=3):
+    每次在 [delay/2, delay] 之间随机取值，避免多台设备同时轮询
     """
-    使用WDA启动iOS应用
+    delay = initial
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(maximum, delay * factor)
 
-    Args:
-        bundle_id: 应用的Bundle ID
-        wait_timeout: 等待应用启动的超时时间（秒）
-        retry_times: 重试次数
+
+class WDALifecycleManager:
     """
-    try:
-        # 检查并启动WDA服务
-        if not start_wda_server():
-            raise Exception("WDA服务器启动失败")
+    基于asyncio的WDA生命周期管理
 
-        # 连接WDA客户端
-        print("正在连接WDA客户端...")
-        client = wda.Client('http://localhost:8100')
+    - WDA已在运行且健康时直接复用，不再无条件kill重启
+    - 启动时同时监听xcodebuild输出中的ServerURLHere行和/status接口，任意一方就绪立即返回
+    - /status 与 app_state 的轮询均使用指数退避+抖动，而不是固定sleep
 
-        # 等待WDA服务就绪
-        start_time = time.time()
-        while time.time() - start_time < 30:  # 30秒超时
+    base_url 和 launch_cmd 均可注入，便于用本地 http.server 和脚本模拟WDA
+    """
+
+    def __init__(self, base_url: Optional[str] = None, udid: Optional[str] = None,
+                 launch_cmd: Optional[List[str]] = None):
+        """
+        Args:
+            base_url: WDA在本机的访问地址，为None时由iproxy守护为该设备分配
+            udid: 设备UDID，为None时使用 idevice_id -l 列出的第一台设备
+            launch_cmd: 启动WDA的命令行，为None时使用xcodebuild构建Airtest IDE中的WebDriverAgent
+        """
+        if base_url is None:
+            udid = udid or resolve_udid()
+            if not udid:
+                raise Exception("未找到已连接的iOS设备")
+            base_url = ensure_iproxy(udid)
+        self.base_url = base_url.rstrip('/')
+        self.udid = udid
+        self.launch_cmd = launch_cmd
+        self.server_url = None
+        self._process = None
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    @property
+    def connection(self) -> WDAConnection:
+        return get_wda_connection(self.base_url)
+
+    async def status(self, timeout: float = 1.0) -> Optional[dict]:
+        """获取WDA状态，不可用时返回None"""
+        return await self._run_blocking(self.connection.status, timeout)
+
+    async def is_healthy(self) -> bool:
+        return await self.status() is not None
+
+    async def wait_ready(self, timeout: float = 60) -> bool:
+        """按指数退避轮询 /status，直到WDA就绪或超时"""
+        deadline = time.monotonic() + timeout
+        for delay in backoff_delays():
+            if await self.is_healthy():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+
+    async def _watch_output(self) -> Optional[str]:
+        """
+        监听启动进程的输出，出现ServerURLHere行时返回其中的地址，进程退出时返回None
+
+        输出由后台线程持续读取：WDA运行期间xcodebuild会一直输出日志，
+        管道不读空会阻塞xcodebuild，因此读取线程在事件循环结束后仍继续工作
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        process = self._process
+
+        def resolve(value):
+            if not future.done():
+                future.set_result(value)
+
+        def notify(value):
             try:
-                client.status()
-                print("WDA客户端连接成功")
-                break
-            except Exception as e:
-                print(f"等待WDA服务就绪... ({str(e)})")
-                time.sleep(2)
-        else:
-            raise Exception("WDA客户端连接超时")
-
-        # 获取会话
-        session = client.session()
+                loop.call_soon_threadsafe(resolve, value)
+            except RuntimeError:
+                # 事件循环已关闭，调用方已经不再等待
+                pass
+
+        def drain():
+            tail = deque(maxlen=20)
+            notified = False
+            for line in process.stdout:
+                if notified:
+                    continue
+                tail.append(line)
+                match = _SERVER_URL_PATTERN.search(line)
+                if match:
+                    notified = True
+                    notify(match.group(1))
+            process.wait()
+            if not notified:
+                print(f"WDA进程退出，退出码: {process.returncode}")
+                print("输出: " + "".join(tail))
+                notify(None)
+
+        threading.Thread(target=drain, name="wda-output-reader", daemon=True).start()
+        return await future
+
+    async def _default_launch_cmd(self) -> Optional[List[str]]:
+        udid = self.udid or await self._run_blocking(resolve_udid)
+        if not udid:
+            print("未找到已连接的iOS设备")
+            return None
+        self.udid = udid
+        print(f"设备UDID: {udid}")
+
+        # 使用Airtest IDE中的WebDriverAgent，直接运行test命令，让Xcode自动处理签名
+        wda_project = get_wda_project_path()
+        return [
+            "xcodebuild",
+            "-project", f"{wda_project}/WebDriverAgent.xcodeproj",
+            "-scheme", "WebDriverAgentRunner",
+            "-destination", f"id={udid}",
+            "-allowProvisioningUpdates",  # 允许自动更新配置文件
+            "test",
+        ]
+
+    async def _kill_stale(self) -> None:
+        """终止该设备残留的（不健康的）WDA进程，等待pkill结束即可，不再固定等待"""
+        # 只匹配本设备的xcodebuild，不影响同一台Mac上其他设备的WDA
+        pattern = f"WebDriverAgent.*id={self.udid}" if self.udid else "WebDriverAgent"
+        process = await asyncio.create_subprocess_exec(
+            "pkill", "-f", pattern,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        await process.wait()
+
+    async def ensure_running(self, timeout: float = 60) -> bool:
+        """
+        确保WDA可用：健康则复用，否则重新启动并在就绪的第一时间返回
+
+        Returns:
+            bool: WDA是否就绪
+        """
+        if await self.is_healthy():
+            print("WDA服务已在运行，直接复用")
+            return True
+
+        launch_cmd = self.launch_cmd or await self._default_launch_cmd()
+        if not launch_cmd:
+            return False
+        if self.launch_cmd is None:
+            await self._kill_stale()
+
+        print("启动WDA...")
+        print(f"执行命令: {' '.join(launch_cmd)}")
+        # xcodebuild需要在事件循环结束后继续运行，不能交给asyncio的子进程传输层管理
+        self._process = subprocess.Popen(
+            launch_cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            errors='replace'
+        )
+
+        watcher = asyncio.ensure_future(self._watch_output())
+        poller = asyncio.ensure_future(self.wait_ready(timeout))
+        try:
+            done, _ = await asyncio.wait({watcher, poller}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if poller in done and poller.result():
+                print("WDA服务器启动成功")
+                return True
+            if watcher in done:
+                self.server_url = watcher.result()
+                if self.server_url is None:
+                    return False
+                # 设备端已开始监听，剩下的只是端口转发建立连接的时间
+                print(f"WDA已监听: {self.server_url}")
+                if await poller:
+                    print("WDA服务器启动成功")
+                    return True
+            print("WDA服务器启动超时")
+            self._process.terminate()
+            return False
+        finally:
+            for task in (watcher, poller):
+                if not task.done():
+                    task.cancel()
+
+    async def _call(self, func, *args):
+        """在线程池中执行WDA命令（WDAConnection的方法），会话失效时自动重建"""
+        return await self._run_blocking(func, *args)
+
+    async def wait_app_state(self, bundle_id: str, state: int, timeout: float) -> bool:
+        """按指数退避轮询应用状态，直到达到目标状态或超时"""
+        deadline = time.monotonic() + timeout
+        for delay in backoff_delays(initial=0.2, maximum=1.0):
+            app_state = await self._call(self.connection.app_state, bundle_id)
+            if app_state['value'] == state:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"等待应用状态超时，当前状态: {app_state}")
+                return False
+            await asyncio.sleep(min(delay, remaining))
+
+    async def launch_app(self, bundle_id: str, wait_timeout: float = 30, retry_times: int = 3) -> bool:
+        """
+        启动应用并等待其进入前台
+
+        Args:
+            bundle_id: 应用的Bundle ID
+            wait_timeout: 等待应用启动的超时时间（秒）
+            retry_times: 重试次数
+        """
+        if not await self.ensure_running():
+            raise Exception("WDA服务器启动失败")
+
+        # 复用已缓存的会话，只有首次启动或会话失效时才创建
+        await self._run_blocking(self.connection.session_id)
 
         for i in range(retry_times):
             try:
-                # 检查应用当前状态
-                app_state = client.app_state(bundle_id)
+                app_state = await self._call(self.connection.app_state, bundle_id)
                 print(f"应用当前状态: {app_state}")
 
-                # 应用状态值说明：
-                # 0: 未运行
-                # 1: 后台运行（挂起）
-                # 2: 后台运行
-                # 3: 前台运行（挂起）
-                # 4: 前台运行
-
-                # 如果应用在运行，先终止
-                if app_state['value'] != 0:  # NOT_RUNNING = 0
+                # 如果应用在运行，先终止并等待其真正退出
+                if app_state['value'] != APP_STATE_NOT_RUNNING:
                     print("终止现有应用...")
-                    client.app_terminate(bundle_id)
-                    time.sleep(1)
+                    await self._call(self.connection.app_terminate, bundle_id)
+                    await self.wait_app_state(bundle_id, APP_STATE_NOT_RUNNING, timeout=5)
 
-                # 启动应用
                 print(f"正在启动应用 {bundle_id}...")
-                client.app_launch(
-                    bundle_id,
-                    wait_for_quiescence=True
-                )
-
-                # 等待应用进入前台
-                start_time = time.time()
-                while time.time() - start_time < wait_timeout:
-                    app_state = client.app_state(bundle_id)
-                    if app_state['value'] == 4:  # RUNNING_FOREGROUND = 4
-                        print(f"应用 {bundle_id} 启动成功")
-                        return True
-                    print(f"等待应用启动，当前状态: {app_state}")
-                    time.sleep(1)
+                await self._call(self.connection.app_launch, bundle_id, True)
 
+                if await self.wait_app_state(bundle_id, APP_STATE_RUNNING_FOREGROUND, wait_timeout):
+                    print(f"应用 {bundle_id} 启动成功")
+                    return True
                 print(f"等待应用启动超时（尝试 {i + 1}/{retry_times}）")
 
-            except wda.WDAError as e:
+            except (wda.WDAError, requests.exceptions.RequestException) as e:
                 print(f"WDA错误（尝试 {i + 1}/{retry_times}）: {str(e)}")
                 if i == retry_times - 1:
                     raise
-                time.sleep(2)
+                await asyncio.sleep(next(backoff_delays(initial=1.0)))
+
+        return False
+
+
+def resolve_udid() -> Optional[str]:
+    """获取第一台已连接iOS设备的UDID，没有设备时返回None"""
+    devices = list_ios_devices()
+    return devices[0] if devices else None
+
+
+def ensure_iproxy(udid: str) -> str:
+    """
+    确保设备的 iproxy 在运行（由守护线程监控，退出后自动重启）
+
+    WDA就绪检测本身会等待转发建立，这里不再额外等待
+
+    Returns:
+        str: 该设备WDA在本机的访问地址
+    """
+    return get_iproxy_supervisor().ensure(udid)
 
+
+def start_wda_server(timeout: float = 60, udid: Optional[str] = None):
+    """
+    启动WDA服务器，WDA已健康运行时直接复用
+
+    Args:
+        timeout: 等待WDA就绪的超时时间（秒）
+        udid: 设备UDID，为None时使用第一台设备
+    """
+    try:
+        return asyncio.run(WDALifecycleManager(udid=udid).ensure_running(timeout))
+    except Exception as e:
+        print(f"启动WDA服务器失败: {str(e)}")
+        print(f"异常详情: {traceback.format_exc()}")
         return False
 
+
+def start_ios_app_by_wda(bundle_id, wait_timeout=30, retry_times=3, udid=None):
+    """
+    使用WDA启动iOS应用
+
+    Args:
+        bundle_id: 应用的Bundle ID
+        wait_timeout: 等待应用启动的超时时间（秒）
+        retry_times: 重试次数
+        udid: 设备UDID，为None时使用第一台设备
+    """
+    try:
+        return asyncio.run(WDALifecycleManager(udid=udid).launch_app(bundle_id, wait_timeout, retry_times))
     except Exception as e:
         print(f"启动应用失败: {str(e)}")
         return False
 
 
-def check_wda_status():
+def check_wda_status(udid=None):
     """
     检查WDA服务状态，包括自动处理 iproxy
+
+    Args:
+        udid: 设备UDID，为None时使用第一台设备
     """
     try:
-        # 先检查 iproxy 是否运行
-        check_proxy = "ps aux | grep 'iproxy 8100' | grep -v grep"
-        proxy_running = subprocess.run(check_proxy, shell=True, capture_output=True, text=True)
-
-        # 如果 iproxy 没有运行，启动它
-        if not proxy_running.stdout.strip():
-            print("iproxy 未运行，正在启动...")
-            # 后台运行 iproxy
-            subprocess.Popen(
-                "iproxy 8100 8100",
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            time.sleep(1)  # 给 iproxy 一点启动时间
-
-        # 然后检查 WDA 状态
-        response = requests.get('http://localhost:8100/status', timeout=1)
-        return response.status_code == 200
+        # 创建管理器时会确保该设备的 iproxy 在运行，
+        # 然后检查 WDA 状态，iproxy刚启动时按退避重试几次
+        return asyncio.run(WDALifecycleManager(udid=udid).wait_ready(timeout=3))
 
     except Exception as e:
         print(f"WDA状态检查失败: {str(e)}")
         return False
 
 
-def cleanup_iproxy():
+def cleanup_iproxy(udid=None):
     """
     清理 iproxy 进程
+
+    Args:
+        udid: 设备UDID，为None时清理全部设备的转发
     """
-    subprocess.run("pkill -f 'iproxy 8100'", shell=True)
+    get_iproxy_supervisor().stop(udid)
 
 
 if __name__ == "__main__":
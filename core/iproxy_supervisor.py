@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+iproxy端口转发守护
+为每台iOS设备分配独立的本地端口并启动一个iproxy进程，
+后台线程监控进程状态，退出后按指数退避自动重启（连续失败达到上限后放弃），
+重启时保持原来的本地端口，已创建的设备对象中的地址始终有效，
+使同一台Mac可以并行连接多台iPhone。
+设备已有正在运行的iproxy（手动启动或其他工具启动的）时直接沿用其端口；
+自己启动的iproxy在会话结束或进程退出时停止，不会遗留到下一次运行
+"""
+
+import atexit
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import DEVICE_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class Forwarder:
+    """单台设备的端口转发"""
+
+    def __init__(self, udid: str, local_port: int, device_port: int):
+        self.udid = udid
+        self.local_port = local_port
+        self.device_port = device_port
+        self.process = None
+        self.restarts = 0
+        # 连续重启失败次数、下次允许重启的时间、最近一次启动时间（time.monotonic()）
+        self.failures = 0
+        self.next_restart_at = 0.0
+        self.started_at = 0.0
+        self.given_up = False
+        self.exit_code = None
+        # 沿用的外部iproxy进程号，该进程不由守护启动，停止转发时也不终止它
+        self.adopted_pid = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.local_port}"
+
+    @property
+    def alive(self) -> bool:
+        if self.process is not None:
+            return self.process.poll() is None
+        return self.adopted_pid is not None and _pid_alive(self.adopted_pid)
+
+
+def list_ios_devices() -> List[str]:
+    """
+    获取已连接的iOS设备UDID列表
+
+    Returns:
+        List[str]: UDID列表，idevice_id不可用时为空
+    """
+    try:
+        output = subprocess.check_output(['idevice_id', '-l'], stderr=subprocess.DEVNULL)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        logger.error(f"获取iOS设备列表失败: {str(e)}")
+        return []
+    return [line.strip() for line in output.decode('utf-8').splitlines() if line.strip()]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 进程存在但属于其他用户
+        return True
+    return True
+
+
+def _parse_iproxy_args(args: List[str]) -> Optional[Tuple[int, int, Optional[str]]]:
+    """
+    解析iproxy命令行
+
+    支持 `iproxy 8100:8100 -u UDID`（libusbmuxd 2.x）和 `iproxy 8100 8100 [UDID]`（旧版）两种写法
+
+    Returns:
+        Tuple: (本地端口, 设备端口, UDID)，未指定设备时UDID为None；无法解析时返回None
+    """
+    udid = None
+    positional = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ('-u', '--udid', '-s', '--source') and i + 1 < len(args):
+            if arg in ('-u', '--udid'):
+                udid = args[i + 1]
+            i += 2
+            continue
+        if not arg.startswith('-'):
+            positional.append(arg)
+        i += 1
+    try:
+        if positional and ':' in positional[0]:
+            local_port, device_port = positional[0].split(':', 1)
+        elif len(positional) >= 2:
+            local_port, device_port = positional[:2]
+            if len(positional) >= 3 and udid is None:
+                udid = positional[2]
+        else:
+            return None
+        return int(local_port), int(device_port), udid
+    except ValueError:
+        return None
+
+
+def running_iproxies() -> List[Tuple[int, int, int, Optional[str]]]:
+    """
+    列出本机正在运行的iproxy
+
+    Returns:
+        List: (进程号, 本地端口, 设备端口, UDID)，ps不可用时为空
+    """
+    try:
+        output = subprocess.check_output(['ps', '-Ao', 'pid=,args='], stderr=subprocess.DEVNULL)
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.debug(f"获取进程列表失败: {str(e)}")
+        return []
+    result = []
+    for line in output.decode('utf-8', errors='replace').splitlines():
+        parts = line.split()
+        if len(parts) < 2 or os.path.basename(parts[1]) != 'iproxy':
+            continue
+        parsed = _parse_iproxy_args(parts[2:])
+        if parsed:
+            result.append((int(parts[0]), *parsed))
+    return result
+
+
+def _port_available(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('127.0.0.1', port))
+            return True
+        except OSError:
+            return False
+
+
+class IproxySupervisor:
+    """
+    管理多台设备的iproxy进程
+
+    端口从 local_port_base 开始向上分配，单设备时仍使用8100，与默认的 DEVICE_CONFIG['IOS']['uri'] 保持一致
+    """
+
+    def __init__(self, device_port: int = 8100, local_port_base: int = 8100,
+                 check_interval: float = 2.0, iproxy_path: str = 'iproxy',
+                 max_backoff: float = 60.0, max_failures: int = 10, stable_after: float = 30.0):
+        """
+        Args:
+            device_port: 设备上WDA监听的端口
+            local_port_base: 本地端口分配的起始值
+            check_interval: 进程存活检查间隔（秒）
+            iproxy_path: iproxy可执行文件
+            max_backoff: 重启间隔的上限（秒），间隔从check_interval开始逐次翻倍
+            max_failures: 连续重启失败达到该次数后不再自动重启，直到再次调用ensure()
+            stable_after: 进程运行超过该时间（秒）后退出，视为偶发退出，重新计算失败次数
+        """
+        self.device_port = device_port
+        self.local_port_base = local_port_base
+        self.check_interval = check_interval
+        self.iproxy_path = iproxy_path
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.stable_after = stable_after
+        self._forwarders: Dict[str, Forwarder] = {}
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._monitor = None
+
+    def _allocate_port(self) -> int:
+        used = {f.local_port for f in self._forwarders.values()}
+        port = self.local_port_base
+        while port in used or not _port_available(port):
+            port += 1
+        return port
+
+    def _adopt(self, udid: str) -> Optional[Forwarder]:
+        """沿用该设备已在运行的iproxy（未指定设备的iproxy转发到第一台设备，单设备时同样可用）"""
+        used = {f.local_port for f in self._forwarders.values()}
+        candidates = [item for item in running_iproxies()
+                      if item[2] == self.device_port and item[1] not in used and item[3] in (udid, None)]
+        # 优先使用明确指定了该设备的进程
+        candidates.sort(key=lambda item: item[3] is None)
+        for pid, local_port, _, _ in candidates:
+            if _port_available(local_port):
+                # 进程还没开始监听，或者监听失败
+                continue
+            forwarder = Forwarder(udid, local_port, self.device_port)
+            forwarder.adopted_pid = pid
+            forwarder.started_at = time.monotonic()
+            logger.info(f"沿用已运行的iproxy: {udid} -> {forwarder.url} (pid={pid})")
+            return forwarder
+        return None
+
+    def _spawn(self, forwarder: Forwarder) -> None:
+        # libusbmuxd 2.x 语法: iproxy LOCAL_PORT:DEVICE_PORT -u UDID
+        forwarder.started_at = time.monotonic()
+        forwarder.adopted_pid = None
+        forwarder.process = subprocess.Popen(
+            [self.iproxy_path, f"{forwarder.local_port}:{forwarder.device_port}", '-u', forwarder.udid],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        logger.info(f"iproxy已启动: {forwarder.udid} -> {forwarder.url} (pid={forwarder.process.pid})")
+
+    def ensure(self, udid: str) -> str:
+        """
+        确保设备的转发已运行
+
+        Args:
+            udid: 设备UDID
+
+        Returns:
+            str: 该设备WDA在本机的访问地址
+        """
+        with self._lock:
+            forwarder = self._forwarders.get(udid)
+            if forwarder is None:
+                forwarder = self._adopt(udid) or Forwarder(udid, self._allocate_port(), self.device_port)
+                self._forwarders[udid] = forwarder
+            if not forwarder.alive:
+                # 显式调用时立即重试，并清除之前的退避状态
+                forwarder.failures = 0
+                forwarder.next_restart_at = 0.0
+                forwarder.given_up = False
+                self._spawn(forwarder)
+            self._start_monitor()
+            return forwarder.url
+
+    def start(self, udids: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        为多台设备启动转发
+
+        Args:
+            udids: 设备UDID列表，为None时使用 idevice_id -l 列出的全部设备
+
+        Returns:
+            Dict: UDID -> URL
+        """
+        for udid in (udids if udids is not None else list_ios_devices()):
+            self.ensure(udid)
+        return self.url_map()
+
+    def url_map(self) -> Dict[str, str]:
+        """当前全部设备的 UDID -> URL 映射"""
+        with self._lock:
+            return {udid: f.url for udid, f in self._forwarders.items()}
+
+    def url_for(self, udid: str) -> str:
+        """获取设备的访问地址，未启动转发时自动启动"""
+        return self.ensure(udid)
+
+    def _start_monitor(self) -> None:
+        if self._monitor and self._monitor.is_alive():
+            return
+        self._stop_event.clear()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="iproxy-supervisor", daemon=True)
+        self._monitor.start()
+
+    def _monitor_loop(self) -> None:
+        while not self._stop_event.wait(self.check_interval):
+            with self._lock:
+                for forwarder in self._forwarders.values():
+                    if forwarder.alive or forwarder.given_up:
+                        continue
+                    self._restart(forwarder)
+
+    def _restart(self, forwarder: Forwarder) -> None:
+        """按指数退避重启已退出的iproxy，端口保持不变"""
+        now = time.monotonic()
+        if forwarder.process is not None or forwarder.adopted_pid is not None:
+            # 第一次发现进程退出：运行时间足够长的视为偶发退出，重新计算失败次数
+            forwarder.exit_code = forwarder.process.returncode if forwarder.process is not None else None
+            forwarder.process = None
+            forwarder.adopted_pid = None
+            if now - forwarder.started_at >= self.stable_after:
+                forwarder.failures = 0
+                forwarder.next_restart_at = 0.0
+        if now < forwarder.next_restart_at:
+            return
+        if forwarder.failures >= self.max_failures:
+            forwarder.given_up = True
+            logger.error(f"iproxy连续 {forwarder.failures} 次重启失败({forwarder.udid}，端口 {forwarder.local_port})，"
+                         f"不再自动重启")
+            return
+        forwarder.failures += 1
+        forwarder.restarts += 1
+        forwarder.next_restart_at = now + min(self.max_backoff, self.check_interval * 2 ** (forwarder.failures - 1))
+        logger.warning(f"iproxy已退出({forwarder.udid}，退出码 {forwarder.exit_code})，第 {forwarder.restarts} 次重启")
+        # 不换端口：已创建的IOS设备对象里保存的是 url_for(udid) 返回的地址，换端口会使其失效
+        if not _port_available(forwarder.local_port):
+            logger.warning(f"端口 {forwarder.local_port} 被占用，等待释放后再重启iproxy({forwarder.udid})")
+            return
+        try:
+            self._spawn(forwarder)
+        except OSError as e:
+            logger.error(f"启动iproxy失败({forwarder.udid}): {str(e)}")
+
+    def stop(self, udid: Optional[str] = None) -> None:
+        """
+        停止转发（沿用的外部iproxy不终止）
+
+        Args:
+            udid: 设备UDID，为None时停止全部转发和监控线程
+        """
+        with self._lock:
+            udids = list(self._forwarders) if udid is None else [udid]
+            for key in udids:
+                forwarder = self._forwarders.pop(key, None)
+                if forwarder and forwarder.process is not None and forwarder.alive:
+                    forwarder.process.terminate()
+                    try:
+                        forwarder.process.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
+                        forwarder.process.kill()
+            if udid is None:
+                self._stop_event.set()
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_iproxy_supervisor() -> IproxySupervisor:
+    """获取进程内共享的iproxy守护实例，进程退出时停止其启动的iproxy"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            ios_conf = DEVICE_CONFIG['IOS']
+            _supervisor = IproxySupervisor(
+                device_port=ios_conf.get('device_port', 8100),
+                local_port_base=ios_conf.get('local_port_base', 8100)
+            )
+            atexit.register(_supervisor.stop)
+        return _supervisor
+
+
+def ios_device_uri(udid: str) -> str:
+    """生成指定设备的Airtest设备URI，如 iOS:///http://127.0.0.1:8101"""
+    return f"iOS:///{get_iproxy_supervisor().url_for(udid)}"
+
+
+if __name__ == "__main__":
+    import time
+
+    supervisor = get_iproxy_supervisor()
+    print(f"设备转发: {supervisor.start()}")
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        supervisor.stop()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Android性能数据后台采样
+在测试执行期间按固定间隔采集CPU、内存、FPS、网络数据，
+以列式数组保存时间序列，结束时计算p50/p95/p99统计
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.dumpsys import parse_meminfo
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# dumpsys cpuinfo: "  12% 1234/com.example.app: 8% user + 4% kernel"
+_CPU_LINE_PATTERN = re.compile(r'^\s*([\d.]+)%\s+\d+/([^:\s]+):', re.MULTILINE)
+_FRAMESTATS_MARKER = '---PROFILEDATA---'
+# 一帧超过该耗时（纳秒）记为卡顿帧
+_JANK_THRESHOLD_NS = 16_666_667
+
+# 各采样指标对应的shell命令，{package} 在运行时替换
+SAMPLE_COMMANDS = {
+    'cpuinfo': 'dumpsys cpuinfo',
+    'meminfo': 'dumpsys meminfo {package}',
+    'gfxinfo': 'dumpsys gfxinfo {package} framestats',
+    'net_dev': 'cat /proc/net/dev',
+}
+
+COLUMNS = ('timestamp', 'cpu_percent', 'memory_kb', 'fps', 'jank_percent', 'rx_kbps', 'tx_kbps')
+
+
+def parse_cpu_percent(output: str, package: str) -> float:
+    """
+    解析dumpsys cpuinfo中指定应用（含其子进程）的CPU占用
+
+    Returns:
+        float: CPU占用百分比，未找到时为nan
+    """
+    total = None
+    for percent, process in _CPU_LINE_PATTERN.findall(output):
+        if process == package or process.startswith(package + ':'):
+            total = (total or 0.0) + float(percent)
+    return float('nan') if total is None else total
+
+
+def parse_memory_kb(output: str) -> float:
+    """解析dumpsys meminfo的TOTAL PSS（KB），未找到时为nan"""
+    total = parse_meminfo(output).total_pss
+    return float('nan') if total is None else float(total)
+
+
+def parse_framestats(output: str) -> List[Tuple[int, int]]:
+    """
+    解析dumpsys gfxinfo framestats中的有效帧
+
+    Returns:
+        List[Tuple[int, int]]: (IntendedVsync, FrameCompleted) 纳秒时间戳列表，已排除Flags非0的帧
+    """
+    frames = []
+    in_profile = False
+    columns = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line == _FRAMESTATS_MARKER:
+            in_profile = not in_profile
+            columns = None
+            continue
+        if not in_profile or not line:
+            continue
+        fields = line.rstrip(',').split(',')
+        if columns is None:
+            columns = {name: index for index, name in enumerate(fields)}
+            continue
+        try:
+            if int(fields[columns['Flags']]) != 0:
+                continue
+            frames.append((int(fields[columns['IntendedVsync']]), int(fields[columns['FrameCompleted']])))
+        except (KeyError, IndexError, ValueError):
+            continue
+    return frames
+
+
+def parse_net_bytes(output: str) -> Tuple[int, int]:
+    """
+    解析/proc/net/dev，汇总除lo以外所有网卡的收发字节数
+
+    Returns:
+        Tuple[int, int]: (接收字节数, 发送字节数)
+    """
+    rx_total, tx_total = 0, 0
+    for line in output.splitlines():
+        if ':' not in line:
+            continue
+        name, data = line.split(':', 1)
+        if name.strip() == 'lo':
+            continue
+        fields = data.split()
+        if len(fields) < 9:
+            continue
+        try:
+            rx_total += int(fields[0])
+            tx_total += int(fields[8])
+        except ValueError:
+            continue
+    return rx_total, tx_total
+
+
+class ColumnarSeries:
+    """
+    列式时间序列
+
+    每列是一个紧凑的double数组，追加时不产生逐行字典对象
+    """
+
+    def __init__(self, columns: Tuple[str, ...] = COLUMNS):
+        self.columns = tuple(columns)
+        self._data = {name: array('d') for name in self.columns}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data[self.columns[0]])
+
+    def append(self, *values: float) -> None:
+        with self._lock:
+            for name, value in zip(self.columns, values):
+                self._data[name].append(value)
+
+    def column(self, name: str) -> np.ndarray:
+        """获取某一列的NumPy数组（拷贝）"""
+        with self._lock:
+            return np.array(self._data[name], dtype=np.float64)
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name in self.columns}
+
+    def save(self, path: str) -> str:
+        """
+        保存为.npz文件
+
+        Returns:
+            str: 实际写入的文件路径
+        """
+        if not path.endswith('.npz'):
+            path += '.npz'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, **self.to_numpy())
+        return path
+
+
+class RecordedShell:
+    """
+    回放预先录制的dumpsys输出，用于离线运行采样器
+
+    目录下按 `<指标>_<序号>.txt` 存放输出（如 meminfo_000.txt），
+    每次调用依次返回下一份，用完后循环
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._outputs: Dict[str, List[str]] = {}
+        self._cursor: Dict[str, int] = {}
+        for kind in SAMPLE_COMMANDS:
+            files = sorted(
+                f for f in os.listdir(directory)
+                if f.startswith(kind + '_') and f.endswith('.txt')
+            )
+            contents = []
+            for filename in files:
+                with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                    contents.append(f.read())
+            self._outputs[kind] = contents
+            self._cursor[kind] = 0
+
+    def __call__(self, cmd: str) -> str:
+        kind = _command_kind(cmd)
+        outputs = self._outputs.get(kind)
+        if not outputs:
+            return ''
+        index = self._cursor[kind]
+        self._cursor[kind] = index + 1
+        return outputs[index % len(outputs)]
+
+
+class RecordingShell:
+    """包装真实shell，把每次采集的输出按RecordedShell的格式写入目录"""
+
+    def __init__(self, shell: Callable[[str], str], directory: str):
+        self.shell = shell
+        self.directory = directory
+        self._counter: Dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, cmd: str) -> str:
+        output = self.shell(cmd)
+        kind = _command_kind(cmd)
+        if kind:
+            index = self._counter.get(kind, 0)
+            self._counter[kind] = index + 1
+            path = os.path.join(self.directory, f"{kind}_{index:03d}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(output)
+        return output
+
+
+def _command_kind(cmd: str) -> Optional[str]:
+    for kind, template in SAMPLE_COMMANDS.items():
+        if cmd.startswith(template.split('{')[0].strip()):
+            return kind
+    return None
+
+
+class PerfSampler:
+    """
+    后台性能采样器
+
+    采样在独立线程中进行，测试线程只负责start/stop；
+    默认通过core.andriod的常驻shell会话采集，也可以传入任意 shell(cmd) -> str 可调用对象
+    """
+
+    def __init__(self, package: str, interval: float = 1.0, shell: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            package: 被测应用包名
+            interval: 采样间隔（秒）
+            shell: 执行shell命令的函数，默认使用当前Android设备
+        """
+        self.package = package
+        self.interval = interval
+        self.shell = shell or _default_shell
+        self.series = ColumnarSeries()
+        self.errors = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_vsync = 0
+        self._last_net = None
+
+    def start(self) -> 'PerfSampler':
+        """开始后台采样"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"perf-sampler-{self.package}", daemon=True)
+        self._thread.start()
+        logger.info(f"性能采样已启动: {self.package}，间隔 {self.interval} 秒")
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止采样并等待当前这次采样结束"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout if timeout is not None else self.interval * 5 + 10)
+        logger.info(f"性能采样已停止: 共 {len(self.series)} 个样本，失败 {self.errors} 次")
+
+    def __enter__(self) -> 'PerfSampler':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.sample_once()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"性能采样失败: {str(e)}")
+            self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _run_command(self, kind: str) -> str:
+        return self.shell(SAMPLE_COMMANDS[kind].format(package=self.package))
+
+    def sample_once(self) -> None:
+        """采集一个样本并追加到时间序列"""
+        timestamp = time.time()
+        cpu = parse_cpu_percent(self._run_command('cpuinfo'), self.package)
+        memory = parse_memory_kb(self._run_command('meminfo'))
+        fps, jank = self._frame_metrics(parse_framestats(self._run_command('gfxinfo')))
+        rx_kbps, tx_kbps = self._net_metrics(timestamp, parse_net_bytes(self._run_command('net_dev')))
+        self.series.append(timestamp, cpu, memory, fps, jank, rx_kbps, tx_kbps)
+
+    def _frame_metrics(self, frames: List[Tuple[int, int]]) -> Tuple[float, float]:
+        # framestats返回最近的若干帧，只统计上次采样之后新产生的帧
+        new_frames = [f for f in frames if f[0] > self._last_vsync]
+        if not new_frames:
+            return 0.0, 0.0
+        self._last_vsync = max(f[0] for f in new_frames)
+        jank = sum(1 for start, end in new_frames if end - start > _JANK_THRESHOLD_NS)
+        jank_percent = jank * 100.0 / len(new_frames)
+        if len(new_frames) < 2:
+            return float('nan'), jank_percent
+        span_ns = max(f[1] for f in new_frames) - min(f[0] for f in new_frames)
+        fps = (len(new_frames) - 1) * 1e9 / span_ns if span_ns > 0 else float('nan')
+        return fps, jank_percent
+
+    def _net_metrics(self, timestamp: float, current: Tuple[int, int]) -> Tuple[float, float]:
+        previous, self._last_net = self._last_net, (timestamp, current)
+        if previous is None:
+            return float('nan'), float('nan')
+        elapsed = timestamp - previous[0]
+        if elapsed <= 0:
+            return float('nan'), float('nan')
+        rx = (current[0] - previous[1][0]) / 1024 / elapsed
+        tx = (current[1] - previous[1][1]) / 1024 / elapsed
+        return rx, tx
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        计算各指标的统计结果
+
+        Returns:
+            Dict: {指标名: {p50, p95, p99, mean, max, count}}
+        """
+        result = {}
+        for name in self.series.columns[1:]:
+            values = self.series.column(name)
+            values = values[~np.isnan(values)]
+            if values.size == 0:
+                result[name] = {'count': 0}
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[name] = {
+                'p50': round(float(p50), 2),
+                'p95': round(float(p95), 2),
+                'p99': round(float(p99), 2),
+                'mean': round(float(values.mean()), 2),
+                'max': round(float(values.max()), 2),
+                'count': int(values.size),
+            }
+        return result
+
+    def summary_json(self) -> str:
+        return json.dumps(
+            {'package': self.package, 'samples': len(self.series), 'metrics': self.summary()},
+            ensure_ascii=False,
+            indent=2
+        )
+
+
+def _default_shell(cmd: str) -> str:
+    from core.andriod import _shell
+    return _shell(cmd)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='使用录制的dumpsys输出离线运行性能采样器')
+    parser.add_argument('directory', help='录制输出所在目录')
+    parser.add_argument('package', help='应用包名')
+    parser.add_argument('--samples', type=int, default=10, help='采样次数')
+    args = parser.parse_args()
+
+    sampler = PerfSampler(args.package, shell=RecordedShell(args.directory))
+    for _ in range(args.samples):
+        sampler.sample_once()
+    print(sampler.summary_json())
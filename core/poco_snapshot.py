@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Poco控件树快照
+Poco每次按选择器查找都会重新dump整棵控件树，复杂页面一次dump需要300~800ms。
+这里dump一次后按 name/text/type/resourceId 建立索引，多个查询共用同一份快照，
+直到输入操作（见 core.popup_handler.mark_input）使其失效；
+diff模式下输入操作后先检查当前窗口/Activity，未变化时继续使用旧快照
+
+基准（使用录制的控件树JSON）:
+    python -m core.poco_snapshot hierarchy.json --select name=android:id/title text=设置 --repeat 200
+录制:
+    python -m core.poco_snapshot --record hierarchy.json --uri "Android:///"
+"""
+
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import AIRTEST_CONFIG
+from core.popup_handler import input_epoch
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 建立索引的属性
+INDEXED_ATTRS = ('name', 'text', 'type', 'resourceId')
+
+
+@dataclass
+class SnapshotNode:
+    """快照中的一个控件"""
+    index: int
+    name: str
+    payload: dict
+    parent: Optional[int] = None
+    children: List[int] = field(default_factory=list)
+
+    def attr(self, name: str):
+        if name == 'name':
+            return self.payload.get('name', self.name)
+        return self.payload.get(name)
+
+    @property
+    def pos(self) -> Tuple[float, float]:
+        """控件中心的归一化坐标 (0~1)"""
+        pos = self.payload.get('pos') or (0.5, 0.5)
+        return float(pos[0]), float(pos[1])
+
+    @property
+    def size(self) -> Tuple[float, float]:
+        size = self.payload.get('size') or (0.0, 0.0)
+        return float(size[0]), float(size[1])
+
+
+def _walk(dump: dict) -> Iterator[Tuple[dict, Optional[int]]]:
+    """按先序遍历控件树，产出 (节点, 父节点序号)，不使用递归以免深层页面超出递归深度"""
+    stack = [(dump, None)]
+    counter = 0
+    while stack:
+        node, parent = stack.pop()
+        index = counter
+        counter += 1
+        yield node, parent
+        for child in reversed(node.get('children') or []):
+            stack.append((child, index))
+
+
+def _match_attr(node: SnapshotNode, attr: str, expected) -> bool:
+    # 与Poco的选择器一致：xxxMatches 为正则匹配
+    if attr.endswith('Matches'):
+        value = node.attr(attr[:-len('Matches')])
+        return isinstance(value, str) and re.match(expected, value) is not None
+    return node.attr(attr) == expected
+
+
+class HierarchySnapshot:
+    """一次dump得到的控件树及其索引"""
+
+    def __init__(self, dump: dict, captured_at: Optional[float] = None, window: Optional[str] = None):
+        """
+        Args:
+            dump: poco.agent.hierarchy.dump() 的结果
+            captured_at: dump时间（time.monotonic()）
+            window: dump时的窗口/Activity，diff模式使用
+        """
+        self.captured_at = time.monotonic() if captured_at is None else captured_at
+        self.window = window
+        self.nodes: List[SnapshotNode] = []
+        self._indexes: Dict[str, Dict[object, List[int]]] = {attr: {} for attr in INDEXED_ATTRS}
+        for raw, parent in _walk(dump or {}):
+            node = SnapshotNode(len(self.nodes), raw.get('name', ''), raw.get('payload') or {}, parent)
+            self.nodes.append(node)
+            if parent is not None:
+                self.nodes[parent].children.append(node.index)
+            for attr in INDEXED_ATTRS:
+                value = node.attr(attr)
+                if value is not None and value != '':
+                    self._indexes[attr].setdefault(value, []).append(node.index)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def query(self, name: Optional[str] = None, **attrs) -> List[SnapshotNode]:
+        """
+        按属性查找控件（与 poco(name, **attrs) 的写法一致）
+
+        Args:
+            name: 控件name
+            **attrs: 其他属性，如 text="设置"、type="android.widget.TextView"、textMatches="^设.*"
+
+        Returns:
+            List[SnapshotNode]: 按控件树先序排列的匹配控件
+        """
+        if name is not None:
+            attrs['name'] = name
+        if not attrs:
+            return list(self.nodes)
+        # 先取最短的索引列表，其余条件逐个过滤
+        candidates = None
+        for attr, expected in attrs.items():
+            if attr in self._indexes:
+                indexed = self._indexes[attr].get(expected, [])
+                if candidates is None or len(indexed) < len(candidates):
+                    candidates = indexed
+        pool = self.nodes if candidates is None else [self.nodes[i] for i in candidates]
+        return [node for node in pool if all(_match_attr(node, a, v) for a, v in attrs.items())]
+
+    def first(self, name: Optional[str] = None, **attrs) -> Optional[SnapshotNode]:
+        matches = self.query(name, **attrs)
+        return matches[0] if matches else None
+
+    def exists(self, name: Optional[str] = None, **attrs) -> bool:
+        return self.first(name, **attrs) is not None
+
+    def children(self, node: SnapshotNode) -> List[SnapshotNode]:
+        return [self.nodes[i] for i in node.children]
+
+    def parent(self, node: SnapshotNode) -> Optional[SnapshotNode]:
+        return self.nodes[node.parent] if node.parent is not None else None
+
+
+def default_window_probe(device) -> Optional[Callable[[], Optional[str]]]:
+    """
+    返回获取当前窗口/Activity的函数，不支持的平台返回None（diff模式不可用）
+
+    Android读取 dumpsys window 的焦点窗口（弹窗、对话框也会改变焦点窗口），iOS读取前台应用
+    """
+    if hasattr(device, 'adb') and hasattr(device, 'serialno'):
+        from core import dumpsys
+
+        def probe():
+            output = device.shell('dumpsys window windows | grep -E "mCurrentFocus|mFocusedApp"')
+            return dumpsys.parse_current_activity(output)
+        return probe
+    if hasattr(device, 'app_current'):
+        def probe():
+            current = device.app_current() or {}
+            return current.get('bundleId')
+        return probe
+    return None
+
+
+class PocoSnapshotCache:
+    """
+    Poco控件树快照缓存
+
+    有效期内且没有输入操作时，查询直接使用上一次的快照
+    """
+
+    def __init__(self, poco, max_age: Optional[float] = None, diff: Optional[bool] = None,
+                 window_probe: Optional[Callable[[], Optional[str]]] = None):
+        """
+        Args:
+            poco: Poco对象
+            max_age: 快照有效期（秒），默认取 AIRTEST_CONFIG['POCO_SNAPSHOT']['max_age']
+            diff: 输入操作后窗口/Activity未变化时是否继续使用旧快照，默认取配置
+            window_probe: 获取当前窗口/Activity的函数，diff模式需要
+        """
+        conf = AIRTEST_CONFIG.get('POCO_SNAPSHOT', {})
+        self.poco = poco
+        self.max_age = conf.get('max_age', 2.0) if max_age is None else max_age
+        self.diff = conf.get('diff', False) if diff is None else diff
+        self.window_probe = window_probe
+        self.hits = 0
+        self.diff_hits = 0
+        self.misses = 0
+        self.dump_seconds = 0.0
+        self._snapshot: Optional[HierarchySnapshot] = None
+        self._epoch = None
+        self._lock = threading.Lock()
+
+    def _dump(self) -> dict:
+        return self.poco.agent.hierarchy.dump()
+
+    def _probe(self) -> Optional[str]:
+        if not self.window_probe:
+            return None
+        try:
+            return self.window_probe()
+        except Exception as e:
+            logger.warning(f"获取当前窗口失败: {str(e)}")
+            return None
+
+    def get(self, fresh: bool = False) -> HierarchySnapshot:
+        """
+        获取控件树快照
+
+        Args:
+            fresh: 为True时忽略缓存，重新dump
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if not fresh and snapshot is not None and time.monotonic() - snapshot.captured_at <= self.max_age:
+                if self._epoch == input_epoch():
+                    self.hits += 1
+                    return snapshot
+                # diff模式：有过输入操作，但窗口/Activity未变化时继续使用旧快照
+                if self.diff and snapshot.window is not None:
+                    epoch = input_epoch()
+                    if self._probe() == snapshot.window:
+                        self._epoch = epoch
+                        self.diff_hits += 1
+                        return snapshot
+            self.misses += 1
+            # 先记录输入计数再dump，dump期间发生的输入会让这份快照在下次查询时失效
+            epoch = input_epoch()
+            window = self._probe() if self.diff else None
+            started = time.perf_counter()
+            dump = self._dump()
+            self.dump_seconds += time.perf_counter() - started
+            self._snapshot = HierarchySnapshot(dump, window=window)
+            self._epoch = epoch
+            return self._snapshot
+
+    def query(self, name: Optional[str] = None, fresh: bool = False, **attrs) -> List[SnapshotNode]:
+        return self.get(fresh).query(name, **attrs)
+
+    def invalidate(self) -> None:
+        """丢弃快照（直接通过Poco对象操作控件后调用）"""
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self) -> dict:
+        """命中统计，saved_seconds为按平均dump耗时估算的节省时间"""
+        average = self.dump_seconds / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'diff_hits': self.diff_hits,
+            'misses': self.misses,
+            'dump_seconds': round(self.dump_seconds, 3),
+            'saved_seconds': round(average * (self.hits + self.diff_hits), 3),
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.diff_hits = 0
+        self.misses = 0
+        self.dump_seconds = 0.0
+
+
+def _scan_tree(dump: dict, attrs: dict) -> List[dict]:
+    """不建索引、逐个节点比较（每个选择器各遍历一次，对应重新dump后的查找）"""
+    matches = []
+    for raw, _ in _walk(dump):
+        payload = raw.get('payload') or {}
+        node = SnapshotNode(0, raw.get('name', ''), payload)
+        if all(_match_attr(node, a, v) for a, v in attrs.items()):
+            matches.append(raw)
+    return matches
+
+
+def benchmark(dump_text: str, selectors: List[dict], repeat: int = 100) -> Dict[str, float]:
+    """
+    在录制的控件树JSON上对比 每个选择器各解析一次dump 与 解析一次后按索引查询 的耗时
+
+    只统计本地的解析和查找，真机上每次dump额外还有300~800ms的设备端开销
+
+    Args:
+        dump_text: 录制的控件树JSON文本
+        selectors: 选择器列表，如 [{'name': 'xxx'}, {'text': '设置'}]
+        repeat: 重复次数
+
+    Returns:
+        Dict: nodes、per_selector_ms(每个选择器解析一次)、snapshot_ms(解析一次+索引查询)、dumps_saved
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for attrs in selectors:
+            _scan_tree(json.loads(dump_text), attrs)
+    per_selector = (time.perf_counter() - started) * 1000 / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        snapshot = HierarchySnapshot(json.loads(dump_text))
+        for attrs in selectors:
+            snapshot.query(**attrs)
+    indexed = (time.perf_counter() - started) * 1000 / repeat
+
+    return {
+        'nodes': len(HierarchySnapshot(json.loads(dump_text))),
+        'per_selector_ms': round(per_selector, 3),
+        'snapshot_ms': round(indexed, 3),
+        'dumps_saved': max(0, len(selectors) - 1),
+    }
+
+
+def _parse_selector(text: str) -> dict:
+    attrs = {}
+    for part in text.split(','):
+        key, sep, value = part.partition('=')
+        if not sep:
+            raise ValueError(f"选择器格式应为 属性=值: {text}")
+        attrs[key.strip()] = value
+    return attrs
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Poco控件树快照基准（使用录制的控件树JSON）")
+    parser.add_argument('dump', help='控件树JSON文件（--record时为输出路径）')
+    parser.add_argument('--select', nargs='*', default=[], help='选择器，如 name=xxx 或 type=android.widget.Button,text=确定')
+    parser.add_argument('--repeat', type=int, default=100, help='重复次数')
+    parser.add_argument('--record', action='store_true', help='从设备dump控件树并保存到文件')
+    parser.add_argument('--uri', default=None, help='录制时的设备URI，默认按 DEVICE_CONFIG 生成')
+    args = parser.parse_args()
+
+    if args.record:
+        from airtest.core.api import connect_device
+        from poco.drivers.android.uiautomation import AndroidUiautomationPoco
+        from utils.device_manager import DeviceManager
+
+        device = connect_device(args.uri or DeviceManager.get_device_uri('Android'))
+        poco = AndroidUiautomationPoco(device=device, use_airtest_input=True)
+        with open(args.dump, 'w', encoding='utf-8') as f:
+            json.dump(poco.agent.hierarchy.dump(), f, ensure_ascii=False)
+        print(f"已保存控件树: {args.dump}")
+        raise SystemExit(0)
+
+    with open(args.dump, 'r', encoding='utf-8') as f:
+        text = f.read()
+    selectors = [_parse_selector(s) for s in args.select]
+    if not selectors:
+        # 未指定选择器时取前10个带text的控件
+        selectors = [{'text': n.attr('text')} for n in HierarchySnapshot(json.loads(text)).nodes if n.attr('text')][:10]
+    result = benchmark(text, selectors, args.repeat)
+    print(f"控件数: {result['nodes']}，选择器数: {len(selectors)}")
+    print(f"每个选择器各解析一次: {result['per_selector_ms']:.3f} ms")
+    print(f"解析一次+索引查询:     {result['snapshot_ms']:.3f} ms")
+    print(f"真机上每轮可省去 {result['dumps_saved']} 次dump（每次约300~800ms）")
@@ -2,57 +2,188 @@
 # -*- coding: utf-8 -*-
 """
 处理各种异常弹窗的装饰器
+弹窗检测由后台线程完成：每个周期只截一帧，所有弹窗模板都在这一帧上匹配，
+只有匹配到弹窗时才点击关闭，点击期间暂停测试线程的输入操作
 """
 
 import time
+import threading
 import functools
-from typing import Callable, Any
-from utils.logger import logger
+from typing import Callable, Any, Optional
+from airtest.core.cv import Template
+from airtest.core.helper import G
+from core.batch_match import BatchMatcher
+from core.capture import capture_frame
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 测试线程的输入操作与弹窗关闭操作互斥，
+# 测试线程只会在弹窗真正被点击关闭的这段时间内等待
+input_lock = threading.RLock()
+# 输入操作计数，每次点击/滑动/输入后加一，截图缓存据此判断画面是否可能已变化
+_input_epoch = 0
+
+
+def mark_input() -> None:
+    """记录一次输入操作（调用方需持有input_lock）"""
+    global _input_epoch
+    _input_epoch += 1
+
+
+def input_epoch() -> int:
+    """当前的输入操作计数"""
+    return _input_epoch
+
+# 默认弹窗配置
+DEFAULT_POPUP_CONFIGS = [
+    {"check": "update_close.png", "name": "升级弹窗"},
+    {"check": "ad_close.png", "name": "广告弹窗"},
+    {"check": "allow_button.png", "name": "权限弹窗"}
+]
+
+
+class PopupWatcher:
+    """
+    后台弹窗监视器
+
+    用法:
+        with PopupWatcher(popup_configs):
+            ...  # 测试步骤
+    """
+
+    def __init__(self, popup_configs: Optional[list] = None, interval: float = 0.5,
+                 retry_times: int = 3, device=None):
+        """
+        Args:
+            popup_configs: 弹窗配置列表，每项包含 check(检查图片或Template) 和 name(弹窗名称)
+            interval: 两次检测之间的间隔
+            retry_times: 连续出错的最大次数，超过后停止监视
+            device: 设备对象，默认使用当前设备G.DEVICE
+        """
+        self.configs = popup_configs or DEFAULT_POPUP_CONFIGS
+        self.templates = [
+            config["check"] if isinstance(config["check"], Template) else Template(config["check"])
+            for config in self.configs
+        ]
+        self.matcher = BatchMatcher()
+        self.interval = interval
+        self.retry_times = retry_times
+        self.device = device
+        self.frames = 0
+        self.dismissed = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _device(self):
+        return self.device or G.DEVICE
+
+    def check_once(self) -> bool:
+        """
+        截一帧并批量匹配全部弹窗模板，关闭得分最高的弹窗
+
+        Returns:
+            bool: 是否关闭了弹窗
+        """
+        device = self._device()
+        screen = capture_frame(device)
+        if screen is None:
+            return False
+        self.frames += 1
+
+        result = self.matcher.match(screen, self.templates)
+        if result.best is None:
+            return False
+        config = self.configs[result.best.index]
+        logger.info(f"检测到{config['name']}，匹配度 {result.best.score:.2f}")
+        with input_lock:
+            try:
+                device.touch(result.best.pos)
+            finally:
+                mark_input()
+        self.dismissed += 1
+        # 一帧只处理一个弹窗，关闭后画面已变化，其余模板在下一帧重新匹配
+        return True
+
+    def _run(self) -> None:
+        errors = 0
+        while not self._stop_event.is_set():
+            try:
+                self.check_once()
+                errors = 0
+            except Exception as e:
+                errors += 1
+                logger.error(f"处理弹窗时发生错误: {str(e)}")
+                if errors >= self.retry_times:
+                    logger.error("弹窗处理连续出错，停止监视")
+                    return
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> 'PopupWatcher':
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="popup-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        停止监视
+
+        Args:
+            timeout: 等待后台线程结束的最长时间（秒），线程卡在设备调用中时不会阻塞teardown（线程为daemon）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning(f"弹窗监视线程 {timeout} 秒内未结束，可能卡在设备调用中，不再等待")
+        logger.info(f"弹窗监视结束: 截图 {self.frames} 帧，关闭弹窗 {self.dismissed} 次")
+
+    def settle(self, timeout: float) -> None:
+        """
+        同步检查操作结束后是否还有弹窗
+
+        没有弹窗时立即返回；关闭弹窗后继续检查可能接连出现的弹窗，最多 timeout 秒
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if not self.check_once():
+                    return
+            except Exception as e:
+                logger.error(f"处理弹窗时发生错误: {str(e)}")
+                return
+            time.sleep(self.interval)
+
+    def __enter__(self) -> 'PopupWatcher':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
 
 
 def handle_popup(popup_configs: list = None, timeout: float = 2.0, interval: float = 0.5, retry_times: int = 3):
     """
     处理弹窗的装饰器
 
+    被装饰的操作执行期间由后台线程监视弹窗，操作结束后再同步检查一帧，
+    没有弹窗时立即返回，不再固定等待 timeout 秒
+
     Args:
         popup_configs: 弹窗配置列表，每项包含 check(检查图片) 和 name(弹窗名称)
-        timeout: 每次检查弹窗的超时时间
-        interval: 重试间隔时间
-        retry_times: 最大重试次数
+        timeout: 操作结束后连续出现弹窗时，最多继续处理的时间
+        interval: 两次检测之间的间隔
+        retry_times: 连续出错的最大次数
     """
-    # 默认弹窗配置
-    default_configs = [
-        {"check": "update_close.png", "name": "升级弹窗"},
-        {"check": "ad_close.png", "name": "广告弹窗"},
-        {"check": "allow_button.png", "name": "权限弹窗"}
-    ]
-
-    popup_configs = popup_configs or default_configs
-
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(self, *args, **kwargs) -> Any:
-            result = func(self, *args, **kwargs)
-
-            retry_count = 0
-            while retry_count < retry_times:
-                try:
-                    start_time = time.time()
-                    while time.time() - start_time < timeout:
-                        for config in popup_configs:
-                            if self.exists(config["check"]):
-                                logger.info(f"检测到{config['name']}")
-                                self.click(config["check"])
-                                time.sleep(interval)
-
-                except Exception as e:
-                    logger.error(f"处理弹窗时发生错误: {str(e)}")
-                    retry_count += 1
-                    time.sleep(interval)
-                    continue
-
-                break
-
+            watcher = PopupWatcher(popup_configs, interval=interval, retry_times=retry_times)
+            with watcher:
+                result = func(self, *args, **kwargs)
+            watcher.settle(timeout)
             return result
 
         return wrapper
@@ -68,4 +199,4 @@ def handle_popup(popup_configs: list = None, timeout: float = 2.0, interval: flo
 ])
 def test_custom(self):
     """自定义弹窗处理测试"""
-    self.click("some_button.png")
\ No newline at end of file
+    self.click("some_button.png")
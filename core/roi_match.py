@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基于record_pos的区域优先匹配
+Template录制时记录了目标中心相对屏幕中心的位置(record_pos，按屏幕宽度归一化)，
+匹配时先在预测位置附近的小窗口内查找，未命中再扩大窗口，最后才搜索整帧，并记录每一级的命中次数
+
+用法:
+    install()  # 替换 Template.match_in，之后的 touch/wait/exists 自动走区域优先匹配
+
+离线基准:
+    python -m core.roi_match --manifest samples.json
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from airtest import aircv
+from airtest.aircv.template_matching import TemplateMatching
+from airtest.core.cv import Template
+from airtest.core.settings import Settings as ST
+from airtest.utils.transform import TargetPos
+
+from config import AIRTEST_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 默认的区域层级：(名称, 模板四周额外留出的边距，按屏幕宽度的比例)，之后是整帧搜索
+DEFAULT_TIERS = [('tight', 0.05), ('wide', 0.2)]
+FULL_TIER = 'full'
+
+
+def predict_center(record_pos: Tuple[float, float], screen_resolution: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    根据record_pos预测目标中心在当前屏幕上的坐标
+
+    record_pos 由Airtest按 ((x - w/2) / w, (y - h/2) / w) 计算，x和y都除以屏幕宽度
+    """
+    w, h = screen_resolution
+    return int(w / 2 + record_pos[0] * w), int(h / 2 + record_pos[1] * w)
+
+
+def roi_window(center: Tuple[int, int], template_size: Tuple[int, int],
+               screen_resolution: Tuple[int, int], margin: float) -> Tuple[int, int, int, int]:
+    """
+    计算搜索窗口
+
+    Args:
+        center: 预测的目标中心
+        template_size: 缩放后的模板尺寸 (宽, 高)
+        screen_resolution: 屏幕分辨率 (宽, 高)
+        margin: 模板四周额外留出的边距（按屏幕宽度的比例）
+
+    Returns:
+        Tuple: (x0, y0, x1, y1)，已限制在屏幕范围内
+    """
+    w, h = screen_resolution
+    pad = int(margin * w)
+    half_w = template_size[0] // 2 + pad
+    half_h = template_size[1] // 2 + pad
+    x0, y0 = max(0, center[0] - half_w), max(0, center[1] - half_h)
+    x1, y1 = min(w, center[0] + half_w), min(h, center[1] + half_h)
+    return x0, y0, x1, y1
+
+
+class RoiMatcher:
+    """区域优先的模板匹配，统计各层级命中次数"""
+
+    def __init__(self, tiers: Optional[List[Tuple[str, float]]] = None):
+        self.tiers = tiers or AIRTEST_CONFIG.get('ROI_TIERS') or DEFAULT_TIERS
+        self.counters: Dict[str, int] = {name: 0 for name, _ in self.tiers}
+        self.counters[FULL_TIER] = 0
+        self.counters['miss'] = 0
+        self._lock = threading.Lock()
+
+    def _count(self, tier: str) -> None:
+        with self._lock:
+            self.counters[tier] = self.counters.get(tier, 0) + 1
+
+    @staticmethod
+    def _template_image(template: Template, screen):
+        image = template._imread()
+        return template._resize_image(image, screen, ST.RESIZE_METHOD)
+
+    def match_in_tier(self, template: Template, screen, margin: float):
+        """
+        只在一个窗口内做模板匹配
+
+        Returns:
+            dict: 匹配结果（坐标已换算为整帧坐标），未命中或窗口不足以容纳模板时为None
+        """
+        screen_resolution = aircv.get_resolution(screen)
+        image = self._template_image(template, screen)
+        th, tw = image.shape[:2]
+        center = predict_center(template.record_pos, screen_resolution)
+        x0, y0, x1, y1 = roi_window(center, (tw, th), screen_resolution, margin)
+        if x1 - x0 < tw or y1 - y0 < th:
+            return None
+
+        crop = screen[y0:y1, x0:x1]
+        threshold = template.threshold or ST.THRESHOLD
+        result = TemplateMatching(image, crop, threshold=threshold, rgb=template.rgb).find_best_result()
+        if not result:
+            return None
+        rx, ry = result['result']
+        result['result'] = (rx + x0, ry + y0)
+        result['rectangle'] = tuple((px + x0, py + y0) for px, py in result['rectangle'])
+        return result
+
+    def match(self, template: Template, screen) -> Tuple[Optional[tuple], str]:
+        """
+        依次在各层级窗口中匹配，最后搜索整帧
+
+        Returns:
+            Tuple: (点击坐标或None, 命中的层级名称，未命中时为 'miss')
+        """
+        if template.record_pos:
+            for name, margin in self.tiers:
+                result = self.match_in_tier(template, screen, margin)
+                if result:
+                    self._count(name)
+                    return TargetPos().getXY(result, template.target_pos), name
+
+        pos = _original_match_in(template, screen)
+        tier = FULL_TIER if pos else 'miss'
+        self._count(tier)
+        return pos, tier
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+_original_match_in = Template.match_in
+
+
+def get_roi_matcher() -> RoiMatcher:
+    """获取进程内共享的区域匹配器"""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = RoiMatcher()
+        return _matcher
+
+
+def _roi_match_in(self, screen):
+    pos, _ = get_roi_matcher().match(self, screen)
+    return pos
+
+
+def install() -> None:
+    """启用区域优先匹配（可重复调用），AIRTEST_CONFIG['ROI_MATCH'] 为False时不生效"""
+    if not AIRTEST_CONFIG.get('ROI_MATCH', True):
+        return
+    if Template.match_in is not _roi_match_in:
+        Template.match_in = _roi_match_in
+        logger.info("区域优先匹配已启用")
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def benchmark(samples: List[dict], repeat: int = 5, tolerance: int = 10) -> Dict[str, dict]:
+    """
+    在保存的截图和模板上对比区域匹配与整帧匹配
+
+    Args:
+        samples: 样本列表，每项包含 screen(截图路径)、template(模板路径)、record_pos、resolution，
+                 可选 expected([x, y]，缺省时以整帧匹配结果为准)
+        repeat: 每个样本重复次数
+        tolerance: 判定坐标正确的误差（像素）
+
+    Returns:
+        Dict: 每个层级的 count(匹配次数)/p50_ms/p95_ms/mean_ms/accuracy，以及整帧基线 baseline
+    """
+    matcher = RoiMatcher()
+    latencies: Dict[str, List[float]] = {}
+    correct: Dict[str, int] = {}
+
+    def _record(tier, elapsed, pos, expected):
+        latencies.setdefault(tier, []).append(elapsed)
+        ok = (pos is None and expected is None) or (
+            pos is not None and expected is not None
+            and abs(pos[0] - expected[0]) <= tolerance and abs(pos[1] - expected[1]) <= tolerance
+        )
+        correct[tier] = correct.get(tier, 0) + (1 if ok else 0)
+
+    for sample in samples:
+        screen = aircv.imread(sample['screen'])
+        template = Template(
+            sample['template'],
+            record_pos=tuple(sample['record_pos']) if sample.get('record_pos') else None,
+            resolution=tuple(sample.get('resolution') or ()),
+            threshold=sample.get('threshold')
+        )
+
+        baseline = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            baseline = _original_match_in(template, screen)
+            _record('baseline', (time.perf_counter() - started) * 1000, baseline,
+                    sample.get('expected') or baseline)
+        expected = sample.get('expected') or baseline
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pos, tier = matcher.match(template, screen)
+            _record(tier, (time.perf_counter() - started) * 1000, pos, expected)
+
+    report = {}
+    for tier, values in latencies.items():
+        report[tier] = {
+            'count': len(values),
+            'p50_ms': round(_percentile(values, 50), 2),
+            'p95_ms': round(_percentile(values, 95), 2),
+            'mean_ms': round(sum(values) / len(values), 2),
+            'accuracy': round(correct.get(tier, 0) / len(values), 3),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+
+    parser = argparse.ArgumentParser(description="区域优先匹配离线基准")
+    parser.add_argument('--manifest', required=True,
+                        help='样本清单JSON：[{"screen", "template", "record_pos", "resolution", "expected"?}]')
+    parser.add_argument('--repeat', type=int, default=5, help='每个样本重复次数')
+    parser.add_argument('--tolerance', type=int, default=10, help='判定坐标正确的误差（像素）')
+    args = parser.parse_args()
+
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    # 清单中的相对路径以清单文件所在目录为基准
+    base = os.path.dirname(os.path.abspath(args.manifest))
+    for item in manifest:
+        item['screen'] = os.path.join(base, item['screen'])
+        item['template'] = os.path.join(base, item['template'])
+
+    results = benchmark(manifest, repeat=args.repeat, tolerance=args.tolerance)
+    print(f"{'tier':<10}{'count':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'mean(ms)':>10}{'accuracy':>10}")
+    for tier in ['tight', 'wide', FULL_TIER, 'miss', 'baseline']:
+        if tier in results:
+            r = results[tier]
+            print(f"{tier:<10}{r['count']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['mean_ms']:>10}{r['accuracy']:>10}")
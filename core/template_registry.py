@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+模板图片注册表
+每个模板图片在进程内只读取、解码一次，按当前设备分辨率缩放后的图片和灰度图同样缓存，
+缓存键为 (路径, 修改时间, 模板录制分辨率, 目标分辨率)，超过内存上限时按LRU淘汰
+
+用法:
+    install()  # 替换 Template._imread / Template._resize_image，之后的匹配自动走缓存
+    warm_up(test_file, screen_resolution)  # 预加载测试模块中引用的全部模板
+"""
+
+import ast
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import cv2
+from airtest import aircv
+from airtest.core.cv import Template
+from airtest.core.settings import Settings as ST
+
+from config import AIRTEST_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 原始图片使用的分辨率占位，与缩放后的变体区分
+_ORIGINAL = None
+
+
+class TemplateRegistry:
+    """按LRU淘汰的模板图片缓存"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Args:
+            max_bytes: 缓存图片占用的内存上限，默认取 AIRTEST_CONFIG['TEMPLATE_CACHE_MB']
+        """
+        if max_bytes is None:
+            max_bytes = int(AIRTEST_CONFIG.get('TEMPLATE_CACHE_MB', 256) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _mtime(path: str) -> float:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+
+    def _get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def _put(self, key, image):
+        # 缓存的图片被多处共享，设为只读避免被意外修改
+        image.setflags(write=False)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = image
+            self._bytes += image.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return image
+
+    def image(self, path: str):
+        """
+        获取模板原图（BGR）
+
+        Args:
+            path: 图片路径
+
+        Returns:
+            numpy数组
+        """
+        key = (os.path.abspath(path), self._mtime(path), _ORIGINAL, _ORIGINAL, 'color')
+        image = self._get(key)
+        if image is None:
+            image = self._put(key, aircv.imread(path))
+        return image
+
+    def resized(self, path: str, resolution: Tuple[int, int], screen_resolution: Tuple[int, int],
+                resize_method=None):
+        """
+        获取按目标分辨率缩放后的模板图，缩放规则与 Template._resize_image 一致
+
+        Args:
+            path: 图片路径
+            resolution: 模板录制时的屏幕分辨率
+            screen_resolution: 当前屏幕分辨率 (宽, 高)
+            resize_method: 缩放函数，默认 ST.RESIZE_METHOD
+        """
+        resize_method = resize_method or ST.RESIZE_METHOD
+        if not resolution or tuple(resolution) == tuple(screen_resolution):
+            return self.image(path)
+        key = (os.path.abspath(path), self._mtime(path), tuple(resolution), tuple(screen_resolution), 'color')
+        image = self._get(key)
+        if image is not None:
+            return image
+
+        original = self.image(path)
+        resize_method = getattr(resize_method, '__func__', resize_method)
+        h, w = original.shape[:2]
+        w_re, h_re = resize_method(w, h, tuple(resolution), tuple(screen_resolution))
+        return self._put(key, cv2.resize(original, (max(1, w_re), max(1, h_re))))
+
+    def gray(self, path: str, resolution: Optional[Tuple[int, int]] = None,
+             screen_resolution: Optional[Tuple[int, int]] = None, resize_method=None):
+        """获取（缩放后的）模板灰度图"""
+        if resolution and screen_resolution and tuple(resolution) != tuple(screen_resolution):
+            res_key = (tuple(resolution), tuple(screen_resolution))
+            source = self.resized(path, resolution, screen_resolution, resize_method)
+        else:
+            res_key = (_ORIGINAL, _ORIGINAL)
+            source = self.image(path)
+        key = (os.path.abspath(path), self._mtime(path)) + res_key + ('gray',)
+        image = self._get(key)
+        if image is None:
+            image = self._put(key, cv2.cvtColor(source, cv2.COLOR_BGR2GRAY) if source.ndim == 3 else source.copy())
+        return image
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """获取进程内共享的模板注册表"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateRegistry()
+        return _registry
+
+
+def _cached_imread(self):
+    return get_template_registry().image(self.filepath)
+
+
+def _cached_resize_image(self, image, screen, resize_method):
+    if not self.resolution or resize_method is None:
+        return image
+    screen_resolution = aircv.get_resolution(screen)
+    if tuple(self.resolution) == tuple(screen_resolution):
+        return image
+    return get_template_registry().resized(self.filepath, self.resolution, screen_resolution, resize_method)
+
+
+_installed = False
+
+
+def install() -> None:
+    """替换Airtest模板的读图与缩放方法，使全部Template匹配共用注册表（可重复调用）"""
+    global _installed
+    if _installed:
+        return
+    Template._imread = _cached_imread
+    Template._resize_image = _cached_resize_image
+    _installed = True
+    logger.info("模板注册表已启用")
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def referenced_templates(module_path: str) -> List[Tuple[str, Optional[tuple]]]:
+    """
+    解析测试模块源码，找出其中的 Template("xxx.png", resolution=...) 调用
+
+    Args:
+        module_path: 测试模块路径
+
+    Returns:
+        List: [(图片绝对路径, 录制分辨率或None)]，只包含实际存在的图片
+    """
+    with open(module_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=module_path)
+
+    base_dir = os.path.dirname(os.path.abspath(module_path))
+    found = []
+    seen = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not node.args:
+            continue
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else getattr(func, 'attr', None)
+        if name != 'Template':
+            continue
+        filename = _literal(node.args[0])
+        if not isinstance(filename, str):
+            continue
+        resolution = None
+        for keyword in node.keywords:
+            if keyword.arg == 'resolution':
+                resolution = _literal(keyword.value)
+        path = os.path.normpath(os.path.join(base_dir, filename))
+        if (path, resolution) in seen or not os.path.isfile(path):
+            continue
+        seen.add((path, resolution))
+        found.append((path, tuple(resolution) if resolution else None))
+    return found
+
+
+def warm_up(module_path: str, screen_resolution: Optional[Tuple[int, int]] = None) -> int:
+    """
+    预加载测试模块引用的全部模板
+
+    Args:
+        module_path: 测试模块路径
+        screen_resolution: 当前设备屏幕分辨率 (宽, 高)，提供时同时生成缩放后的变体
+
+    Returns:
+        int: 预加载的模板数量
+    """
+    registry = get_template_registry()
+    count = 0
+    for path, resolution in referenced_templates(module_path):
+        try:
+            if resolution and screen_resolution:
+                registry.resized(path, resolution, screen_resolution)
+            else:
+                registry.image(path)
+            count += 1
+        except Exception as e:
+            logger.error(f"预加载模板失败 {path}: {str(e)}")
+    logger.info(f"预加载模板 {count} 个: {os.path.basename(module_path)}，缓存状态 {registry.stats()}")
+    return count
@@ -8,6 +8,7 @@ import pytest
 import os
 from config import ALLURE_CONFIG
 import sys
+import shutil
 import argparse
 from utils.logger import setup_logger
 
@@ -22,15 +23,36 @@ def parse_args():
         '--device', 
         type=str, 
         choices=['ios', 'android', 'windows'], 
-        default='ios',
-        help='指定测试设备类型: ios, android, windows (默认: ios)'
+        default=None,
+        help='指定测试设备类型: ios, android, windows (默认: ios，指定 --devices 时为 android)'
+    )
+    parser.add_argument(
+        '--devices',
+        type=str,
+        default=None,
+        help='多设备并行执行(仅Android): all 表示全部已连接设备，或以逗号分隔的设备序列号'
     )
     return parser.parse_args()
 
+
+def resolve_devices(devices_arg):
+    """解析 --devices 参数为设备序列号列表"""
+    from utils.device_manager import DeviceManager
+
+    connected = DeviceManager.get_android_devices()
+    if devices_arg.lower() == 'all':
+        return connected
+    requested = [d.strip() for d in devices_arg.split(',') if d.strip()]
+    missing = [d for d in requested if d not in connected]
+    if missing:
+        logger.warning(f"以下设备未连接，已忽略: {missing}")
+    return [d for d in requested if d in connected]
+
 if __name__ == '__main__':
     # 解析命令行参数
     args = parse_args()
-    device_type = args.device.upper()
+    # 多设备并行目前只支持Android，指定 --devices 时默认即为Android
+    device_type = (args.device or ('android' if args.devices else 'ios')).upper()
     logger.info(f"选择的设备类型: {device_type}")
     
     # 获取统一的时间戳
@@ -51,12 +73,28 @@ if __name__ == '__main__':
     allure_result = ALLURE_CONFIG['RESULT_DIR']
 
     # 运行测试并生成报告
-    pytest.main([
-        '-v',
-        '--capture=no',  # 允许输出到终端
-        '--log-cli-level=INFO',  # 设置命令行日志级别
-        '--alluredir', allure_result,
-        '--clean-alluredir'
-    ])
+    if args.devices:
+        if device_type != 'ANDROID':
+            logger.error("多设备并行执行目前仅支持Android")
+            sys.exit(1)
+        from utils.shard_runner import run_sharded
+
+        devices = resolve_devices(args.devices)
+        logger.info(f"多设备并行执行，设备: {devices}")
+        # 各工作进程追加写入同一个结果目录，只在启动前清理一次
+        shutil.rmtree(allure_result, ignore_errors=True)
+        exit_code = run_sharded(devices, device_type, allure_result, timestamp)
+    else:
+        exit_code = pytest.main([
+            '-v',
+            '--capture=no',  # 允许输出到终端
+            '--log-cli-level=INFO',  # 设置命令行日志级别
+            '--alluredir', allure_result,
+            '--clean-alluredir'
+        ])
+    exit_code = int(exit_code)
+    if exit_code != 0:
+        logger.error(f"测试执行失败，退出码: {exit_code}")
     os.system("allure generate -c -o %s " % (allure_report))
     os.system('allure serve %s' % allure_result)
+    sys.exit(exit_code)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+core.adb_shell 单元测试
+用本地 sh 进程模拟设备端的 adb shell，不需要连接设备
+"""
+
+import shutil
+import sys
+import time
+
+import pytest
+
+from core.adb_shell import AdbShellSession, ShellCommandError, ShellSessionError, ShellSessionPool
+
+pytestmark = pytest.mark.skipif(shutil.which('sh') is None, reason="需要本地sh")
+
+SH = ['sh']
+
+
+@pytest.fixture
+def session():
+    session = AdbShellSession(SH, timeout=10)
+    yield session
+    session.close()
+
+
+def test_execute_returns_exit_code_and_output(session):
+    # 与Airtest的device.shell一致，保留命令自身输出的换行
+    assert session.execute("echo hello") == (0, "hello\n")
+    assert session.execute("echo out; exit_code() { return 3; }; exit_code") == (3, "out\n")
+
+
+def test_commands_share_one_process(session):
+    first = session.shell("echo $$")
+    assert session.shell("echo $$") == first
+
+
+def test_output_without_trailing_newline(session):
+    assert session.execute("printf 'no newline'") == (0, "no newline")
+    # 只去掉为使哨兵独占一行额外输出的换行
+    assert session.execute("printf 'a\\n\\n'") == (0, "a\n\n")
+
+
+def test_command_does_not_consume_following_input(session):
+    assert session.execute("cat") == (0, "")
+    assert session.shell("echo still-in-sync") == "still-in-sync\n"
+
+
+def test_shell_raises_on_nonzero_exit(session):
+    with pytest.raises(ShellCommandError) as info:
+        session.shell("echo failed; false")
+    assert info.value.returncode == 1
+    assert info.value.output == "failed\n"
+
+
+def test_spawn_failure_is_not_marked_as_sent():
+    session = AdbShellSession(['/nonexistent/adb', 'shell'])
+    with pytest.raises(ShellSessionError) as info:
+        session.execute("echo hello")
+    assert info.value.command_sent is False
+
+
+def test_timeout_is_marked_as_sent_and_session_restarts(session):
+    with pytest.raises(ShellSessionError) as info:
+        session.execute("sleep 5", timeout=0.3)
+    assert info.value.command_sent is True
+    assert not session.alive
+    # 超时的会话已丢弃，下一条命令在新进程中执行
+    assert session.execute("echo again") == (0, "again\n")
+
+
+def test_unexpected_exit_is_marked_as_sent(session):
+    with pytest.raises(ShellSessionError) as info:
+        session.execute("exit 0")
+    assert info.value.command_sent is True
+
+
+def test_pool_reuses_released_session():
+    pool = ShellSessionPool(max_sessions=1, timeout=10)
+    try:
+        first = pool.acquire('dev', SH)
+        pool.release('dev', first)
+        assert pool.acquire('dev', SH) is first
+    finally:
+        pool.close()
+
+
+def test_pool_acquire_timeout():
+    pool = ShellSessionPool(max_sessions=1, timeout=10, acquire_timeout=0.2)
+    try:
+        busy = pool.acquire('dev', SH)
+        started = time.monotonic()
+        with pytest.raises(ShellSessionError) as info:
+            pool.acquire('dev', SH)
+        assert time.monotonic() - started >= 0.2
+        assert info.value.command_sent is False
+        pool.release('dev', busy)
+        assert pool.shell('dev', SH, "echo ok") == "ok\n"
+    finally:
+        pool.close()
+
+
+class _FakeDevice:
+    """记录回退调用的假设备"""
+    serialno = 'fake-serial'
+
+    def __init__(self, adb_path):
+        self.adb = type('Adb', (), {'adb_path': adb_path})()
+        self.calls = []
+
+    def shell(self, cmd):
+        self.calls.append(cmd)
+        return "fallback"
+
+
+def test_android_shell_falls_back_when_session_unavailable(monkeypatch):
+    pytest.importorskip('airtest')
+    from airtest.core.helper import G
+    from core import adb_shell, andriod
+
+    # adb不存在，会话无法启动，命令还没有发出
+    device = _FakeDevice('/nonexistent/adb')
+    monkeypatch.setattr(G, 'DEVICE', device)
+    monkeypatch.setattr(adb_shell, '_pool', ShellSessionPool())
+    assert andriod._shell("echo hello") == "fallback"
+    assert device.calls == ["echo hello"]
+
+
+def test_android_shell_does_not_rerun_sent_command(monkeypatch):
+    pytest.importorskip('airtest')
+    from airtest.core.helper import G
+    from core import adb_shell, andriod
+
+    # `sh -s fake-serial shell` 从标准输入读取命令，充当设备端shell
+    device = _FakeDevice('sh')
+    pool = ShellSessionPool(timeout=0.3)
+    monkeypatch.setattr(G, 'DEVICE', device)
+    monkeypatch.setattr(adb_shell, '_pool', pool)
+    try:
+        assert andriod._shell("echo $1") == "fake-serial\n"
+        with pytest.raises(ShellSessionError) as info:
+            andriod._shell("sleep 5")
+        assert info.value.command_sent is True
+        assert device.calls == []
+    finally:
+        pool.close()
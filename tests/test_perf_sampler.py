@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+core.perf_sampler 单元测试
+在 fixtures/perf_sampler 中录制的dumpsys输出上运行采样器，不需要连接设备
+
+录制的三次采样：
+    cpuinfo  应用主进程+子进程 12% / 20% / 40%（同名前缀的其他包不计入）
+    meminfo  TOTAL PSS 100000 / 120000 / 110000 KB
+    gfxinfo  第一次5帧跨度100ms（两帧卡顿，另有一帧Flags非0），第二次新增5帧跨度50ms，第三次没有新帧
+    net_dev  相邻两次wlan0接收增加100KB、200KB，发送各增加50KB（lo不计入）
+"""
+
+import os
+import time
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from core import perf_sampler
+from core.perf_sampler import PerfSampler, RecordedShell, RecordingShell
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'perf_sampler')
+PACKAGE = 'com.example.app'
+
+
+@pytest.fixture
+def sampler(monkeypatch):
+    # 采样时间戳固定间隔1秒，网络速率不受实际耗时影响
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(perf_sampler, 'time', types.SimpleNamespace(time=lambda: float(next(clock))))
+    sampler = PerfSampler(PACKAGE, shell=RecordedShell(FIXTURE_DIR))
+    for _ in range(3):
+        sampler.sample_once()
+    return sampler
+
+
+def test_series_values(sampler):
+    series = sampler.series.to_numpy()
+    assert series['cpu_percent'].tolist() == [12.0, 20.0, 40.0]
+    assert series['memory_kb'].tolist() == [100000.0, 120000.0, 110000.0]
+    assert series['fps'].tolist() == pytest.approx([40.0, 80.0, 0.0])
+    assert series['jank_percent'].tolist() == pytest.approx([40.0, 0.0, 0.0])
+    assert np.isnan(series['rx_kbps'][0])
+    assert series['rx_kbps'][1:].tolist() == pytest.approx([100.0, 200.0])
+    assert series['tx_kbps'][1:].tolist() == pytest.approx([50.0, 50.0])
+
+
+def test_no_new_frames_gives_zero_fps(sampler):
+    # 第三次的framestats与第二次相同，没有新产生的帧
+    assert sampler.series.column('fps')[2] == 0.0
+    assert sampler.series.column('jank_percent')[2] == 0.0
+
+
+def test_summary_percentiles(sampler):
+    summary = sampler.summary()
+    assert summary['cpu_percent'] == {'p50': 20.0, 'p95': 38.0, 'p99': 39.6, 'mean': 24.0, 'max': 40.0, 'count': 3}
+    assert summary['memory_kb'] == {
+        'p50': 110000.0, 'p95': 119000.0, 'p99': 119800.0, 'mean': 110000.0, 'max': 120000.0, 'count': 3
+    }
+    assert summary['fps'] == {'p50': 40.0, 'p95': 76.0, 'p99': 79.2, 'mean': 40.0, 'max': 80.0, 'count': 3}
+    # 第一次采样没有上一次的网络数据，不计入统计
+    assert summary['rx_kbps']['count'] == 2
+    assert summary['rx_kbps']['p50'] == 150.0
+
+
+def test_summary_without_samples():
+    sampler = PerfSampler(PACKAGE, shell=RecordedShell(FIXTURE_DIR))
+    assert sampler.summary()['fps'] == {'count': 0}
+
+
+def test_recorded_shell_cycles_outputs():
+    shell = RecordedShell(FIXTURE_DIR)
+    outputs = [shell(f'dumpsys meminfo {PACKAGE}') for _ in range(4)]
+    assert outputs[0] != outputs[1]
+    assert outputs[3] == outputs[0]
+    assert shell('dumpsys unknown') == ''
+
+
+def test_recording_shell_replays_identically(tmp_path):
+    source = RecordedShell(FIXTURE_DIR)
+    recorder = RecordingShell(source, str(tmp_path))
+    for _ in range(3):
+        for kind, template in perf_sampler.SAMPLE_COMMANDS.items():
+            recorder(template.format(package=PACKAGE))
+    assert sorted(os.listdir(tmp_path)) == sorted(os.listdir(FIXTURE_DIR))
+
+    replay = RecordedShell(str(tmp_path))
+    original = RecordedShell(FIXTURE_DIR)
+    cmd = perf_sampler.SAMPLE_COMMANDS['gfxinfo'].format(package=PACKAGE)
+    assert [replay(cmd) for _ in range(3)] == [original(cmd) for _ in range(3)]
+
+
+def test_background_sampling_stops_cleanly():
+    sampler = PerfSampler(PACKAGE, interval=0.01, shell=RecordedShell(FIXTURE_DIR))
+    with sampler:
+        deadline = time.monotonic() + 5
+        while len(sampler.series) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    assert len(sampler.series) >= 3
+    count = len(sampler.series)
+    assert sampler.errors == 0
+    assert len(sampler.series) == count
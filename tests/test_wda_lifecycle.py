@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+core.ios.WDALifecycleManager 单元测试
+用本地 http.server 模拟WDA的 /status 接口，用Python脚本代替xcodebuild，不需要连接设备
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('wda')
+pytest.importorskip('requests')
+
+from core.ios import WDALifecycleManager, backoff_delays
+
+
+class FakeWDA:
+    """/status 在 ready 为True时返回200，否则返回503"""
+
+    def __init__(self, ready: bool = False):
+        self.ready = ready
+        self.status_requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake.status_requests += 1
+                code = 200 if self.path == '/status' and fake.ready else 503
+                body = json.dumps({'value': {'ready': fake.ready}, 'sessionId': None}).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def ready_after(self, delay: float) -> None:
+        timer = threading.Timer(delay, setattr, (self, 'ready', True))
+        timer.daemon = True
+        timer.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_wda():
+    fake = FakeWDA()
+    yield fake
+    fake.close()
+
+
+def _script(code: str):
+    """用Python脚本模拟xcodebuild的启动命令"""
+    return [sys.executable, '-u', '-c', code]
+
+
+def _ensure_running(manager: WDALifecycleManager, timeout: float):
+    started = time.monotonic()
+    try:
+        ready = asyncio.run(manager.ensure_running(timeout))
+    finally:
+        if manager._process is not None and manager._process.poll() is None:
+            manager._process.kill()
+            manager._process.wait()
+    return ready, time.monotonic() - started
+
+
+def test_healthy_wda_is_reused_without_launching(fake_wda):
+    fake_wda.ready = True
+    # 启动命令一旦执行就会失败，复用时不应执行
+    manager = WDALifecycleManager(base_url=fake_wda.url, launch_cmd=_script("raise SystemExit(3)"))
+    ready, _ = _ensure_running(manager, timeout=5)
+    assert ready
+    assert manager._process is None
+    assert fake_wda.status_requests == 1
+
+
+def test_poller_detects_ready_without_server_url_line(fake_wda):
+    fake_wda.ready_after(0.3)
+    manager = WDALifecycleManager(base_url=fake_wda.url, launch_cmd=_script("import time; time.sleep(30)"))
+    ready, elapsed = _ensure_running(manager, timeout=10)
+    assert ready
+    assert manager.server_url is None
+    assert elapsed < 5
+
+
+def test_timeout_with_backoff(fake_wda):
+    manager = WDALifecycleManager(base_url=fake_wda.url, launch_cmd=_script("import time; time.sleep(30)"))
+    ready, elapsed = _ensure_running(manager, timeout=1.0)
+    assert not ready
+    assert 1.0 <= elapsed < 3.0
+    # 退避轮询：1秒内的请求次数远少于固定0.1秒间隔的10次
+    assert 2 <= fake_wda.status_requests <= 8
+    # 超时后终止启动进程
+    assert manager._process.poll() is not None
+
+
+def test_launch_process_exit_fails_fast(fake_wda):
+    manager = WDALifecycleManager(
+        base_url=fake_wda.url,
+        launch_cmd=_script("print('** TEST FAILED **'); raise SystemExit(65)")
+    )
+    ready, elapsed = _ensure_running(manager, timeout=10)
+    assert not ready
+    assert manager.server_url is None
+    assert elapsed < 5
+
+
+def test_server_url_line_wins_the_race(fake_wda):
+    # 启动进程先输出监听地址，/status 稍后才就绪（端口转发建立需要时间）
+    fake_wda.ready_after(0.8)
+    code = (
+        "import sys, time\n"
+        "print('Test Case started.')\n"
+        "print('ServerURLHere->http://192.168.1.2:8100<-ServerURLHere')\n"
+        "sys.stdout.flush()\n"
+        "for i in range(3000):\n"
+        "    print('t =  %d.00s log line' % i)\n"
+        "    time.sleep(0.01)\n"
+    )
+    manager = WDALifecycleManager(base_url=fake_wda.url, launch_cmd=_script(code))
+    ready, elapsed = _ensure_running(manager, timeout=10)
+    assert ready
+    assert manager.server_url == 'http://192.168.1.2:8100'
+    assert 0.8 <= elapsed < 5
+
+
+def test_server_url_line_then_status_timeout(fake_wda):
+    code = "print('ServerURLHere->http://192.168.1.2:8100<-ServerURLHere'); import time; time.sleep(30)"
+    manager = WDALifecycleManager(base_url=fake_wda.url, launch_cmd=_script(code))
+    ready, elapsed = _ensure_running(manager, timeout=1.0)
+    assert not ready
+    assert manager.server_url == 'http://192.168.1.2:8100'
+    assert elapsed < 3.0
+
+
+def test_backoff_delays_are_bounded_and_jittered():
+    delays = backoff_delays(initial=0.1, maximum=1.0)
+    expected = [0.1, 0.2, 0.4, 0.8, 1.0, 1.0]
+    for upper in expected:
+        delay = next(delays)
+        assert upper / 2 <= delay <= upper
@@ -1,21 +1,106 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from airtest.core.api import *
-from airtest.core.android.android import Android
-from airtest.core.ios.ios import IOS
-from airtest.core.win.win import Windows
-from config import DEVICE_CONFIG
+from airtest.core.api import auto_setup, connect_device, device
+from airtest.core.helper import G, set_logdir
+from core.backends import is_platform, load_backend
+from config import AIRTEST_CONFIG, DEVICE_CONFIG
 from utils.logger import setup_logger
 from airtest.cli.parser import cli_setup
 import os
 import subprocess
 import re
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlencode
 
 
 logger = setup_logger(__name__)
 
+
+class DevicePool:
+    """
+    会话级设备连接池，按 (平台, 设备URI) 缓存已连接的设备
+
+    各测试模块复用同一个连接，复用前做一次轻量健康检查（Android执行 echo，iOS请求WDA /status），
+    检查失败时才重新连接
+    """
+
+    def __init__(self):
+        self._devices: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.reuses = 0
+
+    @staticmethod
+    def is_healthy(platform: str, dev) -> bool:
+        """检查设备连接是否可用"""
+        try:
+            if is_platform(dev, 'android'):
+                return dev.shell("echo ok").strip() == "ok"
+            if is_platform(dev, 'ios'):
+                from core.ios import get_wda_connection
+                addr = getattr(dev, 'addr', None)
+                return addr is None or get_wda_connection(addr).status(timeout=2) is not None
+            return True
+        except Exception as e:
+            logger.warning(f"设备健康检查失败({platform}): {str(e)}")
+            return False
+
+    @staticmethod
+    def _forget(dev) -> None:
+        """从Airtest的设备列表中移除失效的设备，避免仍持有它的对象（如BaseTest）再把它设为当前设备"""
+        G.DEVICE_LIST[:] = [d for d in G.DEVICE_LIST if d is not dev]
+        if G.DEVICE is dev:
+            G.DEVICE = G.DEVICE_LIST[-1] if G.DEVICE_LIST else None
+
+    def acquire(self, platform: str, uri: str):
+        """
+        获取设备连接并设为当前设备，已有可用连接时直接复用
+
+        Args:
+            platform: 平台类型
+            uri: 设备URI
+
+        Returns:
+            设备对象
+        """
+        key = (platform.upper(), uri)
+        with self._lock:
+            dev = self._devices.get(key)
+            if dev is not None:
+                if self.is_healthy(platform, dev):
+                    G.add_device(dev)
+                    self.reuses += 1
+                    logger.info(f"复用设备连接: {uri}")
+                    return dev
+                logger.warning(f"设备连接不可用，重新连接: {uri}")
+                self._devices.pop(key, None)
+                self._forget(dev)
+                try:
+                    dev.disconnect()
+                except Exception as e:
+                    logger.debug(f"断开失效连接时出错: {str(e)}")
+
+            dev = connect_device(uri)
+            self._devices[key] = dev
+            self.connects += 1
+            return dev
+
+    def close_all(self) -> None:
+        """断开全部连接（会话结束时调用）"""
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+        for dev in devices:
+            DeviceManager.disconnect_device(dev)
+        if devices:
+            logger.info(f"设备连接池已关闭: 连接 {self.connects} 次，复用 {self.reuses} 次")
+
+
+_device_pool = DevicePool()
+
+
 class DeviceManager:
     @staticmethod
     def init_device(test_file, log_dir, platform="iOS"):
@@ -35,24 +120,101 @@ class DeviceManager:
             os.makedirs(script_log_dir, exist_ok=True)
             
             # 根据平台选择设备URI
-            platform_upper = platform.upper()
-            if platform_upper in DEVICE_CONFIG:
-                device_uri = DEVICE_CONFIG[platform_upper]['uri']
-            else:
-                raise ValueError(f"不支持的平台: {platform}")
+            device_uri = DeviceManager.get_device_uri(platform)
             
             if not cli_setup():
-                auto_setup(
-                    test_file,
-                    logdir=script_log_dir,
-                    devices=[device_uri]
-                )
+                if AIRTEST_CONFIG.get('REUSE_DEVICE', True):
+                    # 只切换日志目录和图片查找目录，设备连接在会话内复用
+                    DeviceManager.set_log_context(test_file, script_log_dir)
+                    _device_pool.acquire(platform, device_uri)
+                else:
+                    auto_setup(
+                        test_file,
+                        logdir=script_log_dir,
+                        devices=[device_uri]
+                    )
             logger.info(f"设备初始化成功，平台: {platform}，日志目录: {script_log_dir}")
             
         except Exception as e:
             logger.error(f"设备初始化失败: {str(e)}")
             raise
     
+    @staticmethod
+    def set_log_context(test_file: str, script_log_dir: str) -> None:
+        """切换Airtest的日志目录和图片查找目录（auto_setup中与设备连接无关的部分）
+
+        Args:
+            test_file: 测试文件路径
+            script_log_dir: 本模块的日志目录
+        """
+        basedir = os.path.dirname(os.path.abspath(test_file))
+        # 当前模块目录放在最前，避免不同模块中同名的 ./images/xxx.png 解析到其他模块
+        if basedir in G.BASEDIR:
+            G.BASEDIR.remove(basedir)
+        G.BASEDIR.insert(0, basedir)
+        set_logdir(script_log_dir)
+
+    @staticmethod
+    def release_device() -> None:
+        """模块结束时释放设备：复用连接时保持连接，否则断开"""
+        if AIRTEST_CONFIG.get('REUSE_DEVICE', True):
+            return
+        DeviceManager.disconnect()
+
+    @staticmethod
+    def close_pool() -> None:
+        """断开连接池中的全部设备"""
+        _device_pool.close_all()
+
+    @staticmethod
+    def get_device_uri(platform: str) -> str:
+        """根据平台生成设备URI
+
+        多设备分片执行时由工作进程通过环境变量指定设备，否则使用配置中指定的设备
+        (Android: specific_device，iOS: udid)；iOS设备的本地端口由iproxy守护分配；
+        配置中的 options 以查询参数形式附加到URI
+
+        Args:
+            platform: 平台类型 (iOS/Android/Windows)
+
+        Returns:
+            str: Airtest设备URI
+        """
+        platform_upper = platform.upper()
+        if platform_upper not in DEVICE_CONFIG:
+            raise ValueError(f"不支持的平台: {platform}")
+
+        device_conf = DEVICE_CONFIG[platform_upper]
+        uri = device_conf['uri']
+        if platform_upper == 'ANDROID':
+            serial = os.environ.get('JY_DEVICE_SERIAL') or device_conf.get('specific_device')
+            if serial:
+                uri = f"Android:///{serial}"
+        elif platform_upper == 'IOS':
+            udid = os.environ.get('JY_DEVICE_SERIAL') or device_conf.get('udid')
+            if udid:
+                from core.iproxy_supervisor import ios_device_uri
+                uri = ios_device_uri(udid)
+        return DeviceManager.apply_uri_options(uri, device_conf.get('options'))
+
+    @staticmethod
+    def apply_uri_options(uri: str, options: Optional[Dict[str, str]]) -> str:
+        """把连接参数附加到设备URI，如 Android:///serial?cap_method=JAVACAP&touch_method=ADBTOUCH
+
+        Airtest会把URI中的查询参数作为设备构造参数（cap_method/touch_method/ori_method/ime_method等）
+
+        Args:
+            uri: 设备URI
+            options: 连接参数，为空时原样返回
+
+        Returns:
+            str: 设备URI
+        """
+        if not options:
+            return uri
+        separator = '&' if '?' in uri else '?'
+        return f"{uri}{separator}{urlencode(options)}"
+
     @staticmethod
     def get_android_devices() -> List[str]:
         """获取已连接的Android设备列表
@@ -108,7 +270,7 @@ class DeviceManager:
                 return False
             
             # 使用Airtest连接设备
-            android_device = Android(serialno=target_device)
+            android_device = load_backend('android')(serialno=target_device, **DEVICE_CONFIG['ANDROID'].get('options', {}))
             connect_device(android_device)
             
             logger.info(f"成功连接Android设备: {target_device}")
@@ -135,16 +297,18 @@ class DeviceManager:
             
             info = {"platform": platform}
             
-            if isinstance(current_device, Android):
-                # Android设备信息
+            if is_platform(current_device, 'android'):
+                # Android设备信息（从批量采集的属性快照中读取）
+                from core.andriod import get_device_snapshot
+                snapshot = get_device_snapshot()
                 info.update({
-                    "device_id": current_device.serialno,
-                    "android_version": current_device.shell('getprop ro.build.version.release').strip(),
-                    "api_level": current_device.shell('getprop ro.build.version.sdk').strip(),
-                    "brand": current_device.shell('getprop ro.product.brand').strip(),
-                    "model": current_device.shell('getprop ro.product.model').strip()
+                    "device_id": snapshot.serialno,
+                    "android_version": snapshot.android_version,
+                    "api_level": snapshot.api_level,
+                    "brand": snapshot.brand,
+                    "model": snapshot.model
                 })
-            elif isinstance(current_device, IOS):
+            elif is_platform(current_device, 'ios'):
                 # iOS设备信息
                 info.update({
                     "device_id": getattr(current_device, 'uuid', 'unknown'),
@@ -205,13 +369,24 @@ class DeviceManager:
             # 获取当前设备
             current_device = device()
             if current_device:
-                # 使用 airtest 的 device 实例方法断开连接
-                current_device.disconnect()
-                logger.info("设备已断开连接")
+                DeviceManager.disconnect_device(current_device)
             else:
                 logger.warning("没有找到已连接的设备")
         except Exception as e:
             logger.error(f"断开设备失败: {str(e)}")
+
+    @staticmethod
+    def disconnect_device(dev) -> None:
+        """断开指定设备，并关闭该设备上的常驻shell会话"""
+        try:
+            if is_platform(dev, 'android'):
+                from core.adb_shell import get_session_pool
+                get_session_pool().close(dev.serialno)
+            # 使用 airtest 的 device 实例方法断开连接
+            dev.disconnect()
+            logger.info("设备已断开连接")
+        except Exception as e:
+            logger.error(f"断开设备失败: {str(e)}")
     
     @staticmethod
     def wait_for_device(timeout: int = 30) -> bool:
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+用例历史耗时存储与调度
+每次运行把每个用例的耗时按 (nodeid, 平台) 记录到本地SQLite，
+多设备执行时据此估算模块耗时，按最长处理时间优先(LPT)分配到各设备
+"""
+
+import heapq
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from config import SCHEDULER_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_durations (
+    run_id      TEXT NOT NULL,
+    nodeid      TEXT NOT NULL,
+    platform    TEXT NOT NULL,
+    duration    REAL NOT NULL,
+    outcome     TEXT,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (run_id, nodeid, platform)
+);
+CREATE INDEX IF NOT EXISTS idx_test_durations_lookup
+    ON test_durations (platform, nodeid, recorded_at);
+"""
+
+
+class DurationStore:
+    """用例耗时历史，run_id 使用 runner.py 设置的 TEST_TIMESTAMP"""
+
+    def __init__(self, path: str = None):
+        self.path = path or SCHEDULER_CONFIG['DURATION_DB']
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 多设备并行时多个工作进程同时写入，等待锁而不是直接失败
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, run_id: str, nodeid: str, platform: str, duration: float, outcome: str = None) -> None:
+        """记录一个用例的耗时（同一次运行中重复记录时覆盖）"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO test_durations VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, nodeid, platform.upper(), duration, outcome, time.time())
+            )
+
+    def test_estimates(self, platform: str, window: int = None) -> Dict[str, float]:
+        """
+        按平台获取每个用例的预估耗时（最近window次运行的中位数）
+
+        Returns:
+            Dict: {nodeid: 预估秒数}
+        """
+        window = window or SCHEDULER_CONFIG['HISTORY_WINDOW']
+        history: Dict[str, List[float]] = {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT nodeid, duration FROM test_durations WHERE platform = ? ORDER BY recorded_at DESC",
+                (platform.upper(),)
+            )
+            for nodeid, duration in rows:
+                durations = history.setdefault(nodeid, [])
+                if len(durations) < window:
+                    durations.append(duration)
+        return {nodeid: statistics.median(values) for nodeid, values in history.items()}
+
+    def module_estimates(self, platform: str, modules: List[str]) -> Dict[str, float]:
+        """
+        估算每个模块的耗时，为模块内各用例预估值之和
+
+        Args:
+            platform: 平台类型
+            modules: 模块路径（相对项目根目录，使用 / 分隔，与nodeid前缀一致）
+
+        Returns:
+            Dict: {模块路径: 预估秒数}，没有历史数据的模块使用已知模块的平均值
+        """
+        totals: Dict[str, float] = {}
+        for nodeid, estimate in self.test_estimates(platform).items():
+            module = nodeid.split('::', 1)[0]
+            totals[module] = totals.get(module, 0.0) + estimate
+
+        known = [totals[m] for m in modules if m in totals]
+        default = statistics.mean(known) if known else SCHEDULER_CONFIG['DEFAULT_DURATION']
+        return {module: totals.get(module, default) for module in modules}
+
+
+def lpt_schedule(estimates: Dict[str, float], workers: int) -> Tuple[List[List[str]], float]:
+    """
+    最长处理时间优先(LPT)装箱：按耗时从大到小，依次放到当前负载最小的设备
+
+    Args:
+        estimates: {模块: 预估秒数}
+        workers: 设备数量
+
+    Returns:
+        Tuple: (每台设备分到的模块列表, 预测的总耗时makespan)
+    """
+    bins: List[List[str]] = [[] for _ in range(max(1, workers))]
+    heap = [(0.0, index) for index in range(len(bins))]
+    for module in sorted(estimates, key=estimates.get, reverse=True):
+        load, index = heapq.heappop(heap)
+        bins[index].append(module)
+        heapq.heappush(heap, (load + estimates[module], index))
+    makespan = max(load for load, _ in heap) if heap else 0.0
+    return bins, makespan
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+启动导入耗时基准
+用 `python -X importtime` 统计导入 core.base 以及收集 cases 目录用例的耗时，列出最慢的模块，
+可以保存为基线并与之后的结果对比
+
+用法:
+    python -m utils.import_bench                        # 导入 core.base + 收集 cases
+    python -m utils.import_bench --save import_baseline.json
+    python -m utils.import_bench --compare import_baseline.json
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config import BASE_DIR
+
+# import time:       self [us] |  cumulative | imported package
+_IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+TARGETS = {
+    'core.base': [sys.executable, '-X', 'importtime', '-c', 'import core.base'],
+    'collect': [sys.executable, '-X', 'importtime', '-m', 'pytest', '--collect-only', '-q', '-p', 'no:cacheprovider',
+                'cases'],
+}
+# 平台后端相关的包，用于确认只跑单一平台时没有被导入
+WATCHED_PACKAGES = ('wda', 'pywinauto', 'airtest.core.ios', 'airtest.core.win', 'poco.drivers')
+
+
+@dataclass
+class ImportProfile:
+    """一次导入耗时统计"""
+    target: str
+    wall_seconds: float
+    import_seconds: float  # 顶层导入的累计耗时之和
+    modules: int
+    slowest: List[Tuple[str, float]] = field(default_factory=list)  # (模块, 累计耗时ms)
+    watched: List[str] = field(default_factory=list)  # 被导入的平台后端包
+    airtest_modules: int = 0  # 导入的airtest模块数，按平台忽略全部用例时收集阶段应为0
+    returncode: int = 0
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int, int]]:
+    """
+    解析 -X importtime 输出
+
+    Returns:
+        Dict: {模块: (自身耗时us, 累计耗时us, 缩进层级)}，同一模块只保留第一次
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_PATTERN.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules.setdefault(name, (int(own), int(cumulative), len(indent) // 2))
+    return modules
+
+
+def profile(target: str, top: int = 15) -> ImportProfile:
+    """运行一次目标并统计导入耗时"""
+    started = time.perf_counter()
+    proc = subprocess.run(TARGETS[target], cwd=BASE_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    modules = parse_importtime(proc.stderr)
+    top_level = sum(cumulative for _, cumulative, level in modules.values() if level == 0)
+    slowest = sorted(((name, cumulative / 1000) for name, (_, cumulative, _) in modules.items()),
+                     key=lambda item: item[1], reverse=True)[:top]
+    watched = sorted(name for name in modules if name.startswith(WATCHED_PACKAGES))
+    airtest_modules = sum(1 for name in modules if name == 'airtest' or name.startswith('airtest.'))
+    returncode = proc.returncode
+    if target == 'collect' and returncode == 5:
+        # 按平台忽略了全部用例时pytest返回5（没有收集到用例），不算失败
+        returncode = 0
+    if returncode:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')]
+        print(f"{target} 退出码 {proc.returncode}: {' '.join(errors[-3:])}")
+    return ImportProfile(target, round(wall, 3), round(top_level / 1e6, 3), len(modules),
+                         [(name, round(ms, 1)) for name, ms in slowest], watched, airtest_modules, returncode)
+
+
+def _print_profile(result: ImportProfile, baseline: Optional[dict] = None) -> None:
+    line = f"[{result.target}] 总耗时 {result.wall_seconds:.2f}s，导入 {result.import_seconds:.2f}s，{result.modules} 个模块"
+    if baseline:
+        line += (f"（基线 {baseline['wall_seconds']:.2f}s / {baseline['import_seconds']:.2f}s，"
+                 f"变化 {result.wall_seconds - baseline['wall_seconds']:+.2f}s）")
+    print(line)
+    for name, ms in result.slowest:
+        print(f"    {ms:>9.1f} ms  {name}")
+    if result.watched:
+        print(f"    已导入的平台后端包: {', '.join(result.watched[:10])}")
+    print(f"    已导入airtest模块 {result.airtest_modules} 个" if result.airtest_modules else "    未导入airtest")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="启动导入耗时基准（-X importtime）")
+    parser.add_argument('targets', nargs='*', help=f"统计对象，可选 {', '.join(TARGETS)}，默认全部")
+    parser.add_argument('--top', type=int, default=15, help='列出最慢的模块数')
+    parser.add_argument('--save', help='把结果保存为基线JSON')
+    parser.add_argument('--compare', help='与基线JSON对比')
+    args = parser.parse_args(argv)
+    unknown = [t for t in args.targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"未知的统计对象: {', '.join(unknown)}")
+
+    baseline = {}
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = [profile(target, args.top) for target in args.targets or TARGETS]
+    for result in results:
+        _print_profile(result, baseline.get(result.target))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({r.target: asdict(r) for r in results}, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.save}")
+    return 1 if any(r.returncode for r in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Airtest日志截图去重
+Airtest每个操作前后都会保存一张全分辨率截图，等待期间的截图大多完全相同。
+本模块默认把解码后像素完全相同的截图合并为一份按内容命名的文件，改写 log.txt 中的引用；
+可选按感知哈希(dHash)合并近似截图（会丢失细小差别，默认关闭），可选把截图缩小到指定宽度，并统计节省的字节数
+
+用法:
+    python -m utils.log_compactor cases/ios/feature2/log/test_hello
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import AIRTEST_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# 按内容命名的截图前缀，再次处理时跳过
+CONTENT_PREFIX = 'cas_'
+LOG_FILE = 'log.txt'
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """
+    差值哈希：缩成 (hash_size+1) x hash_size 的灰度图，比较相邻像素得到64位指纹
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def _read_image(path: str):
+    # 与 aircv.imread 一样使用 imdecode，兼容中文路径
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _rewrite_refs(value, mapping: Dict[str, str]):
+    """递归替换日志中引用截图文件名的字符串"""
+    if isinstance(value, str):
+        if value in mapping:
+            return mapping[value]
+        base = os.path.basename(value)
+        if base in mapping and base != value:
+            return value[:len(value) - len(base)] + mapping[base]
+        return value
+    if isinstance(value, dict):
+        return {k: _rewrite_refs(v, mapping) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rewrite_refs(v, mapping) for v in value]
+    return value
+
+
+class LogCompactor:
+    """处理单个Airtest日志目录"""
+
+    def __init__(self, hash_distance: Optional[int] = None, max_width: Optional[int] = None,
+                 jpeg_quality: Optional[int] = None, perceptual: Optional[bool] = None):
+        """
+        Args:
+            hash_distance: 开启perceptual时，dHash汉明距离不超过该值视为同一画面
+            max_width: 截图最大宽度，超过时等比缩小，None表示不缩小
+            jpeg_quality: 缩小后重新编码JPEG的质量
+            perceptual: 是否合并近似（而非像素完全相同）的截图，默认取配置（关闭）
+        """
+        conf = AIRTEST_CONFIG.get('LOG_COMPACT', {})
+        self.perceptual = conf.get('perceptual', False) if perceptual is None else perceptual
+        self.hash_distance = conf.get('hash_distance', 2) if hash_distance is None else hash_distance
+        self.max_width = conf.get('max_width') if max_width is None else max_width
+        self.jpeg_quality = jpeg_quality or conf.get('jpeg_quality', 80)
+
+    def _encode(self, path: str) -> Tuple[bytes, str]:
+        """读取截图，需要时缩小，返回 (文件内容, 扩展名)"""
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not self.max_width:
+            return data, ext
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None or image.shape[1] <= self.max_width:
+            return data, ext
+        scale = self.max_width / float(image.shape[1])
+        image = cv2.resize(image, (self.max_width, max(1, int(image.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        return (buf.tobytes(), '.jpg') if ok else (data, ext)
+
+    def compact(self, log_dir: str) -> Dict[str, int]:
+        """
+        去重并改写日志引用
+
+        Args:
+            log_dir: Airtest日志目录（包含log.txt）
+
+        Returns:
+            Dict: images(处理前截图数)、unique(保留的截图数)、bytes_before、bytes_after、bytes_saved、seconds
+        """
+        started = time.time()
+        log_path = os.path.join(log_dir, LOG_FILE)
+        names = sorted(
+            name for name in os.listdir(log_dir)
+            if name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith(CONTENT_PREFIX)
+        ) if os.path.isdir(log_dir) else []
+        stats = {'images': len(names), 'unique': 0, 'bytes_before': 0, 'bytes_after': 0, 'bytes_saved': 0}
+        if not names or not os.path.exists(log_path):
+            stats['seconds'] = round(time.time() - started, 3)
+            return stats
+
+        # 文件名为时间戳，按时间顺序处理，相同画面通常相邻
+        kept: List[Tuple[int, Tuple[int, int], str]] = []  # (dHash, 尺寸, 内容文件名)，perceptual模式使用
+        exact: Dict[str, str] = {}  # 解码后像素的sha1 -> 内容文件名
+        mapping: Dict[str, str] = {}
+        for name in names:
+            path = os.path.join(log_dir, name)
+            stats['bytes_before'] += os.path.getsize(path)
+            image = _read_image(path)
+            if image is None:
+                continue
+            # 比较解码后的像素，JPEG文件字节不同但画面相同的截图也能合并
+            pixels = hashlib.sha1(str(image.shape).encode('ascii') + image.tobytes()).hexdigest()
+            target = exact.get(pixels)
+            fingerprint, size = None, image.shape[:2]
+            if target is None and self.perceptual:
+                fingerprint = dhash(image)
+                for kept_hash, kept_size, kept_name in reversed(kept):
+                    if kept_size == size and hamming(kept_hash, fingerprint) <= self.hash_distance:
+                        target = kept_name
+                        break
+            if target is None:
+                data, ext = self._encode(path)
+                target = f"{CONTENT_PREFIX}{hashlib.sha1(data).hexdigest()[:16]}{ext}"
+                target_path = os.path.join(log_dir, target)
+                if not os.path.exists(target_path):
+                    with open(target_path, 'wb') as f:
+                        f.write(data)
+                if fingerprint is not None:
+                    kept.append((fingerprint, size, target))
+            exact.setdefault(pixels, target)
+            mapping[name] = target
+
+        # 先改写日志再删除原图，中途失败时日志引用仍然有效
+        tmp_path = f"{log_path}.tmp"
+        with open(log_path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                stripped = line.strip()
+                if not stripped:
+                    dst.write(line)
+                    continue
+                try:
+                    entry = json.loads(stripped)
+                except ValueError:
+                    dst.write(line)
+                    continue
+                dst.write(json.dumps(_rewrite_refs(entry, mapping), ensure_ascii=False) + '\n')
+        os.replace(tmp_path, log_path)
+
+        for name in mapping:
+            os.remove(os.path.join(log_dir, name))
+        unique = {target for target in mapping.values()}
+        stats['unique'] = len(unique)
+        stats['bytes_after'] = sum(os.path.getsize(os.path.join(log_dir, target)) for target in unique)
+        stats['bytes_saved'] = stats['bytes_before'] - stats['bytes_after']
+        stats['seconds'] = round(time.time() - started, 3)
+        return stats
+
+
+def compact_log_dir(log_dir: str) -> Dict[str, int]:
+    """按 AIRTEST_CONFIG['LOG_COMPACT'] 处理日志目录，未启用时返回空统计"""
+    if not AIRTEST_CONFIG.get('LOG_COMPACT', {}).get('enabled', True):
+        return {}
+    stats = LogCompactor().compact(log_dir)
+    if stats.get('images'):
+        logger.info(
+            f"日志截图去重: {log_dir}，{stats['images']} 张 -> {stats['unique']} 张，"
+            f"节省 {stats['bytes_saved'] / 1024 / 1024:.1f} MB"
+        )
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Airtest日志截图去重")
+    parser.add_argument('log_dirs', nargs='+', help='Airtest日志目录（包含log.txt）')
+    parser.add_argument('--perceptual', action='store_true', default=None, help='同时合并近似的截图（按dHash）')
+    parser.add_argument('--hash-distance', type=int, default=None, help='--perceptual时视为同一画面的dHash汉明距离')
+    parser.add_argument('--max-width', type=int, default=None, help='截图最大宽度')
+    args = parser.parse_args()
+
+    compactor = LogCompactor(hash_distance=args.hash_distance, max_width=args.max_width, perceptual=args.perceptual)
+    total = 0
+    for directory in args.log_dirs:
+        result = compactor.compact(directory)
+        total += result['bytes_saved']
+        print(f"{directory}: {result}")
+    print(f"共节省 {total / 1024 / 1024:.1f} MB")
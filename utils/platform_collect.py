@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按平台过滤用例收集
+每个测试模块的平台取自模块级声明 `pytestmark = pytest.mark.platform("android")`（通过AST读取，不导入模块），
+没有声明时按用例目录判断（见 shard_runner.PLATFORM_CASE_DIRS）；
+没有连接该平台设备的模块在收集阶段直接忽略，不再导入（每个用例模块都会导入airtest）；
+模块的平台判断结果按文件mtime缓存在pytest的cache目录中，文件未修改时下次运行不再解析
+
+用法（由根目录 conftest 注册）:
+    pytest cases                          # 只收集已连接设备的平台
+    pytest cases --platform android       # 只收集指定平台
+    pytest cases --all-platforms          # 不过滤
+"""
+
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, Optional, Set
+
+import pytest
+
+from config import BASE_DIR
+from utils.logger import setup_logger
+from utils.shard_runner import DEVICE_SERIAL_ENV, PLATFORM_CASE_DIRS, module_key, platform_of_module
+
+logger = setup_logger(__name__)
+
+MARKER_NAME = 'platform'
+CACHE_KEY = 'platform_collect/modules'
+# DeviceManager使用的平台名
+PLATFORM_NAMES = {'ANDROID': 'Android', 'IOS': 'iOS', 'WINDOWS': 'Windows', 'MACOS': 'macOS'}
+
+
+def _marker_platform(node) -> Optional[str]:
+    """pytest.mark.platform("xxx") 表达式中的平台名"""
+    if not isinstance(node, ast.Call) or not node.args or not isinstance(node.args[0], ast.Constant):
+        return None
+    func = node.func
+    if isinstance(func, ast.Attribute) and func.attr == MARKER_NAME and isinstance(func.value, ast.Attribute) \
+            and func.value.attr == 'mark':
+        value = node.args[0].value
+        return value.upper() if isinstance(value, str) else None
+    return None
+
+
+def declared_platform(source: str, path: str = '<string>') -> Optional[str]:
+    """
+    读取模块级 pytestmark 中声明的平台
+
+    支持 pytestmark = pytest.mark.platform("android") 以及列表/元组形式
+
+    Returns:
+        str: 大写的平台名，如 ANDROID；未声明时返回None
+    """
+    tree = ast.parse(source, filename=path)
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        if not any(isinstance(t, ast.Name) and t.id == 'pytestmark' for t in node.targets):
+            continue
+        values = node.value.elts if isinstance(node.value, (ast.List, ast.Tuple)) else [node.value]
+        for value in values:
+            platform = _marker_platform(value)
+            if platform:
+                return platform
+    return None
+
+
+def module_platform(path: str) -> Optional[str]:
+    """模块所属平台：优先使用声明的标记，其次按用例目录判断"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            declared = declared_platform(f.read(), path)
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        declared = None
+    return declared or platform_of_module(path)
+
+
+def attached_platforms() -> Set[str]:
+    """
+    检测已连接设备的平台
+
+    Android看 adb devices，iOS看 idevice_id -l，Windows/macOS为本机平台
+    """
+    platforms = set()
+    try:
+        output = subprocess.run(['adb', 'devices'], capture_output=True, text=True, timeout=10).stdout
+        if any(line.strip().endswith('\tdevice') for line in output.splitlines()[1:]):
+            platforms.add('ANDROID')
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"检测Android设备失败: {str(e)}")
+    try:
+        from core.iproxy_supervisor import list_ios_devices
+        if list_ios_devices():
+            platforms.add('IOS')
+    except Exception as e:
+        logger.warning(f"检测iOS设备失败: {str(e)}")
+    if sys.platform == 'win32':
+        platforms.add('WINDOWS')
+    elif sys.platform == 'darwin':
+        platforms.add('MACOS')
+    return platforms
+
+
+class PlatformCollector:
+    """收集阶段的平台过滤"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: pytest配置对象，读取 --platform / --all-platforms 并使用其cache
+        """
+        self.config = config
+        requested = {p.upper() for value in config.getoption('platform') or [] for p in value.split(',') if p}
+        unknown = requested - set(PLATFORM_CASE_DIRS)
+        if unknown:
+            raise pytest.UsageError(f"不支持的平台: {', '.join(sorted(unknown))}")
+        # 分片工作进程由shard_runner直接指定模块，不做过滤
+        self.enabled = not config.getoption('all_platforms') and not os.environ.get(DEVICE_SERIAL_ENV)
+        self._platforms: Optional[Set[str]] = requested or None
+        self._cache: Dict[str, list] = {}
+        # 使用 -p no:cacheprovider 时没有cache属性
+        self._store = getattr(config, 'cache', None)
+        if self._store is not None:
+            self._cache = dict(self._store.get(CACHE_KEY, {}))
+        self._dirty = False
+        self.cache_hits = 0
+        self.ignored: Dict[str, int] = {}
+
+    @property
+    def platforms(self) -> Set[str]:
+        """允许收集的平台，未通过 --platform 指定时在第一次需要时检测已连接的设备"""
+        if self._platforms is None:
+            self._platforms = attached_platforms()
+            logger.info(f"已连接设备的平台: {', '.join(sorted(self._platforms)) or '无'}")
+        return self._platforms
+
+    def platform_of(self, path: str) -> Optional[str]:
+        """模块所属平台（按文件mtime缓存）"""
+        key = module_key(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cached = self._cache.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            self.cache_hits += 1
+            return cached[2]
+        platform = module_platform(path)
+        self._cache[key] = [stat.st_mtime_ns, stat.st_size, platform]
+        self._dirty = True
+        return platform
+
+    def should_ignore(self, path: str) -> bool:
+        """是否在收集阶段忽略该文件"""
+        if not self.enabled:
+            return False
+        filename = os.path.basename(path)
+        if not (filename.startswith('test_') and filename.endswith('.py')):
+            return False
+        if not module_key(path).startswith('cases/'):
+            return False
+        platform = self.platform_of(path)
+        if platform is None or platform in self.platforms:
+            return False
+        self.ignored[platform] = self.ignored.get(platform, 0) + 1
+        return True
+
+    def save(self) -> None:
+        """写回缓存，删除已不存在的文件"""
+        if self._store is None or not self._dirty:
+            return
+        entries = {k: v for k, v in self._cache.items() if os.path.exists(os.path.join(BASE_DIR, k))}
+        self._store.set(CACHE_KEY, entries)
+        self._dirty = False
+
+    def summary(self) -> str:
+        ignored = '，'.join(f"{p} {n} 个" for p, n in sorted(self.ignored.items())) or '无'
+        return f"按平台忽略的模块: {ignored}；平台判断缓存命中 {self.cache_hits} 个"
+
+
+def platform_name(platform: Optional[str], default: str = 'iOS') -> str:
+    """大写平台名转换为DeviceManager使用的名称"""
+    return PLATFORM_NAMES.get((platform or '').upper(), default)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Airtest报告打包
+截图(PNG/JPEG)本身已是压缩格式，打包时直接存储不再重复压缩，其余文件使用deflate；
+压缩包边读边写，直接写到Allure结果目录中作为附件文件，不再经过临时目录复制；
+打包在后台线程池中进行，用例的call阶段提交后立即继续执行，用例不等待打包结果；
+会话结束后统一等待打包完成，并写入已生成的Allure用例结果（按 REPORT_KEY_LABEL 标签查找用例）
+"""
+
+import glob
+import json
+import os
+import shutil
+import uuid
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from config import AIRTEST_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 会话结束后再附加报告时，用该标签在Allure结果中找到对应的用例
+REPORT_KEY_LABEL = 'airtest_report_key'
+
+# 已压缩的文件格式，使用ZIP_STORED
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.mp4', '.zip', '.gz'}
+
+
+def package_directory(report_dir: str, zip_path: str) -> Dict[str, float]:
+    """
+    把报告目录打包为zip
+
+    Args:
+        report_dir: 报告目录
+        zip_path: 输出的zip路径
+
+    Returns:
+        Dict: files(文件数)、stored(直接存储的文件数)、input_bytes、output_bytes、seconds
+    """
+    started = time.time()
+    files = stored = input_bytes = 0
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for root, dirs, filenames in os.walk(report_dir):
+            dirs[:] = [d for d in dirs if d != '__pycache__']
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                arcname = os.path.relpath(file_path, report_dir)
+                compress_type = zipfile.ZIP_DEFLATED
+                if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS:
+                    compress_type = zipfile.ZIP_STORED
+                    stored += 1
+                try:
+                    # ZipFile.write 按块读取源文件，不会整文件读入内存
+                    zipf.write(file_path, arcname, compress_type=compress_type)
+                    files += 1
+                    input_bytes += os.path.getsize(file_path)
+                except Exception as e:
+                    logger.error(f"压缩文件 {file_path} 时出错: {str(e)}")
+    return {
+        'files': files,
+        'stored': stored,
+        'input_bytes': input_bytes,
+        'output_bytes': os.path.getsize(zip_path),
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def attach_to_results(alluredir: str, labels: List[str], zip_path: str, name: str) -> int:
+    """
+    把zip附加到已写出的Allure用例结果（会话结束后用例结果已关闭，不能再调用allure.attach）
+
+    按 REPORT_KEY_LABEL 标签查找 *-result.json，在结果中登记zip附件；
+    zip已在结果目录中（按Allure附件命名）时直接引用，否则复制一份
+
+    Args:
+        alluredir: Allure结果目录
+        labels: 标签值（用例nodeid）列表
+        zip_path: zip路径
+        name: 附件名称
+
+    Returns:
+        int: 更新的结果文件数量
+    """
+    source = None
+    updated = 0
+    for result_path in glob.glob(os.path.join(alluredir, '*-result.json')):
+        with open(result_path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        if not any(l.get('name') == REPORT_KEY_LABEL and l.get('value') in labels
+                   for l in result.get('labels', [])):
+            continue
+        if source is None:
+            if os.path.dirname(os.path.abspath(zip_path)) == os.path.abspath(alluredir):
+                source = os.path.basename(zip_path)
+            else:
+                source = f"{uuid.uuid4()}-attachment.zip"
+                shutil.copyfile(zip_path, os.path.join(alluredir, source))
+        result.setdefault('attachments', []).append({'name': name, 'source': source, 'type': 'application/zip'})
+        # 先写临时文件再替换，避免中断时留下不完整的结果
+        tmp_path = f"{result_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, result_path)
+        updated += 1
+    return updated
+
+
+class ReportPackager:
+    """后台打包Airtest报告，会话结束后按key（通常为用例nodeid）附加到Allure结果"""
+
+    def __init__(self, max_workers: int = 2, work_dir: Optional[str] = None):
+        """
+        Args:
+            max_workers: 后台打包线程数
+            work_dir: zip输出目录，通常为Allure结果目录（zip即为附件文件），默认为 EXPORT_DIR/.packages
+        """
+        self.work_dir = work_dir or os.path.join(AIRTEST_CONFIG['EXPORT_DIR'], '.packages')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-packager")
+        self._pending: Dict[str, Tuple[Future, str, str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _package(self, report_dir: str) -> Tuple[str, Dict[str, float]]:
+        os.makedirs(self.work_dir, exist_ok=True)
+        # 与Allure附件文件的命名一致，写在结果目录中时无需再复制
+        zip_path = os.path.join(self.work_dir, f"{uuid.uuid4()}-attachment.zip")
+        try:
+            return zip_path, package_directory(report_dir, zip_path)
+        except Exception:
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            raise
+
+    def submit(self, key: str, report_dir: str, name: str, labels: Optional[List[str]] = None) -> Future:
+        """
+        提交打包任务，立即返回
+
+        Args:
+            key: 任务标识（用例nodeid）
+            report_dir: Airtest报告目录
+            name: Allure附件名称
+            labels: 要附加到的用例标签值，默认为 [key]
+        """
+        future = self._executor.submit(self._package, report_dir)
+        with self._lock:
+            self._pending[key] = (future, name, report_dir, list(labels or [key]))
+        return future
+
+    def attach_to_results(self, key: str, alluredir: str, labels: Optional[List[str]] = None,
+                          timeout: Optional[float] = None) -> int:
+        """
+        等待打包完成，附加到Allure结果目录中带有对应标签的用例（会话结束后使用）
+
+        Args:
+            key: 提交任务时使用的key
+            alluredir: Allure结果目录
+            labels: 用例结果中的标签值，默认使用提交时的labels
+
+        Returns:
+            int: 附加成功的用例数
+        """
+        with self._lock:
+            pending = self._pending.pop(key, None)
+        if pending is None:
+            return 0
+        future, name, report_dir, submitted_labels = pending
+        zip_path = None
+        count = 0
+        try:
+            zip_path, stats = future.result(timeout=timeout)
+            count = attach_to_results(alluredir, labels or submitted_labels, zip_path, name)
+            if count:
+                logger.info(
+                    f"Airtest报告已附加到Allure: {report_dir}，{stats['files']} 个文件"
+                    f"（{stats['stored']} 个直接存储），{stats['output_bytes'] / 1024 / 1024:.1f} MB，"
+                    f"打包耗时 {stats['seconds']} 秒"
+                )
+            else:
+                logger.warning(f"未找到用例 {labels or submitted_labels} 的Allure结果，报告未附加: {report_dir}")
+            return count
+        except Exception as e:
+            logger.error(f"附加Airtest报告失败 {report_dir}: {str(e)}", exc_info=True)
+            return 0
+        finally:
+            # 直接作为附件引用的zip保留，其余（未附加或已复制）的删除
+            in_results = zip_path and os.path.dirname(os.path.abspath(zip_path)) == os.path.abspath(alluredir)
+            if zip_path and os.path.exists(zip_path) and not (count and in_results):
+                os.remove(zip_path)
+
+    def attach_all(self, alluredir: str, timeout: Optional[float] = None) -> int:
+        """
+        附加全部已提交的报告
+
+        Returns:
+            int: 附加成功的用例数
+        """
+        with self._lock:
+            keys = list(self._pending)
+        return sum(self.attach_to_results(key, alluredir, timeout=timeout) for key in keys)
+
+    def shutdown(self) -> None:
+        """丢弃未取回的任务并关闭线程池"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        self._executor.shutdown(wait=True)
+        for future, _, _, _ in pending:
+            if future.done() and not future.exception():
+                zip_path, _ = future.result()
+                if os.path.exists(zip_path):
+                    os.remove(zip_path)
+
+
+_packager = None
+_packager_lock = threading.Lock()
+
+
+def get_report_packager(work_dir: Optional[str] = None) -> ReportPackager:
+    """
+    获取进程内共享的打包器
+
+    Args:
+        work_dir: 首次创建时的zip输出目录（通常为Allure结果目录）
+    """
+    global _packager
+    with _packager_lock:
+        if _packager is None:
+            _packager = ReportPackager(work_dir=work_dir)
+        return _packager
+
+
+def shutdown_report_packager() -> None:
+    """关闭共享的打包器（同一进程中再次运行pytest时会重新创建）"""
+    global _packager
+    with _packager_lock:
+        packager, _packager = _packager, None
+    if packager is not None:
+        packager.shutdown()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Airtest HTML报告生成服务
+用例结束时只登记 (script_root, log_root, export_dir)，不在用例中同步渲染报告：
+- concurrent: 模块结束（日志目录不再写入）后提交到进程池渲染，设备继续执行下一个模块
+- deferred:   会话结束后统一在进程池中并行渲染
+- sync:       立即在当前进程渲染（原来的行为）
+渲染前先对日志目录做截图去重（见 utils.log_compactor），
+渲染完成后由 conftest 打包并附加到对应用例的Allure结果
+"""
+
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config import AIRTEST_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MODES = ('concurrent', 'deferred', 'sync')
+
+
+@dataclass
+class ReportJob:
+    """一次报告渲染请求"""
+    script_root: str
+    log_root: str
+    export_dir: str
+    lang: str = 'en'
+    plugins: Optional[list] = None
+    # 认领该报告的用例nodeid（同一模块的多个用例共用日志目录时对应同一份报告）
+    keys: List[str] = field(default_factory=list)
+    future: Optional[Future] = None
+    # 同一导出目录上一份仍在渲染的报告，需等其结束后再渲染，避免两个进程同时写一个目录
+    previous: Optional[Future] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    compact: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def report_dir(self) -> str:
+        """LogToHtml导出的报告目录，如 export_dir/test_hello.log"""
+        script_name = os.path.splitext(os.path.basename(self.script_root))[0]
+        return os.path.join(self.export_dir, f"{script_name}.log")
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and os.path.exists(os.path.join(self.report_dir, 'log.html'))
+
+
+def render_report(script_root: str, log_root: str, export_dir: str, lang: str = 'en', plugins=None,
+                  compact: bool = True) -> dict:
+    """
+    对日志目录做截图去重，然后渲染一份Airtest HTML报告（在工作进程中执行）
+
+    Args:
+        compact: 是否先做截图去重，日志目录仍可能被写入时（sync模式）必须为False
+
+    Returns:
+        dict: seconds(渲染耗时)、compact(截图去重统计)
+    """
+    from airtest.report.report import LogToHtml
+    from utils.log_compactor import compact_log_dir
+
+    compact_stats = {}
+    if compact:
+        try:
+            compact_stats = compact_log_dir(log_root)
+        except Exception as e:
+            logger.error(f"日志截图去重失败 {log_root}: {str(e)}")
+
+    started = time.time()
+    LogToHtml(
+        script_root=script_root,
+        log_root=log_root,
+        export_dir=export_dir,
+        lang=lang,
+        plugins=plugins
+    ).report()
+    return {'seconds': time.time() - started, 'compact': compact_stats}
+
+
+class ReportService:
+    """会话级的报告生成服务"""
+
+    def __init__(self, mode: Optional[str] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            mode: concurrent / deferred / sync，默认取 AIRTEST_CONFIG['REPORT_MODE']
+            max_workers: 渲染进程数，默认取 AIRTEST_CONFIG['REPORT_WORKERS']
+        """
+        self.mode = mode or AIRTEST_CONFIG.get('REPORT_MODE', 'concurrent')
+        if self.mode not in MODES:
+            raise ValueError(f"不支持的报告生成模式: {self.mode}")
+        self.max_workers = max_workers or AIRTEST_CONFIG.get('REPORT_WORKERS') or max(1, min(4, os.cpu_count() or 1))
+        self._jobs: Dict[str, ReportJob] = {}
+        self._unclaimed: List[ReportJob] = []
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn与shard_runner一致，渲染进程不继承设备连接等状态
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _submit(self, job: ReportJob) -> None:
+        job.future = self._get_executor().submit(
+            render_report, job.script_root, job.log_root, job.export_dir, job.lang, job.plugins
+        )
+
+    def request(self, script_root: str, log_root: str, export_dir: str, lang: str = 'en', plugins=None) -> ReportJob:
+        """
+        登记一份报告
+
+        同一个导出目录重复登记时（同一模块的多个用例）只保留最后一次，渲染时日志已包含全部用例的步骤
+        """
+        job = ReportJob(os.path.abspath(script_root), os.path.abspath(log_root), os.path.abspath(export_dir),
+                        lang, plugins)
+        with self._lock:
+            previous = self._jobs.get(job.export_dir)
+            if previous is not None:
+                job.keys = previous.keys
+                if previous.future is not None and not previous.future.cancel():
+                    job.previous = previous.future
+            self._jobs[job.export_dir] = job
+            self._unclaimed.append(job)
+
+        if self.mode == 'sync':
+            self._render_now(job)
+        logger.info(f"已登记Airtest报告({self.mode}): {job.report_dir}")
+        return job
+
+    def _render_now(self, job: ReportJob) -> None:
+        try:
+            # 同步渲染时模块内后续用例还会写入日志，不做截图去重
+            self._apply_result(job, render_report(job.script_root, job.log_root, job.export_dir, job.lang,
+                                                  job.plugins, compact=False))
+        except Exception as e:
+            job.error = str(e)
+            logger.error(f"生成Airtest报告失败: {str(e)}")
+
+    @staticmethod
+    def _apply_result(job: ReportJob, result: dict) -> None:
+        job.seconds = result['seconds']
+        job.compact = result.get('compact') or {}
+        if job.compact.get('images'):
+            logger.info(
+                f"{', '.join(job.keys) or job.report_dir}: 日志截图 {job.compact['images']} 张去重为 "
+                f"{job.compact['unique']} 张，节省 {job.compact['bytes_saved'] / 1024 / 1024:.1f} MB"
+            )
+
+    def release(self, log_root: str) -> None:
+        """
+        日志目录不再写入（模块结束）时调用，concurrent模式下提交该目录的报告开始渲染
+
+        用例仍在写日志时渲染会读到不完整的日志，截图去重也会与Airtest的写入冲突，因此等到模块结束
+        """
+        if self.mode != 'concurrent':
+            return
+        log_root = os.path.abspath(log_root)
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.log_root == log_root and job.future is None]
+        for job in jobs:
+            if job.previous is not None:
+                job.previous.exception()
+            self._submit(job)
+
+    def claim(self, key: str) -> List[ReportJob]:
+        """
+        把上次认领之后登记的报告归属到用例key（在用例call阶段结束时调用）
+
+        Returns:
+            List[ReportJob]: 尚未渲染完成、需要在会话结束后附加的报告；sync模式下为空
+        """
+        with self._lock:
+            jobs, self._unclaimed = self._unclaimed, []
+            for job in jobs:
+                if key not in job.keys:
+                    job.keys.append(key)
+        return [] if self.mode == 'sync' else jobs
+
+    def flush(self) -> List[ReportJob]:
+        """
+        渲染全部未完成的报告并等待结束
+
+        Returns:
+            List[ReportJob]: 本次会话登记的全部报告（sync模式下已在登记时渲染）
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+            self._unclaimed = []
+        if self.mode == 'sync':
+            return jobs
+
+        started = time.time()
+        for job in jobs:
+            if job.future is None or job.future.cancelled():
+                if job.previous is not None:
+                    job.previous.exception()  # 只等待结束，结果由新的渲染覆盖
+                self._submit(job)
+        for job in jobs:
+            try:
+                self._apply_result(job, job.future.result())
+            except Exception as e:
+                job.error = str(e)
+                logger.error(f"生成Airtest报告失败 {job.report_dir}: {str(e)}")
+        if jobs:
+            rendered = sum(job.seconds for job in jobs)
+            logger.info(
+                f"Airtest报告生成完成: {len(jobs)} 份，渲染耗时合计 {rendered:.1f} 秒，"
+                f"会话结束时等待 {time.time() - started:.1f} 秒"
+            )
+        return jobs
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_report_service() -> ReportService:
+    """获取进程内共享的报告服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ReportService()
+        return _service
+
+
+def shutdown_report_service() -> None:
+    """关闭共享的报告服务（同一进程中再次运行pytest时会重新创建）"""
+    global _service
+    with _service_lock:
+        service, _service = _service, None
+    if service is not None:
+        service.shutdown()
+
+
+def generate_report(script_root: str, log_root: str, export_dir: str, lang: str = 'en', plugins=None) -> ReportJob:
+    """
+    用例中生成Airtest报告的入口，替代直接调用 LogToHtml(...).report()
+
+    Args:
+        script_root: 用例脚本路径
+        log_root: Airtest日志目录
+        export_dir: 报告导出目录
+        lang: 报告语言
+        plugins: LogToHtml插件
+    """
+    return get_report_service().request(script_root, log_root, export_dir, lang, plugins)
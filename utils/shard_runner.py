@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多设备并行分片执行
+每台设备启动一个独立的工作进程（各自拥有Airtest的G设备上下文和日志目录），
+测试模块按历史耗时从长到短放入共享队列，由空闲的设备依次领取执行，结果写入同一个Allure结果目录
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import AIRTEST_CONFIG, BASE_DIR, LOG_CONFIG
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 平台 -> cases 下对应的用例目录（Android目录历史上命名为andriod）
+PLATFORM_CASE_DIRS = {
+    'ANDROID': ['andriod', 'android'],
+    'IOS': ['ios'],
+    'WINDOWS': ['windows'],
+    'MACOS': ['macos'],
+}
+
+# 工作进程通过该环境变量得知自己负责的设备，DeviceManager据此生成设备URI
+DEVICE_SERIAL_ENV = 'JY_DEVICE_SERIAL'
+
+
+def discover_modules(platform: str, cases_dir: Optional[str] = None) -> List[str]:
+    """
+    查找指定平台下的全部测试模块
+
+    Args:
+        platform: 平台类型
+        cases_dir: 用例根目录，默认为项目下的cases
+
+    Returns:
+        List[str]: 测试模块路径列表
+    """
+    cases_dir = cases_dir or os.path.join(BASE_DIR, 'cases')
+    modules = []
+    for dirname in PLATFORM_CASE_DIRS.get(platform.upper(), []):
+        platform_dir = os.path.join(cases_dir, dirname)
+        for root, dirs, files in os.walk(platform_dir):
+            dirs[:] = [d for d in dirs if d not in ('__pycache__', 'log')]
+            for file in sorted(files):
+                if file.startswith('test_') and file.endswith('.py'):
+                    modules.append(os.path.join(root, file))
+    return modules
+
+
+def module_key(module: str) -> str:
+    """模块路径转换为与pytest nodeid前缀一致的形式，如 cases/ios/feature1/test_home.py"""
+    return os.path.relpath(os.path.abspath(module), BASE_DIR).replace(os.sep, '/')
+
+
+def platform_of_module(module: str) -> Optional[str]:
+    """根据模块所在的用例目录判断平台，无法判断时返回None"""
+    parts = module_key(module).split('/')
+    if len(parts) < 2 or parts[0] != 'cases':
+        return None
+    for platform, dirnames in PLATFORM_CASE_DIRS.items():
+        if parts[1] in dirnames:
+            return platform
+    return None
+
+
+def _setup_worker_logging(log_dir: str) -> None:
+    """工作进程的日志同时写入自己的日志目录"""
+    os.makedirs(log_dir, exist_ok=True)
+    handler = logging.FileHandler(os.path.join(log_dir, 'worker.log'), encoding='utf-8')
+    handler.setLevel(LOG_CONFIG['LEVEL'])
+    handler.setFormatter(logging.Formatter(LOG_CONFIG['FORMAT']))
+    root_logger = logging.getLogger()
+    root_logger.setLevel(LOG_CONFIG['LEVEL'])
+    root_logger.addHandler(handler)
+
+
+def _worker(serial: str, work_queue, result_queue, allure_dir: str, timestamp: str, log_dir: str) -> None:
+    """
+    工作进程入口：不断从队列领取模块，在自己的设备上执行
+
+    每个进程独立导入airtest，G.DEVICE互不干扰
+    """
+    import pytest
+
+    os.environ['TEST_TIMESTAMP'] = timestamp
+    os.environ[DEVICE_SERIAL_ENV] = serial
+    _setup_worker_logging(log_dir)
+    worker_logger = setup_logger(f"{__name__}.{serial}")
+    worker_logger.info(f"工作进程启动，设备: {serial}，日志目录: {log_dir}")
+
+    while True:
+        module = work_queue.get()
+        if module is None:
+            break
+        worker_logger.info(f"[{serial}] 开始执行: {module}")
+        started = time.time()
+        exit_code = pytest.main([
+            module,
+            '-v',
+            '--capture=no',
+            '--log-cli-level=INFO',
+            '--alluredir', allure_dir,
+        ])
+        duration = time.time() - started
+        worker_logger.info(f"[{serial}] 执行完成: {module}，退出码 {int(exit_code)}，耗时 {duration:.1f} 秒")
+        result_queue.put((serial, module, int(exit_code), duration))
+
+    # 各模块复用同一个设备连接，全部执行完后再断开
+    from utils.device_manager import DeviceManager
+    DeviceManager.close_pool()
+
+
+def run_sharded(devices: List[str], platform: str, allure_dir: str, timestamp: str,
+                modules: Optional[List[str]] = None) -> int:
+    """
+    在多台设备上并行执行测试
+
+    Args:
+        devices: 设备序列号列表
+        platform: 平台类型
+        allure_dir: 共享的Allure结果目录
+        timestamp: 本次运行的时间戳（TEST_TIMESTAMP）
+        modules: 要执行的模块，默认执行该平台下的全部模块
+
+    Returns:
+        int: 汇总的退出码，全部成功时为0
+    """
+    modules = modules if modules is not None else discover_modules(platform)
+    if not modules:
+        logger.warning(f"未找到 {platform} 平台的测试模块")
+        return 5  # 与pytest的"未收集到用例"退出码一致
+    if not devices:
+        logger.error("没有可用的设备")
+        return 1
+
+    # 按历史耗时做LPT排序：耗时长的模块先入队，由先空闲的设备领取，
+    # 动态领取的顺序与LPT装箱一致，预测值即为LPT装箱的makespan
+    from utils.duration_store import DurationStore, lpt_schedule
+
+    keys = {module_key(m): m for m in modules}
+    estimates = DurationStore().module_estimates(platform, list(keys))
+    plan, predicted_makespan = lpt_schedule(estimates, len(devices))
+    ordered = [keys[k] for k in sorted(estimates, key=estimates.get, reverse=True)]
+    for index, assigned in enumerate(plan):
+        planned = sum(estimates[k] for k in assigned)
+        logger.info(f"预计分配 #{index + 1}: {len(assigned)} 个模块，约 {planned:.1f} 秒")
+    logger.info(f"预测总耗时(makespan): {predicted_makespan:.1f} 秒")
+
+    ctx = multiprocessing.get_context('spawn')
+    work_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    for module in ordered:
+        work_queue.put(module)
+    for _ in devices:
+        work_queue.put(None)
+
+    os.makedirs(allure_dir, exist_ok=True)
+    started = time.time()
+    workers = []
+    for serial in devices:
+        log_dir = os.path.join(AIRTEST_CONFIG['EXPORT_DIR'], 'workers', timestamp, serial)
+        process = ctx.Process(
+            target=_worker,
+            args=(serial, work_queue, result_queue, allure_dir, timestamp, log_dir),
+            name=f"shard-{serial}"
+        )
+        process.start()
+        workers.append(process)
+    logger.info(f"已启动 {len(workers)} 个工作进程，待执行模块 {len(ordered)} 个")
+
+    results: List[Tuple[str, str, int, float]] = []
+    while len(results) < len(ordered):
+        try:
+            results.append(result_queue.get(timeout=5))
+        except Exception:
+            if not any(p.is_alive() for p in workers):
+                logger.error("工作进程已全部退出，但仍有模块未返回结果")
+                break
+
+    for process in workers:
+        process.join()
+    actual_makespan = time.time() - started
+
+    per_device: Dict[str, float] = {}
+    for serial, module, exit_code, duration in results:
+        per_device[serial] = per_device.get(serial, 0.0) + duration
+        logger.info(f"{serial}: {os.path.relpath(module, BASE_DIR)} -> 退出码 {exit_code}，{duration:.1f} 秒")
+    for serial, total in per_device.items():
+        logger.info(f"设备 {serial} 累计执行 {total:.1f} 秒")
+    logger.info(f"总耗时(makespan): 预测 {predicted_makespan:.1f} 秒，实际 {actual_makespan:.1f} 秒")
+
+    failed = [r for r in results if r[2] != 0]
+    if len(results) < len(ordered) or any(p.exitcode for p in workers):
+        return 1
+    return 1 if failed else 0
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+检查用例中输入操作之后的固定等待 sleep(N)，建议改为等待画面稳定 wait_until_stable(max_wait=N)
+
+用法:
+    python -m utils.sleep_lint            # 检查 cases 目录并列出建议
+    python -m utils.sleep_lint --fix      # 直接改写用例文件
+"""
+
+import argparse
+import ast
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from config import BASE_DIR
+
+# 会改变画面的输入操作（airtest.core.api 函数名与 BaseTest 方法名）；
+# start_app/stop_app/home/wake 之后的等待是在等应用启动或切换，画面可能长时间静止（白屏、加载），不在此列
+INPUT_ACTIONS = {
+    'touch', 'click', 'double_click', 'swipe', 'pinch', 'keyevent', 'text', 'paste',
+}
+SLEEP_NAMES = {'sleep'}
+STABLE_IMPORT = "from core.frame_diff import wait_until_stable"
+
+
+@dataclass
+class SleepFinding:
+    """一处可替换的固定等待"""
+    path: str
+    lineno: int
+    col: int
+    end_col: int
+    seconds: float
+    action: str
+    receiver: Optional[str]  # self.sleep(2) 时为 "self"，直接调用 sleep(2) 时为None
+
+    @property
+    def suggestion(self) -> str:
+        prefix = f"{self.receiver}." if self.receiver else ""
+        seconds = int(self.seconds) if float(self.seconds).is_integer() else self.seconds
+        return f"{prefix}wait_until_stable(max_wait={seconds})"
+
+
+def _call_name(node) -> Optional[str]:
+    if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+        return None
+    func = node.value.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _sleep_seconds(node) -> Optional[float]:
+    """sleep(N) / time.sleep(N) / self.sleep(N) 中的常量N"""
+    if _call_name(node) not in SLEEP_NAMES:
+        return None
+    call = node.value
+    if len(call.args) != 1 or call.keywords or not isinstance(call.args[0], ast.Constant):
+        return None
+    value = call.args[0].value
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _receiver(node) -> Optional[str]:
+    func = node.value.func
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id != 'time':
+        return func.value.id
+    return None
+
+
+def lint_source(source: str, path: str = '<string>') -> List[SleepFinding]:
+    """
+    查找紧跟在输入操作之后的固定等待
+
+    Args:
+        source: 源代码
+        path: 文件路径（用于报告）
+
+    Returns:
+        List[SleepFinding]
+    """
+    tree = ast.parse(source, filename=path)
+    findings = []
+    for node in ast.walk(tree):
+        for field in ('body', 'orelse', 'finalbody'):
+            statements = getattr(node, field, None)
+            if not isinstance(statements, list):
+                continue
+            for previous, current in zip(statements, statements[1:]):
+                action = _call_name(previous)
+                seconds = _sleep_seconds(current)
+                if action not in INPUT_ACTIONS or seconds is None:
+                    continue
+                call = current.value
+                # 跨行的调用不改写，只报告
+                end_col = call.end_col_offset if call.end_lineno == call.lineno else -1
+                findings.append(SleepFinding(path, call.lineno, call.col_offset, end_col,
+                                             seconds, action, _receiver(current)))
+    return sorted(findings, key=lambda f: f.lineno)
+
+
+def _add_import(lines: List[str], tree: ast.Module) -> List[str]:
+    if any(line.strip() == STABLE_IMPORT for line in lines):
+        return lines
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    index = imports[-1].end_lineno if imports else 0
+    return lines[:index] + [STABLE_IMPORT + '\n'] + lines[index:]
+
+
+def fix_source(source: str, path: str = '<string>') -> Tuple[str, int]:
+    """
+    把输入操作后的 sleep(N) 改写为 wait_until_stable(max_wait=N)
+
+    Returns:
+        Tuple: (改写后的源代码, 改写的数量)
+    """
+    findings = [f for f in lint_source(source, path) if f.end_col >= 0]
+    if not findings:
+        return source, 0
+    lines = source.splitlines(keepends=True)
+    for finding in sorted(findings, key=lambda f: (f.lineno, f.col), reverse=True):
+        line = lines[finding.lineno - 1]
+        lines[finding.lineno - 1] = line[:finding.col] + finding.suggestion + line[finding.end_col:]
+    # 直接调用 sleep(N) 的用例需要导入模块函数，self.sleep 改写为 BaseTest 方法不需要
+    if any(f.receiver is None for f in findings):
+        lines = _add_import(lines, ast.parse(source, filename=path))
+    return ''.join(lines), len(findings)
+
+
+def iter_case_files(cases_dir: str):
+    for root, dirs, files in os.walk(cases_dir):
+        dirs[:] = [d for d in dirs if d not in ('__pycache__', 'log')]
+        for file in sorted(files):
+            if file.endswith('.py') and file != '__init__.py':
+                yield os.path.join(root, file)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="检查用例中输入操作之后的固定sleep")
+    parser.add_argument('paths', nargs='*', help='要检查的文件或目录，默认为 cases')
+    parser.add_argument('--fix', action='store_true', help='直接改写为 wait_until_stable')
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths or [os.path.join(BASE_DIR, 'cases')]:
+        files.extend(iter_case_files(path) if os.path.isdir(path) else [path])
+
+    total_findings = 0
+    total_seconds = 0.0
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        try:
+            findings = lint_source(source, file_path)
+        except SyntaxError as e:
+            print(f"{file_path}: 解析失败: {str(e)}")
+            continue
+        for finding in findings:
+            rel = os.path.relpath(finding.path, BASE_DIR)
+            print(f"{rel}:{finding.lineno}: {finding.action}() 之后固定等待 {finding.seconds:g} 秒，"
+                  f"建议改为 {finding.suggestion}")
+        total_findings += len(findings)
+        total_seconds += sum(f.seconds for f in findings)
+
+        if args.fix and findings:
+            fixed, count = fix_source(source, file_path)
+            if count:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(fixed)
+                print(f"已改写 {count} 处: {file_path}")
+
+    print(f"共 {total_findings} 处，固定等待合计 {total_seconds:g} 秒")
+    return 1 if total_findings and not args.fix else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())